@@ -0,0 +1,444 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from app import metrics
+from app.cache import REDIS_URL
+from app.job_queue import JOB_LEASE_SECONDS, JOB_QUEUE_BACKEND, JOB_QUEUE_NAME
+from app.k_selection import CLUSTER_K_MODE, CLUSTER_K_MAX
+from app.research_budget import RESEARCH_MAX_LIVE_CLUSTERS, RESEARCH_MAX_API_CALLS
+
+load_dotenv()
+
+# Admission control: every keyword job is costed before it is started and
+# checked against per-user and per-workspace quotas, concurrency caps and the
+# overall load. Jobs are accepted, downgraded (fewer keywords, no live
+# research) or rejected, and the user is told why. A limit of 0 disables it.
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+# Where in-flight jobs and quota usage are recorded. Must be shared by every
+# process that submits or runs jobs, so it follows a durable job queue.
+ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND",
+                              JOB_QUEUE_BACKEND if JOB_QUEUE_BACKEND in ("sqlite", "redis") else "memory")
+ADMISSION_PATH = os.getenv("ADMISSION_PATH", os.path.join(os.getcwd(), "admission.db"))
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "8"))  # jobs in flight, all users
+ADMISSION_DEGRADE_LOAD = float(os.getenv("ADMISSION_DEGRADE_LOAD", "0.75"))  # share of capacity
+ADMISSION_BUSY_MAX_KEYWORDS = int(os.getenv("ADMISSION_BUSY_MAX_KEYWORDS", "2000"))
+ADMISSION_MAX_KEYWORDS = int(os.getenv("ADMISSION_MAX_KEYWORDS", "20000"))  # per job
+ADMISSION_USER_MAX_CONCURRENT = int(os.getenv("ADMISSION_USER_MAX_CONCURRENT", "2"))
+ADMISSION_TEAM_MAX_CONCURRENT = int(os.getenv("ADMISSION_TEAM_MAX_CONCURRENT", "6"))
+ADMISSION_USER_DAILY_KEYWORDS = int(os.getenv("ADMISSION_USER_DAILY_KEYWORDS", "50000"))
+ADMISSION_TEAM_DAILY_KEYWORDS = int(os.getenv("ADMISSION_TEAM_DAILY_KEYWORDS", "200000"))
+ADMISSION_USER_DAILY_CALLS = int(os.getenv("ADMISSION_USER_DAILY_CALLS", "1000"))  # SERP queries + page fetches
+ADMISSION_TEAM_DAILY_CALLS = int(os.getenv("ADMISSION_TEAM_DAILY_CALLS", "5000"))
+ADMISSION_WINDOW_HOURS = float(os.getenv("ADMISSION_WINDOW_HOURS", "24"))
+# A job not reported finished within this long (its process died) stops
+# counting as in flight. Jobs run by a queue worker are released sooner:
+# they count only while the worker's heartbeat keeps extending their lease.
+ADMISSION_JOB_TIMEOUT_S = int(os.getenv("ADMISSION_JOB_TIMEOUT_S", "7200"))
+
+ACCEPT = "accept"
+DOWNGRADE = "downgrade"
+REJECT = "reject"
+
+
+def estimate_cost(n_keywords, research=True, top_n_results=3):
+    """
+    Upper-bound cost of a job with n_keywords cleaned keywords: the number
+    of clusters and of outbound calls (one search per researched cluster
+    plus a page fetch per result), within the per-job research budget
+    """
+    from app.pipeline import choose_n_clusters
+
+    if n_keywords <= 0:
+        return {"keywords": 0, "clusters": 0, "calls": 0}
+    if CLUSTER_K_MODE == "auto" and n_keywords > 5:
+        clusters = min(CLUSTER_K_MAX, n_keywords)
+    else:
+        clusters = choose_n_clusters(n_keywords)
+    calls = 0
+    if research:
+        live = min(clusters, RESEARCH_MAX_LIVE_CLUSTERS) if RESEARCH_MAX_LIVE_CLUSTERS else clusters
+        calls = live * (1 + top_n_results)
+        if RESEARCH_MAX_API_CALLS:
+            calls = min(calls, RESEARCH_MAX_API_CALLS)
+    return {"keywords": n_keywords, "clusters": clusters, "calls": calls}
+
+
+class Admission:
+    """
+    The decision for one job: action, the reasons for it (shown to the
+    user), and the limits the job must run within
+    """
+
+    def __init__(self, action, reasons=(), max_keywords=None, research=True, estimate=None, job_id=None):
+        self.action = action
+        self.reasons = list(reasons)
+        self.max_keywords = max_keywords
+        self.research = research
+        self.estimate = estimate or {}
+        self.job_id = job_id
+
+    @property
+    def admitted(self):
+        return self.action != REJECT
+
+    def to_dict(self):
+        return {"action": self.action, "reasons": self.reasons, "max_keywords": self.max_keywords,
+                "research": self.research, "estimate": self.estimate}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["action"], data.get("reasons", ()), data.get("max_keywords"),
+                   data.get("research", True), data.get("estimate"))
+
+    def __repr__(self):
+        return f"Admission({self.action!r}, reasons={self.reasons!r})"
+
+
+def _jobs(n):
+    return f"{n} job" if n == 1 else f"{n} jobs"
+
+
+def _remaining(limit, used):
+    return None if not limit else max(0, limit - used)
+
+
+def decide(n_keywords, usage, capacity=ADMISSION_CAPACITY, degrade_load=ADMISSION_DEGRADE_LOAD,
+           busy_max_keywords=ADMISSION_BUSY_MAX_KEYWORDS, max_keywords=ADMISSION_MAX_KEYWORDS,
+           user_max_concurrent=ADMISSION_USER_MAX_CONCURRENT, team_max_concurrent=ADMISSION_TEAM_MAX_CONCURRENT,
+           user_daily_keywords=ADMISSION_USER_DAILY_KEYWORDS, team_daily_keywords=ADMISSION_TEAM_DAILY_KEYWORDS,
+           user_daily_calls=ADMISSION_USER_DAILY_CALLS, team_daily_calls=ADMISSION_TEAM_DAILY_CALLS):
+    """
+    Admission policy. usage holds the jobs in flight (running) and the
+    keywords and calls used in the quota window, each for "all", "user"
+    and "team". Concurrency caps and exhausted quotas reject; large jobs,
+    partly used quotas and high load shrink the job instead.
+    """
+    running = usage["running"]
+    if capacity and running["all"] >= capacity:
+        return Admission(REJECT, [f"the service is at capacity ({_jobs(running['all'])} running), "
+                                  f"please try again in a few minutes"])
+    if user_max_concurrent and running["user"] >= user_max_concurrent:
+        return Admission(REJECT, [f"you already have {_jobs(running['user'])} running "
+                                  f"(limit {user_max_concurrent}); try again when one finishes"])
+    if team_max_concurrent and running["team"] >= team_max_concurrent:
+        return Admission(REJECT, [f"your workspace already has {_jobs(running['team'])} running "
+                                  f"(limit {team_max_concurrent})"])
+
+    window = f"{ADMISSION_WINDOW_HOURS:g}h"
+    keyword_limits = [
+        (max_keywords or None, None, f"the per-job limit is {max_keywords} keywords"),
+        (_remaining(user_daily_keywords, usage["keywords"]["user"]), user_daily_keywords,
+         f"your {window} quota is {user_daily_keywords} keywords"),
+        (_remaining(team_daily_keywords, usage["keywords"]["team"]), team_daily_keywords,
+         f"your workspace's {window} quota is {team_daily_keywords} keywords"),
+    ]
+    loaded = capacity and degrade_load and running["all"] >= capacity * degrade_load
+    if loaded:
+        keyword_limits.append((busy_max_keywords or None, None, "the service is busy"))
+
+    allowed, reasons = n_keywords, []
+    for remaining, quota, reason in keyword_limits:
+        if remaining is None or remaining >= allowed:
+            continue
+        if quota is not None and remaining == 0:
+            return Admission(REJECT, [f"{reason} and it is used up"])
+        allowed = remaining
+        reasons = [f"capped to the first {allowed} of {n_keywords} keywords ({reason})"]
+
+    research, research_reason = True, None
+    calls = estimate_cost(allowed)["calls"]
+    for remaining, reason in (
+        (_remaining(user_daily_calls, usage["calls"]["user"]), f"your {window} search quota"),
+        (_remaining(team_daily_calls, usage["calls"]["team"]), f"your workspace's {window} search quota"),
+    ):
+        if remaining is not None and remaining < calls:
+            research, research_reason = False, f"{reason} is nearly used up"
+    if loaded and research:
+        research, research_reason = False, "the service is busy"
+    if not research:
+        reasons.append(f"no live web research, outlines from cached results or templates ({research_reason})")
+
+    estimate = estimate_cost(allowed, research=research)
+    return Admission(DOWNGRADE if reasons else ACCEPT, reasons,
+                     max_keywords=allowed if allowed < n_keywords else None, research=research, estimate=estimate)
+
+
+def _in_flight(record, now, job_timeout_s):
+    if record["finished_at"] is not None:
+        return False
+    if record.get("lease_until") is not None:
+        return record["lease_until"] > now
+    return record["started_at"] > now - job_timeout_s
+
+
+def summarize_usage(records, user_id, team_id, now, window_s=None, job_timeout_s=ADMISSION_JOB_TIMEOUT_S):
+    """
+    In-flight jobs and quota usage for a user and workspace from ledger
+    records (dicts with user_id, team_id, keywords, calls, started_at,
+    finished_at and, once a worker runs the job, lease_until)
+    """
+    window_s = window_s or ADMISSION_WINDOW_HOURS * 3600
+    usage = {field: {"all": 0, "user": 0, "team": 0} for field in ("running", "keywords", "calls")}
+    for r in records:
+        scopes = ["all"]
+        if r["user_id"] == user_id:
+            scopes.append("user")
+        if team_id and r["team_id"] == team_id:
+            scopes.append("team")
+        for scope in scopes:
+            if _in_flight(r, now, job_timeout_s):
+                usage["running"][scope] += 1
+            if r["started_at"] > now - window_s:
+                usage["keywords"][scope] += r["keywords"]
+                usage["calls"][scope] += r["calls"]
+    return usage
+
+
+class MemoryLedger:
+    """
+    In-process ledger, for thread mode (jobs run where they are admitted)
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, job_id, user_id, team_id, policy):
+        """
+        Atomically read the usage, apply policy(usage) and record the job if
+        it is admitted
+        """
+        now = time.time()
+        with self._lock:
+            horizon = now - max(ADMISSION_WINDOW_HOURS * 3600, ADMISSION_JOB_TIMEOUT_S)
+            for key in [k for k, r in self._records.items() if r["started_at"] < horizon]:
+                del self._records[key]
+            decision = policy(summarize_usage(self._records.values(), user_id, team_id, now))
+            if decision.admitted:
+                self._records[job_id] = {"user_id": user_id, "team_id": team_id, "started_at": now,
+                                         "finished_at": None, **_charge(decision)}
+            return decision
+
+    def finish(self, job_id, keywords=None, calls=None):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record:
+                record["finished_at"] = time.time()
+                record.update(_actual(keywords, calls))
+
+    def restart(self, job_id):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record:
+                record["finished_at"] = None
+
+    def extend(self, job_id, lease_until):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record:
+                record["lease_until"] = lease_until
+
+
+def _charge(decision):
+    return {"keywords": decision.estimate.get("keywords", 0), "calls": decision.estimate.get("calls", 0)}
+
+
+def _actual(keywords, calls):
+    return {k: v for k, v in (("keywords", keywords), ("calls", calls)) if v is not None}
+
+
+class SQLiteLedger:
+    """
+    Ledger in a SQLite file shared by the receivers and workers of a node
+    (BEGIN IMMEDIATE makes check-and-record atomic across processes)
+    """
+
+    def __init__(self, path=ADMISSION_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS admissions (
+                job_id TEXT PRIMARY KEY, user_id TEXT, team_id TEXT, keywords INTEGER NOT NULL,
+                calls INTEGER NOT NULL, started_at REAL NOT NULL, finished_at REAL, lease_until REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS admissions_started ON admissions (started_at)")
+            if "lease_until" not in {row[1] for row in conn.execute("PRAGMA table_info(admissions)")}:
+                try:
+                    conn.execute("ALTER TABLE admissions ADD COLUMN lease_until REAL")
+                except sqlite3.OperationalError:
+                    pass  # added by another process meanwhile
+            self._local.conn = conn
+        return conn
+
+    def reserve(self, job_id, user_id, team_id, policy):
+        conn = self._conn()
+        now = time.time()
+        horizon = now - max(ADMISSION_WINDOW_HOURS * 3600, ADMISSION_JOB_TIMEOUT_S)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM admissions WHERE started_at < ?", (horizon,))
+            fields = ("user_id", "team_id", "keywords", "calls", "started_at", "finished_at", "lease_until")
+            rows = conn.execute(f"SELECT {', '.join(fields)} FROM admissions").fetchall()
+            records = [dict(zip(fields, row)) for row in rows]
+            decision = policy(summarize_usage(records, user_id, team_id, now))
+            if decision.admitted:
+                charge = _charge(decision)
+                conn.execute("INSERT OR REPLACE INTO admissions (job_id, user_id, team_id, keywords, calls, "
+                             "started_at) VALUES (?, ?, ?, ?, ?, ?)",
+                             (job_id, user_id, team_id, charge["keywords"], charge["calls"], now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return decision
+
+    def finish(self, job_id, keywords=None, calls=None):
+        actual = _actual(keywords, calls)
+        assignments = "".join(f", {k} = ?" for k in actual)
+        self._conn().execute(f"UPDATE admissions SET finished_at = ?{assignments} WHERE job_id = ?",
+                             (time.time(), *actual.values(), job_id))
+
+    def restart(self, job_id):
+        self._conn().execute("UPDATE admissions SET finished_at = NULL WHERE job_id = ?", (job_id,))
+
+    def extend(self, job_id, lease_until):
+        self._conn().execute("UPDATE admissions SET lease_until = ? WHERE job_id = ?", (lease_until, job_id))
+
+
+class RedisLedger:
+    """
+    Ledger in one Redis hash, for receivers and workers on several nodes.
+    A Redis lock serialises check-and-record.
+    """
+
+    def __init__(self, url=REDIS_URL, name=f"{JOB_QUEUE_NAME}:admission"):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.key = name
+
+    def reserve(self, job_id, user_id, team_id, policy):
+        now = time.time()
+        horizon = now - max(ADMISSION_WINDOW_HOURS * 3600, ADMISSION_JOB_TIMEOUT_S)
+        with self.client.lock(f"{self.key}:lock", timeout=10, blocking_timeout=10):
+            records = {k: json.loads(v) for k, v in self.client.hgetall(self.key).items()}
+            expired = [k for k, r in records.items() if r["started_at"] < horizon]
+            if expired:
+                self.client.hdel(self.key, *expired)
+            decision = policy(summarize_usage([r for k, r in records.items() if k not in expired],
+                                              user_id, team_id, now))
+            if decision.admitted:
+                self.client.hset(self.key, job_id, json.dumps({
+                    "user_id": user_id, "team_id": team_id, "started_at": now, "finished_at": None,
+                    **_charge(decision)}))
+        return decision
+
+    def finish(self, job_id, keywords=None, calls=None):
+        self._update(job_id, finished_at=time.time(), **_actual(keywords, calls))
+
+    def restart(self, job_id):
+        self._update(job_id, finished_at=None)
+
+    def extend(self, job_id, lease_until):
+        self._update(job_id, lease_until=lease_until)
+
+    def _update(self, job_id, **fields):
+        with self.client.lock(f"{self.key}:lock", timeout=10, blocking_timeout=10):
+            raw = self.client.hget(self.key, job_id)
+            if raw:
+                record = json.loads(raw)
+                record.update(fields)
+                self.client.hset(self.key, job_id, json.dumps(record))
+
+
+class AdmissionController:
+    """
+    Costs and admits jobs against the shared ledger
+    """
+
+    def __init__(self, ledger=None, policy=decide):
+        self._ledger = ledger
+        self._ledger_lock = threading.Lock()
+        self.policy = policy
+
+    @property
+    def ledger(self):
+        if self._ledger is None:
+            with self._ledger_lock:
+                if self._ledger is None:
+                    if ADMISSION_BACKEND == "sqlite":
+                        self._ledger = SQLiteLedger()
+                    elif ADMISSION_BACKEND == "redis":
+                        self._ledger = RedisLedger()
+                    elif ADMISSION_BACKEND == "memory":
+                        self._ledger = MemoryLedger()
+                    else:
+                        raise ValueError(f"Unknown admission backend '{ADMISSION_BACKEND}', "
+                                         f"expected memory, sqlite or redis")
+        return self._ledger
+
+    def admit(self, job_id, user_id, team_id, n_keywords):
+        """
+        Decide whether (and how) to run a job of n_keywords cleaned keywords.
+        Admitted jobs count against the caps and quotas until finish().
+        """
+        if not ADMISSION_ENABLED or n_keywords <= 0:
+            decision = Admission(ACCEPT, estimate=estimate_cost(n_keywords))
+        else:
+            try:
+                decision = self.ledger.reserve(job_id, user_id, team_id,
+                                               lambda usage: self.policy(n_keywords, usage))
+            except Exception as e:
+                # Fail open: a broken ledger must not take the bot down
+                print(f"[Admission Error] {e}")
+                decision = Admission(ACCEPT, estimate=estimate_cost(n_keywords))
+        decision.job_id = job_id
+        metrics.inc("admission_decisions_total", action=decision.action)
+        return decision
+
+    def finish(self, job_id, keywords=None, calls=None):
+        """
+        Release the job's concurrency slot and record what it actually used
+        """
+        if not ADMISSION_ENABLED:
+            return
+        try:
+            self.ledger.finish(job_id, keywords, calls)
+        except Exception as e:
+            print(f"[Admission Error] {e}")
+
+    def restart(self, job_id):
+        """
+        Count a job as running again when the queue redelivers it after a
+        failed attempt (which called finish())
+        """
+        if not ADMISSION_ENABLED:
+            return
+        try:
+            self.ledger.restart(job_id)
+        except Exception as e:
+            print(f"[Admission Error] {e}")
+
+    def extend(self, job_id, seconds=JOB_LEASE_SECONDS):
+        """
+        Hold a worker-run job's slot for another lease period. Called by the
+        worker heartbeat, so a job whose worker died (or that the queue gave
+        up on) stops counting once its lease runs out.
+        """
+        if not ADMISSION_ENABLED:
+            return
+        try:
+            self.ledger.extend(job_id, time.time() + seconds)
+        except Exception as e:
+            print(f"[Admission Error] {e}")
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,263 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# Every job's PDF and a compact JSON of its clusters/outlines are kept as
+# gzip-compressed, content-addressed blobs. Jobs can be looked up by job ID
+# or by the hash of their keyword set, so reports can be re-delivered
+# without running the pipeline again.
+ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "true").lower() != "false"
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(os.getcwd(), "artifacts"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(500 * 1024 * 1024)))  # stored (compressed) size
+ARTIFACT_MAX_AGE_DAYS = float(os.getenv("ARTIFACT_MAX_AGE_DAYS", "30"))
+ARTIFACT_GC_INTERVAL_S = int(os.getenv("ARTIFACT_GC_INTERVAL_S", "300"))
+# Identical keyword sets submitted within this window get the stored report (0 = always recompute)
+ARTIFACT_REUSE_HOURS = float(os.getenv("ARTIFACT_REUSE_HOURS", "24"))
+
+# Blobs newer than this are never swept, so a blob written just before its
+# manifest is not collected in between
+_SWEEP_GRACE_S = 300
+
+
+def keyword_set_hash(keywords):
+    """
+    Order-independent ID for a set of cleaned keywords
+    """
+    return hashlib.sha256("\n".join(sorted(set(keywords))).encode()).hexdigest()[:24]
+
+
+class ArtifactStore:
+    """
+    Files under root:
+      blobs/<ab>/<sha256>.gz   gzip-compressed content, named by the sha256 of the raw bytes
+      jobs/<job_id>.json       manifest: user, keyword hash, creation time and {name: blob}
+      keywords/<hash>          job ID of the latest job for a keyword set
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES, max_age_days=ARTIFACT_MAX_AGE_DAYS,
+                 gc_interval=ARTIFACT_GC_INTERVAL_S):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.gc_interval = gc_interval
+        self._last_gc = 0.0
+        self._gc_lock = threading.Lock()
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _blob_path(self, sha):
+        return self._path("blobs", sha[:2], sha + ".gz")
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # ---------------- Blobs ----------------
+
+    def put_blob(self, data):
+        """
+        Store bytes once per distinct content; returns (sha256, stored size)
+        """
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        if os.path.exists(path):
+            # Refresh the mtime so a concurrent sweep treats it as new
+            os.utime(path)
+            return sha, os.path.getsize(path)
+        compressed = gzip.compress(data, compresslevel=6)
+        self._write_atomic(path, compressed)
+        metrics.inc("artifact_bytes_written_total", len(compressed))
+        return sha, len(compressed)
+
+    def get_blob(self, sha):
+        with open(self._blob_path(sha), "rb") as f:
+            return gzip.decompress(f.read())
+
+    # ---------------- Jobs ----------------
+
+    def save_job(self, job_id, keywords, files, user_id=None):
+        """
+        Store a job's artifacts. files maps a name (e.g. "report.pdf") to
+        (bytes, content type). Returns the manifest.
+        """
+        with metrics.span("artifact_store", files=len(files)):
+            manifest = {
+                "job_id": job_id,
+                "user_id": user_id,
+                "keyword_hash": keyword_set_hash(keywords),
+                "created_at": time.time(),
+                "files": {},
+            }
+            for name, (data, content_type) in files.items():
+                sha, stored = self.put_blob(data)
+                manifest["files"][name] = {"sha256": sha, "size": len(data), "stored_size": stored,
+                                           "content_type": content_type}
+            self._write_atomic(self._path("jobs", f"{job_id}.json"), json.dumps(manifest).encode())
+            self._write_atomic(self._path("keywords", manifest["keyword_hash"]), job_id.encode())
+        self.maybe_gc()
+        return manifest
+
+    def add_files(self, job_id, files):
+        """
+        Attach more files to a stored job; returns the updated manifest, or
+        None if the job is not stored
+        """
+        manifest = self.load_job(job_id)
+        if manifest is None:
+            return None
+        for name, (data, content_type) in files.items():
+            sha, stored = self.put_blob(data)
+            manifest["files"][name] = {"sha256": sha, "size": len(data), "stored_size": stored,
+                                       "content_type": content_type}
+        self._write_atomic(self._path("jobs", f"{job_id}.json"), json.dumps(manifest).encode())
+        return manifest
+
+    def load_job(self, job_id):
+        if not job_id or not all(ch.isalnum() or ch in "-_" for ch in job_id):
+            return None
+        try:
+            with open(self._path("jobs", f"{job_id}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def find_by_keywords(self, keyword_hash, max_age_s=None):
+        """
+        Manifest of the latest job for a keyword set, or None if there is
+        none (or it is older than max_age_s)
+        """
+        try:
+            with open(self._path("keywords", keyword_hash)) as f:
+                job_id = f.read().strip()
+        except FileNotFoundError:
+            return None
+        manifest = self.load_job(job_id)
+        if manifest is None or (max_age_s is not None and time.time() - manifest["created_at"] > max_age_s):
+            return None
+        return manifest
+
+    def read(self, manifest, name):
+        """
+        Raw bytes of one of a job's artifacts
+        """
+        return self.get_blob(manifest["files"][name]["sha256"])
+
+    # ---------------- Garbage collection ----------------
+
+    def maybe_gc(self):
+        """
+        Run gc() in the background at most once per gc_interval
+        """
+        now = time.monotonic()
+        if now - self._last_gc < self.gc_interval:
+            return
+        self._last_gc = now
+        threading.Thread(target=self._gc_safely, daemon=True).start()
+
+    def _gc_safely(self):
+        try:
+            self.gc()
+        except Exception as e:
+            print(f"[Artifact GC Error] {e}")
+
+    def _manifests(self):
+        jobs_dir = self._path("jobs")
+        if not os.path.isdir(jobs_dir):
+            return []
+        manifests = []
+        for name in os.listdir(jobs_dir):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(jobs_dir, name)) as f:
+                        manifests.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(manifests, key=lambda m: m["created_at"])
+
+    def gc(self):
+        """
+        Drop jobs older than max_age_days, then the oldest jobs until the
+        stored size of the blobs they reference fits max_bytes, then every
+        blob and keyword entry no remaining job refers to
+        """
+        with self._gc_lock, metrics.span("artifact_gc"):
+            manifests = self._manifests()
+            now = time.time()
+            max_age_s = self.max_age_days * 86400
+            expired = [m for m in manifests if max_age_s and now - m["created_at"] > max_age_s]
+            kept = [m for m in manifests if not (max_age_s and now - m["created_at"] > max_age_s)]
+
+            # Blob -> (stored size, number of kept jobs referring to it)
+            refs = {}
+            for m in kept:
+                for f in m["files"].values():
+                    size, count = refs.get(f["sha256"], (f["stored_size"], 0))
+                    refs[f["sha256"]] = (size, count + 1)
+            total = sum(size for size, _ in refs.values())
+            while self.max_bytes and total > self.max_bytes and kept:
+                oldest = kept.pop(0)
+                expired.append(oldest)
+                for f in oldest["files"].values():
+                    size, count = refs[f["sha256"]]
+                    if count == 1:
+                        del refs[f["sha256"]]
+                        total -= size
+                    else:
+                        refs[f["sha256"]] = (size, count - 1)
+
+            for m in expired:
+                try:
+                    os.remove(self._path("jobs", f"{m['job_id']}.json"))
+                except FileNotFoundError:
+                    pass
+
+            removed_blobs, freed = 0, 0
+            blobs_dir = self._path("blobs")
+            for dirpath, _, names in os.walk(blobs_dir):
+                for name in names:
+                    path = os.path.join(dirpath, name)
+                    if not name.endswith(".gz") or name[:-3] in refs:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                        if now - stat.st_mtime < _SWEEP_GRACE_S:
+                            continue
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    removed_blobs += 1
+                    freed += stat.st_size
+
+            keywords_dir = self._path("keywords")
+            if os.path.isdir(keywords_dir):
+                for name in os.listdir(keywords_dir):
+                    path = os.path.join(keywords_dir, name)
+                    try:
+                        with open(path) as f:
+                            job_id = f.read().strip()
+                        # Checked on disk so that jobs saved during this run are kept
+                        if not os.path.exists(self._path("jobs", f"{job_id}.json")):
+                            os.remove(path)
+                    except FileNotFoundError:
+                        continue
+
+        metrics.inc("artifact_gc_bytes_freed_total", freed)
+        result = {"jobs_removed": len(expired), "blobs_removed": removed_blobs, "bytes_freed": freed,
+                  "bytes_stored": total}
+        print(f"🔹 Artifact GC: {result}")
+        return result
+
+
+artifact_store = ArtifactStore()
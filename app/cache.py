@@ -0,0 +1,388 @@
+import os
+import io
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# Where the embedding, SERP and page caches live:
+#   memory  - per process (default)
+#   sqlite  - shared by every process on a node (or a shared volume)
+#   redis   - shared by every node (needs `pip install redis`)
+# Shared backends keep a small in-process front cache.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(os.getcwd(), "cache.db"))
+CACHE_LOCAL_SIZE = int(os.getenv("CACHE_LOCAL_SIZE", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class _PendingLoad:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with per-entry expiry and request coalescing.
+
+    Concurrent get_or_load() calls for the same missing key share a single
+    loader call; the other callers wait for its result instead of issuing
+    their own request.
+    """
+
+    def __init__(self, ttl=3600, maxsize=10000, name="cache"):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key)
+        return entry[1] if entry else default
+
+    def get_many(self, keys):
+        """
+        {key: value} for the keys that are cached
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._lookup(key)
+                if entry:
+                    found[key] = entry[1]
+        return found
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def set_many(self, items, ttl=None):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """
+        Set key only if it is not cached; True if this call set it
+        """
+        with self._lock:
+            if self._lookup(key):
+                return False
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for key, calling loader() once on a miss.
+        Errors raised by the loader are passed to every waiting caller and
+        are not cached.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry:
+                metrics.inc("cache_hits_total", cache=self.name)
+                return entry[1]
+            metrics.inc("cache_misses_total", cache=self.name)
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = _PendingLoad()
+
+        if not owner:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = loader()
+            self.set(key, pending.value)
+            return pending.value
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.event.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+# ---------------- Shared caches ----------------
+
+def _encode_key(key):
+    return json.dumps(key, separators=(",", ":"))
+
+
+def _dumps(value):
+    """
+    Serialise a cache value: numpy arrays as .npy bytes, everything else as JSON
+    """
+    if type(value).__module__ == "numpy":
+        import numpy as np
+
+        buf = io.BytesIO()
+        np.save(buf, value, allow_pickle=False)
+        return b"N" + buf.getvalue()
+    return b"J" + json.dumps(value, separators=(",", ":")).encode()
+
+
+def _loads(raw):
+    if raw[:1] == b"N":
+        import numpy as np
+
+        return np.load(io.BytesIO(raw[1:]), allow_pickle=False)
+    return json.loads(raw[1:])
+
+
+class SQLiteCacheStore:
+    """
+    Cache entries in one SQLite table, shared by every process that opens the file
+    """
+
+    def __init__(self, path=CACHE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (name TEXT, key TEXT, value BLOB, "
+                         "expires_at REAL, PRIMARY KEY (name, key))")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, name, keys):
+        found, now = {}, time.time()
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT key, value FROM cache WHERE name = ? AND expires_at > ? "
+                f"AND key IN ({','.join('?' * len(chunk))})", [name, now, *chunk])
+            found.update(rows)
+        return found
+
+    def set_many(self, name, items, ttl, maxsize):
+        expires_at = time.time() + ttl if ttl != float("inf") else float("inf")
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                             [(name, key, value, expires_at) for key, value in items.items()])
+            self._writes += len(items)
+            if self._writes >= 1000:
+                # Occasional pruning: expired rows, then the soonest-expiring beyond maxsize
+                self._writes = 0
+                conn.execute("DELETE FROM cache WHERE name = ? AND expires_at <= ?", (name, time.time()))
+                conn.execute("DELETE FROM cache WHERE name = ? AND key IN (SELECT key FROM cache WHERE name = ? "
+                             "ORDER BY expires_at DESC, rowid DESC LIMIT -1 OFFSET ?)", (name, name, maxsize))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add(self, name, key, value, ttl):
+        # One statement, so concurrent adds of a key cannot both succeed;
+        # an expired row counts as absent
+        now = time.time()
+        expires_at = now + ttl if ttl != float("inf") else float("inf")
+        cursor = self._conn().execute(
+            "INSERT INTO cache VALUES (?, ?, ?, ?) ON CONFLICT (name, key) DO UPDATE "
+            "SET value = excluded.value, expires_at = excluded.expires_at WHERE cache.expires_at <= ?",
+            (name, key, value, expires_at, now))
+        return cursor.rowcount == 1
+
+    def delete(self, name, key):
+        self._conn().execute("DELETE FROM cache WHERE name = ? AND key = ?", (name, key))
+
+    def clear(self, name):
+        self._conn().execute("DELETE FROM cache WHERE name = ?", (name,))
+
+
+class RedisCacheStore:
+    """
+    Cache entries as plain Redis keys "<name>:<key>"; eviction beyond the
+    TTL is left to the server's maxmemory policy
+    """
+
+    def __init__(self, url=REDIS_URL):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def get_many(self, name, keys):
+        if not keys:
+            return {}
+        values = self.client.mget([f"{name}:{key}" for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, name, items, ttl, maxsize):
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.set(f"{name}:{key}", value, ex=None if ttl == float("inf") else int(ttl))
+        pipe.execute()
+
+    def add(self, name, key, value, ttl):
+        return bool(self.client.set(f"{name}:{key}", value, nx=True,
+                                    ex=None if ttl == float("inf") else int(ttl)))
+
+    def delete(self, name, key):
+        self.client.delete(f"{name}:{key}")
+
+    def clear(self, name):
+        for key in self.client.scan_iter(match=f"{name}:*", count=1000):
+            self.client.delete(key)
+
+
+class SharedCache:
+    """
+    TTLCache-compatible cache backed by a shared store, with an in-process
+    front cache. Store errors are logged and treated as misses so a shared
+    cache outage never fails a job.
+    """
+
+    def __init__(self, store, ttl=3600, maxsize=10000, name="cache"):
+        self.store = store
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.name = name
+        self.local = TTLCache(ttl=ttl, maxsize=min(maxsize, CACHE_LOCAL_SIZE), name=name)
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = self.local.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            encoded = {_encode_key(key): key for key in missing}
+            try:
+                remote = self.store.get_many(self.name, list(encoded))
+            except Exception as e:
+                print(f"[Shared Cache Error] {self.name}: {e}")
+                remote = {}
+            for raw_key, raw in remote.items():
+                value = _loads(raw)
+                found[encoded[raw_key]] = value
+                self.local.set(encoded[raw_key], value)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, items, ttl=None):
+        self.local.set_many(items, ttl)
+        try:
+            self.store.set_many(self.name, {_encode_key(k): _dumps(v) for k, v in items.items()},
+                                ttl or self.ttl, self.maxsize)
+        except Exception as e:
+            print(f"[Shared Cache Error] {self.name}: {e}")
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl)
+
+    def add(self, key, value, ttl=None):
+        """
+        Set key only if no process has it cached; True if this call set it.
+        Falls back to this process's cache if the store is unavailable.
+        """
+        if self.local.get(key) is not None:
+            return False
+        try:
+            added = self.store.add(self.name, _encode_key(key), _dumps(value), ttl or self.ttl)
+        except Exception as e:
+            print(f"[Shared Cache Error] {self.name}: {e}")
+            return self.local.add(key, value, ttl)
+        self.local.set(key, value, ttl)
+        return added
+
+    def invalidate(self, key):
+        self.local.invalidate(key)
+        try:
+            self.store.delete(self.name, _encode_key(key))
+        except Exception as e:
+            print(f"[Shared Cache Error] {self.name}: {e}")
+
+    def clear(self):
+        self.local.clear()
+        try:
+            self.store.clear(self.name)
+        except Exception as e:
+            print(f"[Shared Cache Error] {self.name}: {e}")
+
+    def get_or_load(self, key, loader):
+        """
+        Local hit, else shared hit, else loader(); loads are coalesced per process
+        """
+        def load_shared():
+            value = self.get(key)
+            if value is None:
+                value = loader()
+                self.set(key, value)
+            return value
+
+        return self.local.get_or_load(key, load_shared)
+
+    def __len__(self):
+        return len(self.local)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def make_cache(ttl=3600, maxsize=10000, name="cache", backend=None):
+    """
+    Cache for data worth sharing between workers (embeddings, search results,
+    scraped pages): a TTLCache, or a SharedCache on CACHE_BACKEND
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "memory":
+        return TTLCache(ttl=ttl, maxsize=maxsize, name=name)
+    if backend not in ("sqlite", "redis"):
+        raise ValueError(f"Unknown cache backend '{backend}', expected memory, sqlite or redis")
+    with _stores_lock:
+        store = _stores.get(backend)
+        if store is None:
+            store = _stores[backend] = SQLiteCacheStore() if backend == "sqlite" else RedisCacheStore()
+    return SharedCache(store, ttl=ttl, maxsize=maxsize, name=name)
@@ -1,20 +1,19 @@
 import os
 import base64
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def send_pdf_via_email(user_email, pdf_path, user_name="User"):
+SENDGRID_API_HOST = os.getenv('SENDGRID_API_HOST', 'https://api.sendgrid.com')
+
+def send_pdf_via_email(user_email, pdf_data, user_name="User"):
     """
-    Send PDF report via SendGrid email
+    Send PDF report (bytes) via SendGrid email
     """
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
+
     try:
-        # Read PDF file
-        with open(pdf_path, 'rb') as f:
-            pdf_data = f.read()
-        
         # Encode PDF for attachment
         encoded_pdf = base64.b64encode(pdf_data).decode()
         
@@ -76,7 +75,7 @@ def send_pdf_via_email(user_email, pdf_path, user_name="User"):
         message.attachment = attachment
         
         # Send email
-        sg = SendGridAPIClient(os.getenv('SENDGRID_API_KEY'))
+        sg = SendGridAPIClient(os.getenv('SENDGRID_API_KEY'), host=SENDGRID_API_HOST)
         response = sg.send(message)
         
         print(f"✅ Email sent to {user_email} with status: {response.status_code}")
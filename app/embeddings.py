@@ -0,0 +1,133 @@
+import os
+import threading
+from dotenv import load_dotenv
+from app import metrics
+from app.cache import make_cache
+
+load_dotenv()
+
+# Inference backend for keyword embeddings:
+#   torch       - full precision PyTorch (reference)
+#   torch-int8  - PyTorch with dynamically int8-quantized Linear layers
+#   onnx        - ONNX Runtime (needs `pip install optimum[onnxruntime]`)
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "paraphrase-albert-small-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 = library default
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")  # e.g. onnx/model_qint8_avx2.onnx
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "50000"))
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+
+_models = {}
+_models_lock = threading.Lock()
+# Backend that actually serves each requested backend in this process
+# (differs only after a fallback to torch)
+_serving_backend = {}
+
+# Keyword embeddings are deterministic per model and backend, so they never
+# expire; the cache is bounded by entry count instead
+embedding_cache = make_cache(ttl=float("inf"), maxsize=EMBEDDING_CACHE_SIZE, name="embeddings")
+
+
+def _load_torch(quantize=False, threads=0):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    if quantize:
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def _load_onnx(threads=0):
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer
+
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+    model_kwargs = {"provider": "CPUExecutionProvider", "session_options": session_options}
+    if EMBEDDING_ONNX_FILE:
+        model_kwargs["file_name"] = EMBEDDING_ONNX_FILE
+    return SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx", model_kwargs=model_kwargs)
+
+
+def load_model(backend=None, threads=None):
+    """
+    Build a SentenceTransformer for the given backend (no caching)
+    """
+    backend = backend or EMBEDDING_BACKEND
+    threads = EMBEDDING_THREADS if threads is None else threads
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend == "onnx":
+        return _load_onnx(threads)
+    return _load_torch(quantize=backend == "torch-int8", threads=threads)
+
+
+def get_embedding_model(backend=None):
+    """
+    Load the embedding model for a backend once per process, falling back to
+    the reference torch backend if the requested one is unavailable
+    """
+    backend = backend or EMBEDDING_BACKEND
+    model = _models.get(backend)
+    if model is None:
+        with _models_lock:
+            model = _models.get(backend)
+            if model is None:
+                try:
+                    model = load_model(backend)
+                except ImportError as e:
+                    if backend == "torch":
+                        raise
+                    print(f"[Embedding Backend Error] {backend} unavailable ({e}), using torch")
+                    model = _models.get("torch") or load_model("torch")
+                    _models["torch"] = model
+                    _serving_backend[backend] = "torch"
+                _models[backend] = model
+    return model
+
+
+def _cached_vectors(texts, backend):
+    keys = [(EMBEDDING_MODEL_NAME, backend, text) for text in texts]
+    return {text: vector for (_, _, text), vector in embedding_cache.get_many(keys).items()}
+
+
+def encode(texts, backend=None):
+    """
+    Encode a list of strings into an (n, dim) float32 array, only running
+    the model for texts that are not already cached
+    """
+    import numpy as np
+
+    backend = backend or EMBEDDING_BACKEND
+    texts = list(texts)
+    unique = list(dict.fromkeys(texts))
+    # Vectors are cached under the model and the backend that produced them.
+    # Until this process has loaded its model that is the requested backend
+    serving = _serving_backend.get(backend, backend)
+    vectors = _cached_vectors(unique, serving)
+    missing = [text for text in unique if text not in vectors]
+
+    if missing:
+        model = get_embedding_model(backend)
+        if _serving_backend.get(backend, backend) != serving:
+            # Loading fell back to torch: don't mix in the requested backend's vectors
+            serving = _serving_backend[backend]
+            vectors = _cached_vectors(unique, serving)
+            missing = [text for text in unique if text not in vectors]
+        if missing:
+            encoded = model.encode(missing, batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+            new = {text: vector.astype("float32") for text, vector in zip(missing, encoded)}
+            embedding_cache.set_many({(EMBEDDING_MODEL_NAME, serving, text): vector for text, vector in new.items()})
+            vectors.update(new)
+
+    metrics.inc("cache_hits_total", len(texts) - len(missing), cache="embeddings")
+    metrics.inc("cache_misses_total", len(missing), cache="embeddings")
+    if not texts:
+        return np.zeros((0, 0), dtype="float32")
+    return np.stack([vectors[text] for text in texts])
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from app import metrics
+from app.cache import REDIS_URL
+
+load_dotenv()
+
+# How keyword jobs are executed:
+#   thread  - on a daemon thread in the process that received the event (default)
+#   sqlite  - durable queue in a SQLite file, consumed by `python -m app.worker`
+#             processes on the same node (or a shared volume)
+#   redis   - durable queue in Redis, consumed by workers on any node
+#   memory  - in-process stand-in with the same lease/ack semantics, for tests
+#             and benchmarks
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "thread")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(os.getcwd(), "jobs.db"))
+JOB_QUEUE_NAME = os.getenv("JOB_QUEUE_NAME", "keyword_jobs")
+# A leased job not acked within this many seconds (worker died) is handed out again
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+
+class Job:
+    """
+    A leased job. (id, worker, attempt) identifies the lease, so a worker
+    whose lease expired cannot ack a job that was handed to someone else.
+    """
+
+    def __init__(self, id, payload, attempt, worker):
+        self.id = id
+        self.payload = payload
+        self.attempt = attempt
+        self.worker = worker
+
+    def __repr__(self):
+        return f"Job({self.id!r}, attempt={self.attempt}, worker={self.worker!r})"
+
+
+class MemoryQueue:
+    """
+    In-process queue with the same semantics as the durable backends
+    """
+
+    def __init__(self, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._jobs = OrderedDict()  # id -> dict(payload, status, attempts, worker, lease_until, error)
+        self._lock = threading.Lock()
+
+    def enqueue(self, payload, job_id=None):
+        job_id = job_id or uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {"payload": payload, "status": "queued", "attempts": 0,
+                                  "worker": None, "lease_until": None, "error": None}
+        metrics.inc("jobs_enqueued_total")
+        return job_id
+
+    def lease(self, worker):
+        now = time.time()
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job["status"] == "leased" and job["lease_until"] < now:
+                    if job["attempts"] >= self.max_attempts:
+                        job.update(status="dead", error="lease expired too many times")
+                        continue
+                    job["status"] = "queued"
+                if job["status"] == "queued":
+                    job.update(status="leased", attempts=job["attempts"] + 1, worker=worker,
+                               lease_until=now + self.lease_seconds)
+                    return Job(job_id, job["payload"], job["attempts"], worker)
+        return None
+
+    def _owned(self, job):
+        current = self._jobs.get(job.id)
+        if current and current["status"] == "leased" and current["worker"] == job.worker \
+                and current["attempts"] == job.attempt:
+            return current
+        return None
+
+    def extend(self, job):
+        with self._lock:
+            current = self._owned(job)
+            if current:
+                current["lease_until"] = time.time() + self.lease_seconds
+            return current is not None
+
+    def ack(self, job):
+        with self._lock:
+            current = self._owned(job)
+            if current:
+                current["status"] = "done"
+            return current is not None
+
+    def nack(self, job, error=None):
+        with self._lock:
+            current = self._owned(job)
+            if current:
+                current.update(status="dead" if job.attempt >= self.max_attempts else "queued",
+                               error=error, lease_until=None)
+            return current is not None
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return counts
+
+
+class SQLiteQueue:
+    """
+    Durable queue in one SQLite table; safe for many worker processes
+    sharing the file (BEGIN IMMEDIATE serialises leases)
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS,
+                 retention_hours=JOB_RETENTION_HOURS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_hours = retention_hours
+        self._local = threading.local()
+        self._last_prune = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, payload TEXT NOT NULL, status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0, worker TEXT, lease_until REAL, error TEXT,
+                created_at REAL NOT NULL, updated_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload, job_id=None):
+        job_id = job_id or uuid.uuid4().hex[:12]
+        now = time.time()
+        self._conn().execute("INSERT INTO jobs (id, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+                             (job_id, json.dumps(payload), now, now))
+        metrics.inc("jobs_enqueued_total")
+        return job_id
+
+    def lease(self, worker):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE jobs SET status = 'dead', error = 'lease expired too many times', updated_at = ? "
+                         "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?", (now, now, self.max_attempts))
+            row = conn.execute("SELECT id, payload, attempts FROM jobs WHERE status = 'queued' "
+                               "OR (status = 'leased' AND lease_until < ?) ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'leased', attempts = attempts + 1, worker = ?, "
+                             "lease_until = ?, updated_at = ? WHERE id = ?",
+                             (worker, now + self.lease_seconds, now, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_prune()
+        if row is None:
+            return None
+        return Job(row[0], json.loads(row[1]), row[2] + 1, worker)
+
+    def _update_owned(self, job, assignments, params):
+        cursor = self._conn().execute(
+            f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND status = 'leased' "
+            f"AND worker = ? AND attempts = ?", (*params, time.time(), job.id, job.worker, job.attempt))
+        return cursor.rowcount == 1
+
+    def extend(self, job):
+        return self._update_owned(job, "lease_until = ?", (time.time() + self.lease_seconds,))
+
+    def ack(self, job):
+        return self._update_owned(job, "status = 'done', lease_until = NULL", ())
+
+    def nack(self, job, error=None):
+        status = "dead" if job.attempt >= self.max_attempts else "queued"
+        return self._update_owned(job, "status = ?, error = ?, lease_until = NULL", (status, error))
+
+    def _maybe_prune(self):
+        if time.monotonic() - self._last_prune < 600:
+            return
+        self._last_prune = time.monotonic()
+        self._conn().execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < ?",
+                             (time.time() - self.retention_hours * 3600,))
+
+    def stats(self):
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+# Requeues expired leases (or marks them dead), then moves the oldest queued
+# job into the lease set. KEYS: pending list, lease zset, job hash prefix.
+_REDIS_LEASE = """
+local now, lease_until, worker, max_attempts = tonumber(ARGV[1]), ARGV[2], ARGV[3], tonumber(ARGV[4])
+for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+  redis.call('ZREM', KEYS[2], id)
+  if tonumber(redis.call('HGET', KEYS[3] .. id, 'attempts') or '0') >= max_attempts then
+    redis.call('HSET', KEYS[3] .. id, 'status', 'dead', 'error', 'lease expired too many times')
+  else
+    redis.call('RPUSH', KEYS[1], id)
+  end
+end
+local id = redis.call('RPOP', KEYS[1])
+if not id then return nil end
+local attempts = redis.call('HINCRBY', KEYS[3] .. id, 'attempts', 1)
+redis.call('HSET', KEYS[3] .. id, 'status', 'leased', 'worker', worker)
+redis.call('ZADD', KEYS[2], lease_until, id)
+return {id, redis.call('HGET', KEYS[3] .. id, 'payload'), attempts}
+"""
+
+# Applies a state change only if the caller still holds the lease.
+# ARGV: id, worker, attempt, action (extend|ack|requeue|dead), lease_until, error, retention seconds
+_REDIS_SETTLE = """
+local key = KEYS[3] .. ARGV[1]
+if redis.call('HGET', key, 'status') ~= 'leased' or redis.call('HGET', key, 'worker') ~= ARGV[2]
+   or redis.call('HGET', key, 'attempts') ~= ARGV[3] then
+  return 0
+end
+if ARGV[4] == 'extend' then
+  redis.call('ZADD', KEYS[2], 'XX', ARGV[5], ARGV[1])
+  return 1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+if ARGV[4] == 'ack' then
+  redis.call('HSET', key, 'status', 'done')
+  redis.call('EXPIRE', key, ARGV[7])
+elseif ARGV[4] == 'requeue' then
+  redis.call('HSET', key, 'status', 'queued', 'error', ARGV[6])
+  redis.call('LPUSH', KEYS[1], ARGV[1])
+else
+  redis.call('HSET', key, 'status', 'dead', 'error', ARGV[6])
+end
+return 1
+"""
+
+
+class RedisQueue:
+    """
+    Durable queue in Redis: a pending list, a sorted set of leases by
+    expiry and one hash per job. Leases and acks are Lua scripts so they
+    are atomic across workers on any node.
+    """
+
+    def __init__(self, url=REDIS_URL, name=JOB_QUEUE_NAME, lease_seconds=JOB_LEASE_SECONDS,
+                 max_attempts=JOB_MAX_ATTEMPTS, retention_hours=JOB_RETENTION_HOURS):
+        import redis
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.keys = [f"{name}:pending", f"{name}:leases", f"{name}:job:"]
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_s = int(retention_hours * 3600)
+        self._lease = self.client.register_script(_REDIS_LEASE)
+        self._settle = self.client.register_script(_REDIS_SETTLE)
+
+    def enqueue(self, payload, job_id=None):
+        job_id = job_id or uuid.uuid4().hex[:12]
+        pipe = self.client.pipeline()
+        pipe.hset(self.keys[2] + job_id, mapping={"payload": json.dumps(payload), "status": "queued",
+                                                  "attempts": 0, "created_at": time.time()})
+        pipe.lpush(self.keys[0], job_id)
+        pipe.execute()
+        metrics.inc("jobs_enqueued_total")
+        return job_id
+
+    def lease(self, worker):
+        now = time.time()
+        result = self._lease(keys=self.keys, args=[now, now + self.lease_seconds, worker, self.max_attempts])
+        if not result:
+            return None
+        job_id, payload, attempt = result
+        return Job(job_id, json.loads(payload), int(attempt), worker)
+
+    def _settle_job(self, job, action, error=""):
+        return bool(self._settle(keys=self.keys, args=[job.id, job.worker, job.attempt, action,
+                                                       time.time() + self.lease_seconds, error or "",
+                                                       self.retention_s]))
+
+    def extend(self, job):
+        return self._settle_job(job, "extend")
+
+    def ack(self, job):
+        return self._settle_job(job, "ack")
+
+    def nack(self, job, error=None):
+        return self._settle_job(job, "dead" if job.attempt >= self.max_attempts else "requeue", error)
+
+    def stats(self):
+        return {"queued": self.client.llen(self.keys[0]), "leased": self.client.zcard(self.keys[1])}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue(backend=None):
+    """
+    The process-wide queue for JOB_QUEUE_BACKEND (not used in thread mode)
+    """
+    global _queue
+    backend = backend or JOB_QUEUE_BACKEND
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                if backend == "sqlite":
+                    _queue = SQLiteQueue()
+                elif backend == "redis":
+                    _queue = RedisQueue()
+                elif backend == "memory":
+                    _queue = MemoryQueue()
+                else:
+                    raise ValueError(f"Unknown job queue backend '{backend}', expected sqlite, redis or memory")
+    return _queue
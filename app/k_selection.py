@@ -0,0 +1,130 @@
+import os
+import time
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# CLUSTER_K_MODE=auto scores candidate cluster counts on a sample instead of
+# using the fixed n // 8 formula
+CLUSTER_K_MODE = os.getenv("CLUSTER_K_MODE", "fixed")
+CLUSTER_K_MAX = int(os.getenv("CLUSTER_K_MAX", "30"))
+CLUSTER_K_BUDGET_S = float(os.getenv("CLUSTER_K_BUDGET_S", "2.0"))  # wall-clock seconds per job
+CLUSTER_K_SAMPLE_SIZE = int(os.getenv("CLUSTER_K_SAMPLE_SIZE", "2000"))
+CLUSTER_K_METRIC = os.getenv("CLUSTER_K_METRIC", "silhouette")  # or davies_bouldin
+CLUSTER_K_PATIENCE = int(os.getenv("CLUSTER_K_PATIENCE", "3"))
+
+
+def candidate_ks(k_min, k_max):
+    """
+    Every k up to 10, then a roughly geometric grid, so large ranges stay cheap
+    """
+    ks = set(range(k_min, min(k_max, 10) + 1))
+    k = 10
+    while k < k_max:
+        k = int(k * 1.25) + 1
+        ks.add(min(k, k_max))
+    return sorted(ks)
+
+
+def _score(sample, labels, metric):
+    from sklearn.metrics import silhouette_score, davies_bouldin_score
+
+    if metric == "davies_bouldin":
+        # Lower is better; negate so that higher is always better
+        return -davies_bouldin_score(sample, labels)
+    return silhouette_score(sample, labels)
+
+
+def _warm_init(sample, centroids, k):
+    """
+    Previous centroids plus the points furthest from them as new seeds
+    """
+    import numpy as np
+
+    if centroids is None:
+        return "k-means++"
+    distances = ((sample[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    extra = k - len(centroids)
+    seeds = sample[np.argsort(distances)[::-1][:extra]]
+    return np.vstack([centroids, seeds])
+
+
+def select_k(embeddings, k_min=2, k_max=CLUSTER_K_MAX, budget_s=CLUSTER_K_BUDGET_S,
+             sample_size=CLUSTER_K_SAMPLE_SIZE, metric=CLUSTER_K_METRIC, patience=CLUSTER_K_PATIENCE):
+    """
+    Pick a cluster count by scoring warm-started MiniBatchKMeans fits on a
+    sample of the embeddings. Stops when the time budget is used up or
+    the score has not improved for `patience` candidates.
+
+    Returns (k, report) where report has the chosen k, its score, every
+    evaluated (k, score) pair, the seconds spent and why it stopped.
+    The budget is wall-clock time: process CPU time would also count
+    other jobs' threads, and thread CPU time misses KMeans' worker threads.
+    """
+    import numpy as np
+    from sklearn.cluster import MiniBatchKMeans
+
+    n = len(embeddings)
+    k_max = max(k_min, min(k_max, n - 1))
+    rng = np.random.default_rng(42)
+    sample = np.asarray(embeddings, dtype="float32")
+    if n > sample_size:
+        sample = sample[rng.choice(n, size=sample_size, replace=False)]
+
+    start = time.perf_counter()
+    evaluated, best_k, best_score, since_best, stopped = [], k_min, float("-inf"), 0, "exhausted"
+    centroids = None
+    with metrics.span("k_select", keywords=n):
+        for k in candidate_ks(k_min, k_max):
+            if k >= len(sample):
+                break
+            kmeans = MiniBatchKMeans(n_clusters=k, init=_warm_init(sample, centroids, k), n_init=1,
+                                     random_state=42, batch_size=1024, max_iter=50)
+            labels = kmeans.fit_predict(sample)
+            centroids = kmeans.cluster_centers_
+            if len(set(labels.tolist())) < 2:
+                continue
+            score = float(_score(sample, labels, metric))
+            evaluated.append((k, round(score, 4)))
+            if score > best_score:
+                best_k, best_score, since_best = k, score, 0
+            else:
+                since_best += 1
+            if since_best >= patience:
+                stopped = "patience"
+                break
+            if time.perf_counter() - start > budget_s:
+                stopped = "budget"
+                break
+
+        # The grid is coarse above 10; try the skipped values next to the best k
+        tried = [k for k, _ in evaluated]
+        if stopped != "budget" and best_k in tried:
+            i = tried.index(best_k)
+            lower = tried[i - 1] if i > 0 else best_k
+            upper = tried[i + 1] if i + 1 < len(tried) else best_k
+            for k in [k for k in range(lower + 1, upper) if k not in tried and k < len(sample)]:
+                if time.perf_counter() - start > budget_s:
+                    stopped = "budget"
+                    break
+                kmeans = MiniBatchKMeans(n_clusters=k, n_init=1, random_state=42, batch_size=1024, max_iter=50)
+                labels = kmeans.fit_predict(sample)
+                if len(set(labels.tolist())) < 2:
+                    continue
+                score = float(_score(sample, labels, metric))
+                evaluated.append((k, round(score, 4)))
+                if score > best_score:
+                    best_k, best_score = k, score
+
+    report = {
+        "k": best_k,
+        "score": round(best_score, 4) if evaluated else None,
+        "metric": metric,
+        "evaluated": evaluated,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "stopped": stopped,
+    }
+    print(f"🔹 Auto k: chose {best_k} ({metric} {report['score']}) after {len(evaluated)} candidates "
+          f"in {report['elapsed_s']}s, stopped by {stopped}")
+    return best_k, report
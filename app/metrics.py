@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import threading
+import contextvars
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Instrumentation is off unless METRICS_ENABLED=true; when off, span() and
+# inc() return immediately without touching any shared state.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+JOB_TRACE_DIR = os.getenv("JOB_TRACE_DIR")  # also write one JSON trace file per job
+# Metrics live in each process. When several processes run on a node
+# (uvicorn WEB_CONCURRENCY workers, `python -m app.worker`), point them all at
+# one METRICS_MULTIPROC_DIR: each writes a snapshot there every
+# METRICS_FLUSH_INTERVAL_S and /metrics adds all snapshots up. Snapshots of
+# exited processes are kept so counters never go backwards; clear the
+# directory on deploy.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL_S = float(os.getenv("METRICS_FLUSH_INTERVAL_S", "5"))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_snapshot_path = None  # this process's file in METRICS_MULTIPROC_DIR, once it has metrics
+_flusher_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("job_trace", default=None)
+# The job being run, tagged even with metrics off (the profiler uses it)
+_current_job = contextvars.ContextVar("job_id", default=None)
+_job_threads = {}  # thread ident -> ID of the job whose work it is running
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """
+    Add value to a counter, e.g. inc("cache_hits_total", cache="serp")
+    """
+    if not METRICS_ENABLED:
+        return
+    if METRICS_MULTIPROC_DIR and _snapshot_path is None:
+        _start_flusher()
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_count(name, value, labels)
+
+
+def observe(name, seconds, **labels):
+    """
+    Record a duration in a histogram
+    """
+    if not METRICS_ENABLED:
+        return
+    if METRICS_MULTIPROC_DIR and _snapshot_path is None:
+        _start_flusher()
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **labels):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+
+    def set(self, **labels):
+        self.labels.update(labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        observe("pipeline_stage_seconds", duration, stage=self.stage)
+        if exc_type is not None:
+            inc("pipeline_stage_errors_total", stage=self.stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(self.stage, self.start, duration, self.labels, exc_type is not None)
+        return False
+
+
+def span(stage, **labels):
+    """
+    Time a pipeline stage: `with metrics.span("kmeans", k=8): ...`
+
+    Labels are only kept in the per-job trace; the exported histogram is
+    keyed by stage alone to keep cardinality bounded.
+    """
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(stage, labels)
+
+
+class JobTrace:
+    """
+    Spans and counters collected for one job, logged as a single JSON line
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, start, duration, labels, error):
+        entry = {"stage": stage, "offset_s": round(start - self.start, 6), "duration_s": round(duration, 6)}
+        if labels:
+            entry["labels"] = labels
+        if error:
+            entry["error"] = True
+        with self._lock:
+            self.spans.append(entry)
+
+    def add_count(self, name, value, labels):
+        key = name + "".join(f"|{k}={v}" for k, v in sorted(labels.items()))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "total_s": round(time.perf_counter() - self.start, 6),
+            "spans": sorted(self.spans, key=lambda s: s["offset_s"]),
+            "counters": self.counters,
+        }
+
+
+class _JobTraceContext:
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.trace = JobTrace(job_id) if METRICS_ENABLED else None
+
+    def __enter__(self):
+        self._job_token = _current_job.set(self.job_id)
+        if self.trace is None:
+            return None
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current_job.reset(self._job_token)
+        if self.trace is None:
+            return False
+        _current_trace.reset(self._token)
+        record = self.trace.to_dict()
+        line = json.dumps(record)
+        print(f"[Job Trace] {line}")
+        if JOB_TRACE_DIR:
+            try:
+                os.makedirs(JOB_TRACE_DIR, exist_ok=True)
+                with open(os.path.join(JOB_TRACE_DIR, f"{self.trace.job_id}.json"), "w") as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"[Job Trace Error] {e}")
+        return False
+
+
+def job_trace(job_id):
+    """
+    Collect spans and counters for everything run inside this context
+    (including worker threads started through in_current_context). With
+    metrics off only the job ID is tagged.
+    """
+    return _JobTraceContext(job_id)
+
+
+def current_job_id():
+    return _current_job.get()
+
+
+def current_trace():
+    """
+    The JobTrace of the job being run, or None, for work that finishes on
+    another thread (e.g. a shared search batch) and is recorded there
+    """
+    return _current_trace.get()
+
+
+def job_threads(job_id):
+    """
+    Idents of the threads currently running work submitted by the job
+    through in_current_context
+    """
+    return {ident for ident, owner in list(_job_threads.items()) if owner == job_id}
+
+
+def in_current_context(func):
+    """
+    Bind func to a copy of the caller's context, so spans recorded from a
+    thread pool still land in the submitting job's trace, and tag the
+    thread with the job while func runs
+    """
+    job_id = _current_job.get()
+    if not METRICS_ENABLED and job_id is None:
+        return func
+    ctx = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        ident = threading.get_ident()
+        previous = _job_threads.get(ident)
+        _job_threads[ident] = job_id
+        try:
+            return ctx.run(func, *args, **kwargs)
+        finally:
+            if previous is None:
+                _job_threads.pop(ident, None)
+            else:
+                _job_threads[ident] = previous
+    return run
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+def _local_metrics():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+    return counters, histograms
+
+
+def _start_flusher():
+    global _snapshot_path
+    with _flusher_lock:
+        if _snapshot_path is not None:
+            return
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        # Not just the pid, which a later process may reuse
+        _snapshot_path = os.path.join(METRICS_MULTIPROC_DIR, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+    threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL_S)
+        flush()
+
+
+def flush():
+    """
+    Write this process's metrics to its METRICS_MULTIPROC_DIR snapshot
+    """
+    path = _snapshot_path
+    if path is None:
+        return
+    counters, histograms = _local_metrics()
+    snapshot = {"counters": [[name, labels, value] for (name, labels), value in counters.items()],
+                "histograms": [[name, labels, hist] for (name, labels), hist in histograms.items()]}
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"[Metrics Flush Error] {e}")
+
+
+def _merged_snapshots():
+    """
+    Counters and histograms summed over every snapshot in METRICS_MULTIPROC_DIR
+    """
+    counters, histograms = {}, {}
+    for filename in os.listdir(METRICS_MULTIPROC_DIR):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(METRICS_MULTIPROC_DIR, filename)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # replaced or removed while listing
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            total = histograms.setdefault(key, {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0})
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], hist["buckets"])]
+            total["sum"] += hist["sum"]
+            total["count"] += hist["count"]
+    return counters, histograms
+
+
+def _after_fork_in_child():
+    # A forked child starts with its own, empty metrics and snapshot file
+    global _lock, _flusher_lock, _snapshot_path
+    _lock, _flusher_lock = threading.Lock(), threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _snapshot_path = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(flush)
+
+
+def render_prometheus():
+    """
+    Render all metrics in the Prometheus text exposition format: this
+    process's, or every process's with METRICS_MULTIPROC_DIR
+    """
+    lines = []
+    if METRICS_MULTIPROC_DIR and os.path.isdir(METRICS_MULTIPROC_DIR):
+        flush()
+        counters, histograms = _merged_snapshots()
+    else:
+        counters, histograms = _local_metrics()
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (n, labels), hist in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, count in zip(DURATION_BUCKETS, hist["buckets"]):
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', le)])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def serve(port):
+    """
+    Serve /metrics on its own port from a daemon thread, for processes
+    without the web app (`python -m app.worker`)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
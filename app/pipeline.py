@@ -3,34 +3,45 @@ import os
 import random
 import ast
 import requests
-import pandas as pd
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
-from scipy.spatial.distance import cdist
-import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import nltk
-from nltk.corpus import stopwords
 from collections import Counter
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-from app.email_service import send_pdf_via_email  # Your existing email function
+from app.stopwords import ENGLISH_STOPWORDS
+from app.embeddings import encode, get_embedding_model
+from app import metrics
+from app.serper import search_many, cached_search
+from app.k_selection import CLUSTER_K_MODE, CLUSTER_K_MAX, select_k
+from app.cache import make_cache
+from app.research_budget import DEGRADED_CALLS, ResearchBudget, plan_research
+
+# Heavy dependencies (torch/sentence_transformers, sklearn, scipy, numpy,
+# bs4, reportlab) are imported inside the functions that use them so that
+# importing this module stays cheap; call warm_up() to load them ahead of time.
 
 # Load environment variables
 load_dotenv()
 
-# Download stopwords
-nltk.download('stopwords')
-STOPWORDS = set(stopwords.words('english'))
+STOPWORDS = set(ENGLISH_STOPWORDS)
 
-# ---------------- Slack App ----------------
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
-session_keywords = []
+# Headings scraped from a page, reused across clusters and jobs
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "86400"))
+page_cache = make_cache(ttl=PAGE_CACHE_TTL, name="page_headings")
+
+def warm_up():
+    """
+    Import heavy dependencies and load the embedding model in advance
+    """
+    try:
+        print("🔹 Warming up models...")
+        import numpy  # noqa: F401
+        import sklearn.cluster  # noqa: F401
+        import scipy.spatial.distance  # noqa: F401
+        import bs4  # noqa: F401
+        import reportlab.pdfgen.canvas  # noqa: F401
+        get_embedding_model()
+        print("🔹 Warm-up complete")
+    except Exception as e:
+        print(f"[Warm-up Error] {e}")
 
 # ---------------- Utility ----------------
 def parse_keywords_from_text(text):
@@ -201,6 +212,9 @@ def generate_descriptive_cluster_name(keywords, embeddings):
                       if word not in STOPWORDS and word not in common_words and len(word) > 2]
     
     if not candidate_words:
+        import numpy as np
+        from scipy.spatial.distance import cdist
+
         # Fallback: use the keyword closest to centroid
         centroid = np.mean(embeddings, axis=0)
         distances = cdist([centroid], embeddings, metric='cosine')[0]
@@ -246,32 +260,62 @@ def generate_descriptive_cluster_name(keywords, embeddings):
     else:
         return f"{candidate_words[0].title()} Topics"
 
-def cluster_keywords(cleaned_keywords, max_clusters=8):
+def choose_n_clusters(n_keywords, max_clusters=8):
+    # For small number of keywords, use fewer clusters
+    if n_keywords <= 5:
+        return min(2, n_keywords)
+    return min(max_clusters, max(2, n_keywords // 8))
+
+def pick_n_clusters(embeddings, max_clusters=8, stats=None):
+    """
+    Cluster count for a fit: the fixed formula, or scored candidates when
+    CLUSTER_K_MODE=auto (the selection report is copied into stats)
+    """
+    if CLUSTER_K_MODE != "auto" or len(embeddings) <= 5:
+        return choose_n_clusters(len(embeddings), max_clusters)
+    k, report = select_k(embeddings, k_max=CLUSTER_K_MAX)
+    if stats is not None:
+        stats["k_selection"] = report
+    return k
+
+def single_cluster(cleaned_keywords):
+    """
+    Cluster list for inputs too small to cluster
+    """
+    # For single keyword, just return it as a cluster
+    if len(cleaned_keywords) == 1:
+        return [{
+            "cluster_name": cleaned_keywords[0].title(), 
+            "keywords": cleaned_keywords,
+            "category": detect_cluster_category(cleaned_keywords)
+        }]
+    return [{"cluster_name": "General Topics", "keywords": cleaned_keywords, "category": "General"}]
+
+def cluster_keywords(cleaned_keywords, max_clusters=8, stats=None):
     """
     Improved clustering with better separation and no duplicates
     """
     if len(cleaned_keywords) < 2:
-        # For single keyword, just return it as a cluster
-        if len(cleaned_keywords) == 1:
-            return [{
-                "cluster_name": cleaned_keywords[0].title(), 
-                "keywords": cleaned_keywords,
-                "category": detect_cluster_category(cleaned_keywords)
-            }]
-        return [{"cluster_name": "General Topics", "keywords": cleaned_keywords, "category": "General"}]
-    
-    model = SentenceTransformer("paraphrase-albert-small-v2")
-    embeddings = model.encode(cleaned_keywords)
+        return single_cluster(cleaned_keywords)
     
-    # For small number of keywords, use fewer clusters
-    if len(cleaned_keywords) <= 5:
-        n_clusters = min(2, len(cleaned_keywords))
-    else:
-        n_clusters = min(max_clusters, max(2, len(cleaned_keywords) // 8))
+    from sklearn.cluster import KMeans
+
+    with metrics.span("encode", keywords=len(cleaned_keywords)):
+        embeddings = encode(cleaned_keywords)
+    
+    n_clusters = pick_n_clusters(embeddings, max_clusters, stats)
     
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    labels = kmeans.fit_predict(embeddings)
+    with metrics.span("kmeans", k=n_clusters):
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+        labels = kmeans.fit_predict(embeddings)
 
+    with metrics.span("naming", clusters=n_clusters):
+        return build_named_clusters(cleaned_keywords, labels, embeddings)
+
+def build_named_clusters(cleaned_keywords, labels, embeddings):
+    """
+    Group keywords by cluster label and give each group a unique descriptive name
+    """
     clusters = {}
     for kw, label, emb in zip(cleaned_keywords, labels, embeddings):
         clusters.setdefault(label, []).append((kw, emb))
@@ -405,9 +449,15 @@ def generate_post_idea(clusters):
 
     return ideas
 
-def extract_headings(url):
+def extract_headings(url, budget=None):
+    from bs4 import BeautifulSoup
+
     try:
-        r = requests.get(url, timeout=8, headers={'User-Agent': 'Mozilla/5.0'})
+        with metrics.span("page_fetch", url=url):
+            r = requests.get(url, timeout=8, headers={'User-Agent': 'Mozilla/5.0'})
+        metrics.inc("bytes_fetched_total", len(r.content), source="page")
+        if budget is not None:
+            budget.add_bytes(len(r.content))
         soup = BeautifulSoup(r.text, 'html.parser')
         headings = []
         for h in soup.select('h1,h2,h3'):
@@ -420,20 +470,7 @@ def extract_headings(url):
             headings.append(text)
         return headings[:10]
     except Exception:
-        return []
-
-def fetch_top_search(keyword, top_n=3):
-    api_key = os.getenv("SERPER_API_KEY")
-    url = "https://google.serper.dev/search"
-    headers = {"X-API-KEY": api_key, "Content-Type": "application/json"}
-    payload = {"q": keyword, "num": top_n, "gl": "us"}
-    try:
-        r = requests.post(url, headers=headers, json=payload, timeout=5)
-        data = r.json()
-        results = [{"title": i["title"], "link": i["link"], "snippet": i.get("snippet","")}
-                   for i in data.get("organic", [])[:top_n] if i.get("title") and i.get("link")]
-        return results
-    except:
+        metrics.inc("fetch_failures_total", source="page")
         return []
 
 def generate_adaptive_outline(keyword, category=None, keywords_list=None):
@@ -524,63 +561,139 @@ def generate_adaptive_outline(keyword, category=None, keywords_list=None):
             f"Resources for Further Learning about {keyword}"
         ]
 
-def fetch_top_results(clusters, top_n_results=3):
-    outlines = []
+USEFUL_SOURCES = re.compile(
+    r"(wikipedia|medium|towardsdatascience|geeksforgeeks|tutorialspoint|ibm|microsoft|coursera|udemy|hubspot|forbes|techcrunch|moz|semrush|ahrefs|healthline|medicalnewstoday|webmd)",
+    re.I)
 
-    def process_cluster(cluster):
-        keyword = cluster["cluster_name"]
-        category = cluster.get("category", "General")
-        cluster_keywords = cluster["keywords"]
+def build_outline(cluster, headings, sources, degraded=None):
+    """
+    Outline dict for a cluster; falls back to the adaptive outline when the
+    scraped headings are too thin. degraded holds the reason the cluster
+    was not researched live, if any.
+    """
+    keyword = cluster["cluster_name"]
+    category = cluster.get("category", "General")
+
+    # Remove duplicates while preserving order
+    unique_headings = list(dict.fromkeys(headings))
+
+    # If still no headings found or too few, use adaptive outline
+    if not unique_headings or len(unique_headings) < 4:
+        unique_headings = generate_adaptive_outline(keyword, category, cluster["keywords"])
+
+    return {
+        "cluster": keyword,
+        "outline": unique_headings[:8],
+        "sources": sources[:3],
+        "category": category,
+        "degraded": degraded
+    }
 
-        serp_results = fetch_top_search(keyword)[:top_n_results]
+def fetch_top_results(clusters, top_n_results=3, budget=None, stats=None):
+    """
+    Research clusters within a per-job budget. The largest clusters get live
+    SERP lookups and page scrapes (cached results are reused for free); the
+    rest, and any cluster reached after the budget runs out, are outlined
+    from cached results only or the adaptive outline and marked degraded.
+    Outlines are returned in the order of clusters.
+    """
+    budget = budget or ResearchBudget()
+    live, degraded = plan_research(clusters, budget)
+
+    # Live SERP lookups for the highest ranked clusters the call budget covers
+    names = [c["cluster_name"] for c in live]
+    uncached = [name for name in dict.fromkeys(names) if cached_search(name, top_n_results) is None]
+    denied = set(uncached[budget.take_calls(len(uncached)):])
+    searchable = [c for c in live if c["cluster_name"] not in denied]
+    degraded += [(c, budget.exhausted or DEGRADED_CALLS) for c in live if c["cluster_name"] in denied]
+
+    # One batched search round-trip for every cluster in the job
+    with metrics.span("serp_lookup", queries=len(searchable)):
+        serp_by_keyword = search_many([c["cluster_name"] for c in searchable], top_n_results)
+
+    def page_headings(url):
+        """
+        (headings, reason) for a page: cached headings, or a live fetch if
+        the budget allows one
+        """
+        headings = page_cache.get(url)
+        if headings is not None:
+            return headings, None
+        if not budget.try_call():
+            return [], budget.exhausted or DEGRADED_CALLS
+        headings = extract_headings(url, budget)
+        if headings:
+            page_cache.set(url, headings)
+        return headings, None
 
-        useful_results = [
-            r for r in serp_results
-            if re.search(
-                r"(wikipedia|medium|towardsdatascience|geeksforgeeks|tutorialspoint|ibm|microsoft|coursera|udemy|hubspot|forbes|techcrunch|moz|semrush|ahrefs|healthline|medicalnewstoday|webmd)",
-                r["link"], re.I)
-        ]
+    def process_cluster(cluster):
+        serp_results = serp_by_keyword.get(cluster["cluster_name"], [])[:top_n_results]
+        useful_results = [r for r in serp_results if USEFUL_SOURCES.search(r["link"])]
 
-        headings, sources = [], []
+        headings, sources, reason = [], [], None
         if useful_results:
             with ThreadPoolExecutor(max_workers=3) as executor:
-                future_to_url = {executor.submit(extract_headings, r["link"]): r["link"] for r in useful_results}
+                future_to_url = {executor.submit(metrics.in_current_context(page_headings), r["link"]): r["link"]
+                                 for r in useful_results}
                 for future in as_completed(future_to_url):
-                    result = future.result()
+                    result, denied = future.result()
+                    reason = reason or denied
                     if result:
                         headings.extend(result)
                         sources.append(future_to_url[future])
 
-        # Remove duplicates while preserving order
-        seen_headings = set()
-        unique_headings = []
-        for h in headings:
-            if h not in seen_headings:
-                seen_headings.add(h)
-                unique_headings.append(h)
-
-        # If still no headings found or too few, use adaptive outline
-        if not unique_headings or len(unique_headings) < 4:
-            unique_headings = generate_adaptive_outline(keyword, category, cluster_keywords)
-
-        return {
-            "cluster": cluster["cluster_name"], 
-            "outline": unique_headings[:8],
-            "sources": sources[:3],
-            "category": category
-        }
+        # A denied fetch only degrades the cluster if no page made it into the outline
+        return build_outline(cluster, headings, sources, degraded=reason if not sources else None)
 
+    def degraded_outline(cluster, reason):
+        # Cached search results and cached page headings only; no requests
+        serp_results = cached_search(cluster["cluster_name"], top_n_results) or []
+        headings, sources = [], []
+        for r in serp_results:
+            if USEFUL_SOURCES.search(r["link"]):
+                cached = page_cache.get(r["link"])
+                if cached:
+                    headings.extend(cached)
+                    sources.append(r["link"])
+        return build_outline(cluster, headings, sources, degraded=reason)
+
+    by_name = {}
+    # Submitted largest first, so a budget that runs out mid-job hits the smallest clusters
     with ThreadPoolExecutor(max_workers=3) as executor:
-        futures = [executor.submit(process_cluster, c) for c in clusters]
+        futures = [executor.submit(metrics.in_current_context(process_cluster), c) for c in searchable]
         for f in as_completed(futures):
-            outlines.append(f.result())
-
+            outline = f.result()
+            by_name[outline["cluster"]] = outline
+    for cluster, reason in degraded:
+        by_name[cluster["cluster_name"]] = degraded_outline(cluster, reason)
+
+    outlines = [by_name[c["cluster_name"]] for c in clusters if c["cluster_name"] in by_name]
+    n_degraded = sum(1 for o in outlines if o["degraded"])
+    metrics.inc("research_degraded_clusters_total", n_degraded)
+    if stats is not None:
+        stats["research"] = dict(budget.summary(), clusters=len(outlines), degraded=n_degraded)
+    print(f"🔹 Research: {len(outlines) - n_degraded} live, {n_degraded} degraded, {budget.summary()}")
     return outlines
 
-def generate_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filename="content_report.pdf"):
-    temp = os.path.join(os.getcwd(), "reports")
-    os.makedirs(temp, exist_ok=True)
-    path = os.path.join(temp, filename)
+def generate_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filename="content_report.pdf", output=None):
+    """
+    Render the PDF report to ./reports/<filename> and return its path, or
+    into output (a binary file-like object) and return output
+    """
+    with metrics.span("pdf_render", clusters=len(clusters)):
+        return _render_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filename, output)
+
+def _render_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filename, output=None):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.lib import colors
+
+    if output is None:
+        temp = os.path.join(os.getcwd(), "reports")
+        os.makedirs(temp, exist_ok=True)
+        path = os.path.join(temp, filename)
+    else:
+        path = output
     c = canvas.Canvas(path, pagesize=A4)
     width, height = A4
 
@@ -623,6 +736,10 @@ def generate_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filena
     paragraph(f"Total Raw Keywords: {len(raw_keywords)}")
     paragraph(f"Total Cleaned Keywords: {len(cleaned)}")
     paragraph(f"Clusters Formed: {len(clusters)}")
+    degraded = [o for o in outlines if o.get("degraded")]
+    if degraded:
+        paragraph(f"Live Research: {len(outlines) - len(degraded)} of {len(outlines)} clusters "
+                  f"(the rest were outlined from cached results or templates)")
     y -= 20
 
     # ----- Uploaded Keywords -----
@@ -660,6 +777,9 @@ def generate_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filena
     for outline in outlines:
         title(f"• {outline['cluster']} ({outline.get('category', 'General')})", 
               12, color=colors.darkgreen, y_offset=20)
+        if outline.get("degraded"):
+            paragraph(f"Not researched live ({outline['degraded']}); outline from cached results or a template.",
+                      size=9, line_gap=12)
         
         for i, h in enumerate(outline.get("outline", [])[:6], 1):
             paragraph(f"{i}. {h}", size=10, line_gap=12)
@@ -673,77 +793,3 @@ def generate_pdf_report(raw_keywords, cleaned, clusters, outlines, ideas, filena
 
     c.save()
     return path
-
-# ---------------- Slack Slash Command Handler ----------------
-@app.command("/keyword")
-def handle_keyword_command(ack, respond, command, logger):
-    # Acknowledge the command request
-    ack()
-    
-    text = command.get('text', '').strip()
-    
-    if not text:
-        respond("❌ Please provide keywords after the command. Example: `/keyword ai,machine,learning` or `/keyword ['ai','machine','learning']`")
-        return
-    
-    respond(f"🔹 Processing your keywords: `{text}`")
-    
-    # Parse keywords
-    keywords = parse_keywords_from_text(text)
-    
-    if not keywords:
-        respond("""
-❌ I couldn't find any keywords to process. Please use one of these formats:
-
-• *List format:* `/keyword ['ai','machine','learning']`
-• *Comma-separated:* `/keyword ai,machine,learning`  
-• *Space-separated:* `/keyword ai machine learning`
-
-Try: `/keyword ['ai','machine','learning']`
-""")
-        return
-
-    respond(f"✅ Found {len(keywords)} keywords: {', '.join(keywords)}")
-    
-    try:
-        # Process pipeline
-        cleaned = clean_keywords(keywords)
-        respond(f"🔹 Cleaning complete: {len(cleaned)} keywords")
-        
-        clusters = cluster_keywords(cleaned)
-        respond(f"🔹 Clustering complete: {len(clusters)} meaningful clusters formed")
-        
-        ideas = generate_post_idea(clusters)
-        outlines = fetch_top_results(clusters)
-        
-        pdf_path = generate_pdf_report(keywords, cleaned, clusters, outlines, ideas)
-
-        respond("✅ Pipeline complete! PDF generated and sent via email.")
-        respond("📊 Report Summary:")
-        respond(f"   • Cleaned Keywords: {len(cleaned)}")
-        respond(f"   • Content Clusters: {len(clusters)}")
-        for cluster in clusters:
-            respond(f"   • {cluster['cluster_name']} ({cluster['category']}): {len(cluster['keywords'])} keywords")
-
-        # Send email
-        try:
-            send_pdf_via_email(pdf_path, "shahlanoura02@gmail.com")
-            respond("✅ Email sent successfully!")
-        except Exception as e:
-            logger.error(f"Email error: {e}")
-            respond(f"⚠️ PDF generated but email failed: {e}")
-
-    except Exception as e:
-        logger.error(f"Pipeline error: {e}")
-        respond(f"❌ Pipeline failed: {str(e)}")
-
-# ---------------- Slack Message Handler (fallback) ----------------
-@app.event("message")
-def handle_message_events(body, say, logger):
-    text = body.get("event", {}).get("text", "")
-    if not text:
-        return
-
-    say("👋 I see you sent a message! To process keywords, please use the slash command: `/keyword your_keywords_here`")
-    say("Example: `/keyword ai,machine,learning`")
-
@@ -0,0 +1,237 @@
+import io
+import os
+import re
+import sys
+import time
+import pstats
+import marshal
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# On-demand profiling of single jobs. A job is profiled only when its
+# command carries profile=True (set by the admin `profile <keywords>`
+# message); other jobs never create a profiler.
+PROFILE_ADMINS = {u.strip() for u in os.getenv("PROFILE_ADMINS", "").split(",") if u.strip()}
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")  # sample (stack sampling) or cprofile
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "true").lower() != "false"
+PROFILE_TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+
+# tracemalloc is process-wide: keep it on while any profiled job runs, and
+# only turn it off if it was started here (not by PYTHONTRACEMALLOC or -X)
+_tracemalloc_users = 0
+_tracemalloc_started_here = False
+_tracemalloc_lock = threading.Lock()
+
+
+# Functions that wrap a whole job; left out of the per-stage summary
+_JOB_DRIVERS = ("process_keywords_async ", "_process_keywords ", "run_job ")
+
+
+def _frame_label_parts(func):
+    filename, lineno, name = func
+    parts = filename.replace("\\", "/").split("/")
+    return f"{name} ({'/'.join(parts[-2:])}:{lineno})"
+
+
+def _frame_label(code):
+    return _frame_label_parts((code.co_filename, code.co_firstlineno, code.co_name))
+
+
+class SamplingProfiler:
+    """
+    Samples Python stacks every interval from a background thread and
+    counts them as collapsed stacks ("root;caller;callee count", the input
+    format of flamegraph.pl and speedscope). The job's own thread is
+    always sampled; pool threads only while they run work the job
+    submitted through metrics.in_current_context, so other jobs and idle
+    server threads stay out of the profile. Shares are per tick (wall
+    time), so a function running on several helper threads can exceed 100%.
+    """
+
+    def __init__(self, thread_id=None, job_id=None, interval_ms=PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id or threading.get_ident()
+        self.job_id = job_id
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.ticks = 0
+        self.elapsed = 0.0
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="job-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            self.ticks += 1
+            names = {t.ident: t.name for t in threading.enumerate()}
+            helpers = metrics.job_threads(self.job_id) if self.job_id is not None else set()
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (ident != self.thread_id and ident not in helpers):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                root = "job" if ident == self.thread_id else re.sub(r"\d+", "N", names.get(ident, "thread"))
+                self.stacks[";".join([root] + stack[::-1])] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+
+    def top(self, n=PROFILE_TOP_N):
+        """
+        [(function, self samples, total samples)] by total samples
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if frames:
+                own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        return [(label, own[label], count) for label, count in total.most_common(n)]
+
+
+class JobProfile:
+    """
+    Profiles the calling thread (and its helpers) between start() and
+    stop(), then renders the results as artifact files
+    """
+
+    def __init__(self, mode=PROFILE_MODE, trace_allocations=PROFILE_TRACEMALLOC):
+        if mode not in ("sample", "cprofile"):
+            raise ValueError(f"Unknown profile mode '{mode}', expected sample or cprofile")
+        self.mode = mode
+        self.trace_allocations = trace_allocations
+        self.sampler = None
+        self.cprofile = None
+        self.allocations = []
+        self._snapshot = None
+
+    def start(self):
+        global _tracemalloc_users, _tracemalloc_started_here
+        if self.trace_allocations:
+            with _tracemalloc_lock:
+                if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_started_here = True
+                _tracemalloc_users += 1
+            self._snapshot = tracemalloc.take_snapshot()
+        self.started = time.perf_counter()
+        if self.mode == "cprofile":
+            # Deterministic, but only sees the calling thread
+            self.cprofile = cProfile.Profile()
+            try:
+                self.cprofile.enable()
+            except ValueError as e:  # another job's cProfile is active
+                print(f"[Profiler] {e}; sampling instead")
+                self.cprofile = None
+                self.mode = "sample"
+        if self.cprofile is None:
+            self.sampler = SamplingProfiler(job_id=metrics.current_job_id()).start()
+        return self
+
+    def stop(self):
+        global _tracemalloc_users, _tracemalloc_started_here
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.elapsed = time.perf_counter() - self.started
+        if self.trace_allocations:
+            diff = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+            self.allocations = [stat for stat in diff if stat.size_diff > 0][:PROFILE_TOP_N]
+            self._snapshot = None
+            with _tracemalloc_lock:
+                _tracemalloc_users -= 1
+                if _tracemalloc_users == 0 and _tracemalloc_started_here:
+                    tracemalloc.stop()
+                    _tracemalloc_started_here = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def report(self):
+        """
+        Plain-text summary: hottest functions and top allocations
+        """
+        out = io.StringIO()
+        out.write(f"Job profile ({self.mode}), {self.elapsed:.2f}s wall\n\n")
+        if self.sampler is not None:
+            s = self.sampler
+            out.write(f"{s.samples} samples in {s.ticks} ticks of {s.interval * 1000:g} ms\n")
+            out.write(f"{'total':>7} {'self':>7}  function\n")
+            for label, own, total in s.top():
+                out.write(f"{total / max(1, s.ticks):>7.1%} {own / max(1, s.ticks):>7.1%}  {label}\n")
+        if self.cprofile is not None:
+            stats = pstats.Stats(self.cprofile, stream=out)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        if self.allocations:
+            # tracemalloc cannot attribute allocations to threads
+            out.write("\nAllocated while the job ran and still held at its end, by any thread in the process "
+                      "(tracemalloc, by line)\n")
+            for stat in self.allocations:
+                frame = stat.traceback[0]
+                out.write(f"{stat.size_diff / 1024:>10.1f} KiB {stat.count_diff:>8} blocks  "
+                          f"{frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
+
+    def summary(self, n=5):
+        """
+        A few lines for Slack: time per pipeline function, and the hottest
+        frames by self time
+        """
+        if self.sampler is not None:
+            samples = max(1, self.sampler.ticks)
+            ranked = self.sampler.top(None)
+            stages = [(label, total / samples) for label, _, total in ranked]
+            hottest = sorted(ranked, key=lambda item: -item[1])[:n]
+            hot = ", ".join(f"{label} {own / samples:.0%}" for label, own, _ in hottest)
+        else:
+            stats = pstats.Stats(self.cprofile).stats
+            stages = sorted(((_frame_label_parts(func), ct / max(self.elapsed, 1e-9))
+                             for func, (_, _, _, ct, _) in stats.items()), key=lambda item: -item[1])
+            hottest = sorted(stats.items(), key=lambda item: -item[1][2])[:n]
+            hot = ", ".join(f"{_frame_label_parts(func)} {tt:.2f}s" for func, (_, _, tt, _, _) in hottest)
+        stages = [f"{label.split(' ')[0]} {share:.0%}" for label, share in stages
+                  if "(app/" in label and not label.split(" (")[-1].startswith(("app/profiling.py", "app/metrics.py"))
+                  and not label.startswith(_JOB_DRIVERS)][:n]
+        return (f"{self.elapsed:.2f}s wall. Stages: {', '.join(stages) or 'n/a'}\n"
+                f"Hottest (self time): {hot or 'n/a'}")
+
+    def files(self):
+        """
+        {name: (bytes, content type)} for the artifact store
+        """
+        files = {"profile.txt": (self.report().encode(), "text/plain")}
+        if self.sampler is not None:
+            files["profile.collapsed"] = (self.sampler.collapsed().encode(), "text/plain")
+        if self.cprofile is not None:
+            # The format Profile.dump_stats() writes, for pstats/snakeviz
+            self.cprofile.create_stats()
+            files["profile.pstats"] = (marshal.dumps(self.cprofile.stats), "application/octet-stream")
+        return files
@@ -0,0 +1,172 @@
+import io
+import os
+import re
+import csv
+import json
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# Report output formats. A job's result (clusters, ideas and outlines, the
+# same structure stored as result.json) is rendered into each format the
+# user asked for; only `pdf` needs reportlab, and it is only rendered when
+# requested, also later from the stored result.
+REPORT_FORMATS = os.getenv("REPORT_FORMATS", "pdf")  # for requests that name no format
+BLOCKS_PER_MESSAGE = 48  # Slack allows 50 blocks per message
+_SECTION_CHARS = 2900  # and 3000 characters per section text
+
+FORMATS = {}
+
+
+class ReportFormat:
+    """
+    A registered output format: render(result) returns the payload bytes,
+    stored in the artifact store as `artifact` and uploaded as `filename`
+    (Block Kit payloads are posted as messages instead)
+    """
+
+    def __init__(self, name, render, content_type, extension, label):
+        self.name = name
+        self.render = render
+        self.content_type = content_type
+        self.artifact = f"report.{extension}"
+        self.filename = f"content_pipeline_report.{extension}"
+        self.label = label
+
+
+def register_format(name, content_type, extension, label=None):
+    def register(render):
+        FORMATS[name] = ReportFormat(name, render, content_type, extension, label or name.upper())
+        return render
+    return register
+
+
+def render_report(name, result):
+    """
+    Payload bytes of the result in one format
+    """
+    with metrics.span("report_render", format=name, clusters=len(result["clusters"])):
+        data = FORMATS[name].render(result)
+    metrics.inc("reports_rendered_total", format=name)
+    return data
+
+
+# Only a separate last token is an option, so keywords such as
+# "file format: mp4" stay keywords
+_FORMAT_OPTION = re.compile(r"(?:^|\s)(?:--)?formats?=([A-Za-z]+(?:,[A-Za-z]+)*)\s*$")
+
+
+def parse_formats(text):
+    """
+    Split a trailing `format=csv,json` (or `--format=...`) token from a
+    request. Returns (formats or None, remaining text); text without the
+    option, or naming an unknown format, is returned unchanged.
+    """
+    match = _FORMAT_OPTION.search(text or "")
+    if not match:
+        return None, text
+    names = list(dict.fromkeys(n.lower() for n in match.group(1).split(",")))
+    if any(n not in FORMATS for n in names):
+        return None, text
+    return names, text[:match.start()].rstrip()
+
+
+def default_formats():
+    return [n.strip() for n in REPORT_FORMATS.split(",") if n.strip() in FORMATS] or ["pdf"]
+
+
+def cluster_rows(result):
+    """
+    One record per cluster with its post idea and outline
+    """
+    outlines = {o["cluster"]: o for o in result["outlines"]}
+    ideas = {i["cluster"]: i["idea"] for i in result["ideas"]}
+    rows = []
+    for cluster in result["clusters"]:
+        name = cluster["cluster_name"]
+        outline = outlines.get(name, {})
+        rows.append({
+            "cluster": name,
+            "category": cluster.get("category", "General"),
+            "keywords": cluster["keywords"],
+            "post_idea": ideas.get(name, ""),
+            "outline": outline.get("outline", []),
+            "sources": outline.get("sources", []),
+            "degraded": outline.get("degraded"),
+        })
+    return rows
+
+
+@register_format("json", "application/json", "json")
+def render_json(result):
+    return json.dumps({
+        "job_id": result.get("job_id"),
+        "keywords": {"raw": len(result["raw_keywords"]), "cleaned": len(result["cleaned"])},
+        "clusters": cluster_rows(result),
+    }, separators=(",", ":")).encode()
+
+
+@register_format("csv", "text/csv", "csv")
+def render_csv(result):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["cluster", "category", "keyword_count", "keywords", "post_idea", "outline", "sources",
+                     "researched"])
+    for row in cluster_rows(result):
+        writer.writerow([row["cluster"], row["category"], len(row["keywords"]), "; ".join(row["keywords"]),
+                         row["post_idea"], " | ".join(row["outline"]), " ".join(row["sources"]),
+                         f"no ({row['degraded']})" if row["degraded"] else "live"])
+    return out.getvalue().encode()
+
+
+def _mrkdwn(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+@register_format("blocks", "application/json", "blocks.json", label="Slack message")
+def render_blocks(result):
+    """
+    JSON list of Slack messages ({"text", "blocks"}), split between
+    clusters to stay within Slack's per-message block limit
+    """
+    rows = cluster_rows(result)
+    groups = [[
+        {"type": "header", "text": {"type": "plain_text", "text": "Content Pipeline Report"}},
+        {"type": "context", "elements": [{"type": "mrkdwn", "text": (
+            f"{len(result['raw_keywords'])} keywords, {len(result['cleaned'])} after cleaning, "
+            f"{len(rows)} clusters")}]},
+    ]]
+    for row in rows:
+        keywords = ", ".join(row["keywords"][:10]) + ("…" if len(row["keywords"]) > 10 else "")
+        lines = [f"*{_mrkdwn(row['cluster'])}* ({_mrkdwn(row['category'])}, {len(row['keywords'])} keywords)"]
+        if row["post_idea"]:
+            lines.append(f"💡 {_mrkdwn(row['post_idea'])}")
+        lines += [f"{i}. {_mrkdwn(h)}" for i, h in enumerate(row["outline"][:6], 1)]
+        context = [_mrkdwn(keywords)] + [f"<{src}>" for src in row["sources"][:2]]
+        if row["degraded"]:
+            context.append(f"_not researched live ({_mrkdwn(row['degraded'])})_")
+        groups.append([
+            {"type": "section", "text": {"type": "mrkdwn", "text": "\n".join(lines)[:_SECTION_CHARS]}},
+            {"type": "context", "elements": [{"type": "mrkdwn", "text": " · ".join(context)[:_SECTION_CHARS]}]},
+            {"type": "divider"},
+        ])
+
+    messages = [[]]
+    for group in groups:
+        if len(messages[-1]) + len(group) > BLOCKS_PER_MESSAGE:
+            messages.append([])
+        messages[-1].extend(group)
+    messages = [{"text": f"Content Pipeline Report ({i} of {len(messages)})", "blocks": blocks}
+                for i, blocks in enumerate(messages, 1)]
+    return json.dumps(messages, separators=(",", ":")).encode()
+
+
+@register_format("pdf", "application/pdf", "pdf")
+def render_pdf(result):
+    from app.pipeline import generate_pdf_report
+
+    output = io.BytesIO()
+    generate_pdf_report(result["raw_keywords"], result["cleaned"], result["clusters"], result["outlines"],
+                        result["ideas"], output=output)
+    return output.getvalue()
@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from app import metrics
+
+load_dotenv()
+
+# Per-job research budget: only the largest clusters get live SERP lookups
+# and page scrapes; the rest are outlined from cached results or templates.
+# A limit of 0 disables that limit.
+RESEARCH_MAX_LIVE_CLUSTERS = int(os.getenv("RESEARCH_MAX_LIVE_CLUSTERS", "20"))
+RESEARCH_MAX_API_CALLS = int(os.getenv("RESEARCH_MAX_API_CALLS", "80"))  # SERP queries + page fetches
+RESEARCH_MAX_BYTES = int(os.getenv("RESEARCH_MAX_BYTES", str(20 * 1024 * 1024)))
+RESEARCH_MAX_SECONDS = float(os.getenv("RESEARCH_MAX_SECONDS", "60"))
+
+# Why a cluster was not researched live
+DEGRADED_RANK = "beyond top clusters"
+DEGRADED_CALLS = "API call budget"
+DEGRADED_BYTES = "download budget"
+DEGRADED_TIME = "time budget"
+DEGRADED_ADMISSION = "skipped under load or quota"
+
+
+class ResearchBudget:
+    """
+    Counts upstream calls and downloaded bytes for one job and tells callers
+    when a limit (calls, bytes or wall time) has been reached. Cache hits are
+    free and are never charged. A budget with a skip_reason allows no live
+    research at all (cached results are still used).
+    """
+
+    def __init__(self, max_live_clusters=RESEARCH_MAX_LIVE_CLUSTERS, max_calls=RESEARCH_MAX_API_CALLS,
+                 max_bytes=RESEARCH_MAX_BYTES, max_seconds=RESEARCH_MAX_SECONDS, skip_reason=None):
+        self.max_live_clusters = max_live_clusters
+        self.max_calls = max_calls
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.skip_reason = skip_reason
+        self.calls = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def exhausted(self):
+        """
+        The first limit that has been reached, or None
+        """
+        if self.skip_reason:
+            return self.skip_reason
+        if self.max_seconds and time.monotonic() - self.started > self.max_seconds:
+            return DEGRADED_TIME
+        if self.max_bytes and self.bytes >= self.max_bytes:
+            return DEGRADED_BYTES
+        if self.max_calls and self.calls >= self.max_calls:
+            return DEGRADED_CALLS
+        return None
+
+    def take_calls(self, n):
+        """
+        Charge up to n calls and return how many were granted
+        """
+        with self._lock:
+            if self.skip_reason or self.exhausted in (DEGRADED_TIME, DEGRADED_BYTES):
+                return 0
+            granted = n if not self.max_calls else max(0, min(n, self.max_calls - self.calls))
+            self.calls += granted
+        if granted < n:
+            metrics.inc("research_budget_denied_total", n - granted)
+        return granted
+
+    def try_call(self):
+        return self.take_calls(1) == 1
+
+    def add_bytes(self, n):
+        with self._lock:
+            self.bytes += n
+
+    def summary(self):
+        return {
+            "api_calls": self.calls,
+            "bytes": self.bytes,
+            "seconds": round(time.monotonic() - self.started, 3),
+        }
+
+
+def plan_research(clusters, budget):
+    """
+    Split clusters into (live, degraded) lists. Clusters are ranked by size,
+    largest first (ties keep their original order), and only the top
+    max_live_clusters are researched live. Degraded entries are
+    (cluster, reason) pairs.
+    """
+    ranked = sorted(enumerate(clusters), key=lambda item: (-len(item[1]["keywords"]), item[0]))
+    ranked = [cluster for _, cluster in ranked]
+    if budget.skip_reason:
+        return [], [(c, budget.skip_reason) for c in ranked]
+    if not budget.max_live_clusters:
+        return ranked, []
+    return ranked[:budget.max_live_clusters], [(c, DEGRADED_RANK) for c in ranked[budget.max_live_clusters:]]
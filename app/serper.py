@@ -0,0 +1,246 @@
+import os
+import time
+import threading
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from app import metrics
+from app.cache import make_cache
+
+load_dotenv()
+
+SERPER_API_URL = os.getenv("SERPER_API_URL", "https://google.serper.dev/search")
+# Serper accepts a JSON array of query objects in one POST (up to 100)
+SERPER_BATCH_ENABLED = os.getenv("SERPER_BATCH_ENABLED", "true").lower() != "false"
+SERPER_BATCH_SIZE = int(os.getenv("SERPER_BATCH_SIZE", "100"))
+# How long to wait for more queries (from this or other jobs) before sending a batch
+SERPER_BATCH_WINDOW_MS = int(os.getenv("SERPER_BATCH_WINDOW_MS", "50"))
+# Batch requests in flight at once, so one slow batch does not hold up the next
+SERPER_BATCH_CONCURRENCY = int(os.getenv("SERPER_BATCH_CONCURRENCY", "4"))
+# A batch that fails as a whole (rate limit, server error, timeout) is sent
+# again as a batch after an exponential backoff, up to this many times
+SERPER_BATCH_RETRIES = int(os.getenv("SERPER_BATCH_RETRIES", "2"))
+SERPER_BATCH_BACKOFF_S = float(os.getenv("SERPER_BATCH_BACKOFF_S", "1.0"))
+# Search results for a query change slowly; reuse them across jobs
+SERP_CACHE_TTL = int(os.getenv("SERP_CACHE_TTL", "86400"))
+
+serp_cache = make_cache(ttl=SERP_CACHE_TTL, name="serp")
+
+
+def _headers():
+    return {"X-API-KEY": os.getenv("SERPER_API_KEY"), "Content-Type": "application/json"}
+
+
+def _payload(keyword, top_n):
+    return {"q": keyword, "num": top_n, "gl": "us"}
+
+
+def _parse_results(data, top_n):
+    return [{"title": i["title"], "link": i["link"], "snippet": i.get("snippet","")}
+            for i in data.get("organic", [])[:top_n] if i.get("title") and i.get("link")]
+
+
+def fetch_top_search(keyword, top_n=3):
+    try:
+        with metrics.span("serp", query=keyword):
+            r = requests.post(SERPER_API_URL, headers=_headers(), json=_payload(keyword, top_n), timeout=5)
+        metrics.inc("serp_requests_total", mode="single")
+        metrics.inc("bytes_fetched_total", len(r.content), source="serp")
+        return _parse_results(r.json(), top_n)
+    except:
+        metrics.inc("fetch_failures_total", source="serp")
+        return []
+
+
+def fetch_top_search_batch(queries):
+    """
+    Send [(keyword, top_n), ...] as one Serper batch request.
+
+    Returns a list aligned with queries; an entry is None when the response
+    for that query was unusable. Raises when the batch failed as a whole.
+    """
+    payload = [_payload(keyword, top_n) for keyword, top_n in queries]
+    with metrics.span("serp_batch", queries=len(queries)):
+        r = requests.post(SERPER_API_URL, headers=_headers(), json=payload, timeout=10)
+    metrics.inc("serp_requests_total", mode="batch")
+    metrics.inc("bytes_fetched_total", len(r.content), source="serp")
+    r.raise_for_status()
+    data = r.json()
+    if not isinstance(data, list) or len(data) != len(queries):
+        raise ValueError(f"expected {len(queries)} results, got {len(data) if isinstance(data, list) else type(data).__name__}")
+    return [_parse_results(item, top_n) if isinstance(item, dict) and "organic" in item else None
+            for item, (_, top_n) in zip(data, queries)]
+
+
+def _retryable(error):
+    """
+    Rate limits, server errors and network failures may pass on a later
+    try; other client errors (e.g. a bad API key) will not
+    """
+    response = getattr(error, "response", None)
+    return response is None or response.status_code == 429 or response.status_code >= 500
+
+
+class SearchBatcher:
+    """
+    Collects search queries from all running jobs for a short window and
+    sends them as chunked Serper batch requests. Identical queries in the
+    same window share one result. Batches are sent concurrently. A batch
+    that failed as a whole is retried as a batch with backoff; only entries
+    that were unusable in a good response are retried individually.
+    """
+
+    def __init__(self, window=SERPER_BATCH_WINDOW_MS / 1000, max_batch=SERPER_BATCH_SIZE,
+                 concurrency=SERPER_BATCH_CONCURRENCY, retries=SERPER_BATCH_RETRIES, backoff=SERPER_BATCH_BACKOFF_S):
+        self.window = window
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self._pending = {}  # (keyword, top_n) -> [(Future, submitting job's trace or None), ...]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._send_pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="serp-batch")
+        self._fallback_pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="serp-fallback")
+
+    def submit(self, keyword, top_n=3):
+        future = Future()
+        trace = metrics.current_trace()
+        with self._cond:
+            self._pending.setdefault((keyword, top_n), []).append((future, trace))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            keys = list(self._pending)[:self.max_batch]
+            return [(key, self._pending.pop(key)) for key in keys]
+
+    def _run(self):
+        while True:
+            self._send_pool.submit(self._send, self._take_batch())
+
+    def _send(self, batch, attempt=0):
+        queries = [key for key, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = fetch_top_search_batch(queries)
+        except Exception as e:
+            self._trace(batch, start, attempt, error=True)
+            print(f"[Serper Batch Error] {e}")
+            metrics.inc("fetch_failures_total", source="serp_batch")
+            if attempt < self.retries and _retryable(e):
+                metrics.inc("serp_batch_retries_total")
+                # Resent from a timer; this sender is free for the next batch meanwhile
+                timer = threading.Timer(self._retry_delay(e, attempt), self._send_pool.submit,
+                                        args=(self._send, batch, attempt + 1))
+                timer.daemon = True
+                timer.start()
+            else:
+                # Same outcome as a failed single search: no results, and nothing cached
+                for _, waiters in batch:
+                    for future, _ in waiters:
+                        future.set_result([])
+            return
+        self._trace(batch, start, attempt)
+
+        retry = [(key, waiters) for (key, waiters), result in zip(batch, results) if result is None]
+        for (key, waiters), result in zip(batch, results):
+            if result is not None:
+                for future, _ in waiters:
+                    future.set_result(result)
+
+        if retry:
+            metrics.inc("serp_batch_fallbacks_total", len(retry))
+            for key, waiters in retry:
+                # Resolved from the fallback pool; this sender is free for the next batch
+                self._fallback_pool.submit(fetch_top_search, *key).add_done_callback(
+                    lambda done, waiters=waiters: self._resolve([future for future, _ in waiters], done))
+
+    @staticmethod
+    def _trace(batch, start, attempt, error=False):
+        """
+        The request ran on a sender thread, outside any job: record it as a
+        span in the trace of every job that had a query in the batch
+        """
+        queries = {}
+        for _, waiters in batch:
+            for trace in {trace for _, trace in waiters if trace is not None}:
+                queries[trace] = queries.get(trace, 0) + 1
+        duration = time.perf_counter() - start
+        for trace, n in queries.items():
+            trace.add_span("serp_batch", start, duration,
+                           {"queries": n, "batch_queries": len(batch), "attempt": attempt + 1}, error)
+
+    def _retry_delay(self, error, attempt):
+        delay = self.backoff * 2 ** attempt
+        try:
+            return max(delay, float(error.response.headers["Retry-After"]))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return delay
+
+    @staticmethod
+    def _resolve(futures, done):
+        for future in futures:
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = SearchBatcher()
+    return _batcher
+
+
+def cached_search(keyword, top_n=3):
+    """
+    Cached results for a query, or None without making a request
+    """
+    return serp_cache.get((keyword, top_n))
+
+
+def search_many(keywords, top_n=3):
+    """
+    Return {keyword: results} for all keywords, serving cached queries from
+    serp_cache and batching the rest when enabled
+    """
+    keywords = list(dict.fromkeys(keywords))
+    cached = serp_cache.get_many([(kw, top_n) for kw in keywords])
+    results = {kw: value for (kw, _), value in cached.items()}
+    missing = [kw for kw in keywords if kw not in results]
+    metrics.inc("cache_hits_total", len(results), cache="serp")
+    metrics.inc("cache_misses_total", len(missing), cache="serp")
+    if not missing:
+        return results
+
+    if not SERPER_BATCH_ENABLED:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {kw: executor.submit(metrics.in_current_context(fetch_top_search), kw, top_n) for kw in missing}
+    else:
+        batcher = get_batcher()
+        futures = {kw: batcher.submit(kw, top_n) for kw in missing}
+
+    fetched = {kw: future.result() for kw, future in futures.items()}
+    # Empty lists are usually failed requests; don't pin them
+    serp_cache.set_many({(kw, top_n): value for kw, value in fetched.items() if value})
+    results.update(fetched)
+    return results
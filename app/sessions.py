@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import time
+import hashlib
+from dotenv import load_dotenv
+from app import metrics
+from app.locks import file_lock
+from app.embeddings import encode
+from app.pipeline import build_named_clusters, choose_n_clusters, pick_n_clusters, single_cluster
+from app.k_selection import CLUSTER_K_MODE
+
+load_dotenv()
+
+# Per user/channel keyword sessions: follow-up submissions are merged into
+# the previous keyword set, only new keywords are embedded and only clusters
+# whose membership changed are researched again.
+KEYWORD_SESSIONS_ENABLED = os.getenv("KEYWORD_SESSIONS_ENABLED", "false").lower() == "true"
+SESSION_DIR = os.getenv("SESSION_DIR", os.path.join(os.getcwd(), "sessions"))
+SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "24"))
+# Refit when new keywords sit this many times further from their nearest
+# centroid (squared distance) than a new member of that cluster is expected to
+SESSION_DRIFT_THRESHOLD = float(os.getenv("SESSION_DRIFT_THRESHOLD", "1.5"))
+
+
+def cluster_signature(keywords):
+    """
+    Stable ID for a cluster's membership, used to reuse research for unchanged clusters
+    """
+    return hashlib.sha1("\n".join(sorted(keywords)).encode()).hexdigest()[:16]
+
+
+class KeywordSession:
+    def __init__(self, user_id, channel_id):
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.keywords = []
+        self.embeddings = None
+        self.centroids = None
+        self.labels = None
+        self.outlines = {}  # cluster signature -> outline dict
+        self.updated_at = time.time()
+        self.last_update = {}
+
+    @property
+    def key(self):
+        return f"{self.user_id}-{self.channel_id or 'dm'}"
+
+    def expired(self):
+        return time.time() - self.updated_at > SESSION_TTL_HOURS * 3600
+
+    def _fit(self, n_clusters, init=None):
+        from sklearn.cluster import KMeans
+
+        with metrics.span("kmeans", k=n_clusters, refit=init is not None):
+            if init is None:
+                kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+            else:
+                kmeans = KMeans(n_clusters=n_clusters, init=init, n_init=1, random_state=42)
+            self.labels = kmeans.fit_predict(self.embeddings)
+        self.centroids = kmeans.cluster_centers_.astype("float32")
+
+    def _cluster_spread(self):
+        """
+        Expected squared distance of a new member to each centroid. The
+        in-sample mean underestimates it since every centroid was fitted to
+        its own members, so it is scaled by (n + 1) / (n - 1); clusters of
+        one keyword take the mean spread of the others
+        """
+        import numpy as np
+
+        embeddings = self.embeddings[:len(self.labels)]
+        sq = np.sum((embeddings - self.centroids[self.labels]) ** 2, axis=1)
+        counts = np.bincount(self.labels, minlength=len(self.centroids))
+        sums = np.bincount(self.labels, weights=sq, minlength=len(self.centroids))
+        valid = (counts > 1) & (sums > 0)
+        spread = np.empty(len(self.centroids))
+        spread[valid] = sums[valid] / counts[valid] * (counts[valid] + 1) / (counts[valid] - 1)
+        spread[~valid] = spread[valid].mean() if valid.any() else 1e-9
+        return spread
+
+    def _refit_init(self, n_clusters, new_embeddings):
+        """
+        Warm start from the current centroids, seeding any extra clusters with
+        the new keywords that are furthest from every existing centroid
+        """
+        import numpy as np
+
+        init = self.centroids
+        extra = n_clusters - len(init)
+        if extra > 0:
+            distances = ((new_embeddings[:, None, :] - init[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+            seeds = new_embeddings[np.argsort(distances)[::-1][:extra]]
+            init = np.vstack([init, seeds])
+        return init[:n_clusters]
+
+    def add_keywords(self, cleaned_keywords, max_clusters=8, stats=None, max_keywords=None):
+        """
+        Merge a submission into the session and return clusters for the
+        whole session keyword set. New keywords that would grow the session
+        beyond max_keywords are dropped.
+        """
+        import numpy as np
+
+        known = set(self.keywords)
+        new_keywords = [kw for kw in dict.fromkeys(cleaned_keywords) if kw not in known]
+        if max_keywords is not None:
+            new_keywords = new_keywords[:max(0, max_keywords - len(self.keywords))]
+        self.updated_at = time.time()
+        self.last_update = {"new_keywords": len(new_keywords), "refit": False}
+
+        if not new_keywords and self.labels is not None:
+            return build_named_clusters(self.keywords, self.labels, self.embeddings)
+
+        if new_keywords:
+            with metrics.span("encode", keywords=len(new_keywords), delta=True):
+                new_embeddings = np.asarray(encode(new_keywords), dtype="float32")
+            self.keywords.extend(new_keywords)
+            self.embeddings = new_embeddings if self.embeddings is None else np.vstack([self.embeddings, new_embeddings])
+
+        if len(self.keywords) < 2:
+            return single_cluster(list(self.keywords))
+
+        if self.centroids is None:
+            self._fit(pick_n_clusters(self.embeddings, max_clusters, stats))
+            self.last_update["refit"] = True
+        else:
+            distances = ((new_embeddings[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+            new_labels = distances.argmin(axis=1)
+            drift = float((distances.min(axis=1) / self._cluster_spread()[new_labels]).mean())
+            self.last_update["drift"] = round(drift, 3)
+
+            # In auto mode k is only re-selected when a refit is due anyway
+            grown = CLUSTER_K_MODE != "auto" and choose_n_clusters(len(self.keywords), max_clusters) != len(self.centroids)
+            if drift > SESSION_DRIFT_THRESHOLD or grown:
+                n_clusters = pick_n_clusters(self.embeddings, max_clusters, stats)
+                self._fit(n_clusters, init=self._refit_init(n_clusters, new_embeddings))
+                self.last_update["refit"] = True
+            else:
+                self.labels = np.concatenate([self.labels, new_labels])
+                # Move only the centroids that received new keywords
+                for label in set(new_labels.tolist()):
+                    self.centroids[label] = self.embeddings[self.labels == label].mean(axis=0)
+
+        with metrics.span("naming", clusters=len(self.centroids)):
+            return build_named_clusters(self.keywords, self.labels, self.embeddings)
+
+    def cached_outline(self, cluster):
+        outline = self.outlines.get(cluster_signature(cluster["keywords"]))
+        if outline is None:
+            return None
+        # The name can change when numbering of duplicate names shifts
+        return dict(outline, cluster=cluster["cluster_name"])
+
+    def store_outlines(self, clusters, outlines):
+        by_name = {o["cluster"]: o for o in outlines}
+        for cluster in clusters:
+            outline = by_name.get(cluster["cluster_name"])
+            # Degraded outlines are researched again on the next submission
+            if outline is not None and not outline.get("degraded"):
+                self.outlines[cluster_signature(cluster["keywords"])] = outline
+        # Forget research for clusters that no longer exist
+        live = {cluster_signature(c["keywords"]) for c in clusters}
+        self.outlines = {sig: o for sig, o in self.outlines.items() if sig in live}
+
+
+class SessionStore:
+    """
+    Keeps sessions on disk: <key>.npz for the arrays and <key>.json for the rest
+    """
+
+    def __init__(self, root=SESSION_DIR):
+        self.root = root
+
+    def lock(self, user_id, channel_id):
+        """
+        Per-session lock so two submissions to the same session are applied
+        in turn, also across worker processes sharing SESSION_DIR
+        """
+        return file_lock(self._path(KeywordSession(user_id, channel_id).key, ".lock"))
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, re.sub(r"[^A-Za-z0-9_-]", "_", key) + ext)
+
+    def load(self, user_id, channel_id):
+        import numpy as np
+
+        session = KeywordSession(user_id, channel_id)
+        meta_path, arrays_path = self._path(session.key, ".json"), self._path(session.key, ".npz")
+        if not os.path.exists(meta_path):
+            return session
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            session.updated_at = meta["updated_at"]
+            if session.expired():
+                return KeywordSession(user_id, channel_id)
+            session.keywords = meta["keywords"]
+            session.outlines = meta.get("outlines", {})
+            if os.path.exists(arrays_path):
+                with np.load(arrays_path) as arrays:
+                    session.embeddings = arrays["embeddings"]
+                    session.centroids = arrays["centroids"] if "centroids" in arrays else None
+                    session.labels = arrays["labels"] if "labels" in arrays else None
+        except Exception as e:
+            print(f"[Session Load Error] {e}")
+            return KeywordSession(user_id, channel_id)
+        return session
+
+    def save(self, session):
+        import numpy as np
+
+        os.makedirs(self.root, exist_ok=True)
+        meta = {
+            "user_id": session.user_id,
+            "channel_id": session.channel_id,
+            "updated_at": session.updated_at,
+            "keywords": session.keywords,
+            "outlines": session.outlines,
+        }
+        arrays = {}
+        if session.embeddings is not None:
+            arrays["embeddings"] = session.embeddings
+        if session.centroids is not None:
+            arrays["centroids"] = session.centroids
+            arrays["labels"] = session.labels
+
+        arrays_path, meta_path = self._path(session.key, ".npz"), self._path(session.key, ".json")
+        if arrays:
+            with open(arrays_path + ".tmp", "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(arrays_path + ".tmp", arrays_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def delete(self, user_id, channel_id):
+        key = KeywordSession(user_id, channel_id).key
+        for ext in (".json", ".npz"):
+            try:
+                os.remove(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+
+session_store = SessionStore()
@@ -1,34 +1,110 @@
 # app/slack_app.py
 import os
 import ast
+import json
+import time
+import uuid
 import requests
 from fastapi import FastAPI, Request, BackgroundTasks
+from fastapi.responses import PlainTextResponse
 from slack_bolt import App
+from slack_sdk import WebClient
 import threading
-from slack_bolt.adapter.fastapi import SlackRequestHandler
+from contextlib import asynccontextmanager, nullcontext
+from slack_bolt.adapter.starlette.handler import to_bolt_request, to_starlette_response
+from starlette.concurrency import run_in_threadpool
 from app.pipeline import (
     clean_keywords,
     cluster_keywords,
     fetch_top_results,
     generate_post_idea,
-    generate_pdf_report
+    warm_up
 )
 from app.email_service import send_pdf_via_email
+from app.cache import TTLCache, make_cache
+from app.sessions import KEYWORD_SESSIONS_ENABLED, session_store
+from app.topic_index import TOPIC_INDEX_ENABLED, topic_index
+from app.job_queue import JOB_QUEUE_BACKEND, get_job_queue
+from app.artifacts import ARTIFACTS_ENABLED, ARTIFACT_REUSE_HOURS, artifact_store, keyword_set_hash
+from app.admission import Admission, admission_controller
+from app.research_budget import ResearchBudget, DEGRADED_ADMISSION
+from app.profiling import PROFILE_ADMINS, JobProfile
+from app.report_formats import FORMATS, default_formats, parse_formats, render_report
+from app import metrics
 
 # ------------------- Initialize Slack Bolt App -------------------
 
 SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")
 SLACK_SIGNING_SECRET = os.environ.get("SLACK_SIGNING_SECRET")
+SLACK_API_URL = os.environ.get("SLACK_API_URL", WebClient.BASE_URL)
 
 if not SLACK_BOT_TOKEN or not SLACK_SIGNING_SECRET:
     raise ValueError("Slack tokens not found in environment variables.")
 
+# Set SLACK_TOKEN_VERIFICATION=false to skip the auth.test call at import
+# time (offline starts, startup benchmarks)
+SLACK_TOKEN_VERIFICATION = os.environ.get("SLACK_TOKEN_VERIFICATION", "true").lower() != "false"
+
+# socket: main.py holds a Socket Mode connection
+# http:   Slack posts to /slack/events on the FastAPI app (uvicorn, any number of workers)
+SLACK_MODE = os.environ.get("SLACK_MODE", "socket")
+
+# With a durable JOB_QUEUE_BACKEND jobs run in `python -m app.worker`
+# processes, plus this many worker threads in each receiving process
+RECEIVER_WORKERS = int(os.environ.get("RECEIVER_WORKERS", "0"))
+
 # ✅ Define App before decorators
-slack_app = App(token=SLACK_BOT_TOKEN, signing_secret=SLACK_SIGNING_SECRET)
+slack_app = App(
+    token=SLACK_BOT_TOKEN,
+    signing_secret=SLACK_SIGNING_SECRET,
+    token_verification_enabled=SLACK_TOKEN_VERIFICATION,
+    # In HTTP mode the response is only sent once the ack listener returned;
+    # the work itself happens in lazy listeners
+    process_before_response=SLACK_MODE == "http"
+)
+# Bolt builds its client from the token (passing our own client as well
+# logs a warning on every start); listener clients copy its base URL
+slack_app.client.base_url = SLACK_API_URL
+
+_job_runners_started = False
+
+def start_job_runners():
+    """
+    Warm up the models and start embedded queue workers if this process
+    runs jobs (once per process)
+    """
+    global _job_runners_started
+    if _job_runners_started:
+        return
+    _job_runners_started = True
+    runs_jobs = JOB_QUEUE_BACKEND == "thread" or RECEIVER_WORKERS > 0
+    if runs_jobs and os.environ.get("PRELOAD_MODELS", "true").lower() != "false":
+        # Load the embedding model in the background, so the bot is reachable
+        # immediately and the first job does not pay the full cold start
+        threading.Thread(target=warm_up, daemon=True).start()
+    if JOB_QUEUE_BACKEND != "thread" and RECEIVER_WORKERS > 0:
+        from app.worker import Worker
+        Worker(concurrency=RECEIVER_WORKERS).start()
+
+@asynccontextmanager
+async def lifespan(_app):
+    # Each uvicorn worker process starts its own runners
+    if SLACK_MODE == "http":
+        start_job_runners()
+    yield
 
 # FastAPI setup
-app = FastAPI()
-handler = SlackRequestHandler(slack_app)
+app = FastAPI(lifespan=lifespan)
+
+# Event IDs already handled, so Slack retries do not start a job twice
+# (shared between workers with CACHE_BACKEND=sqlite/redis)
+seen_events = make_cache(ttl=3600, maxsize=100000, name="slack_events")
+
+# Profiles and DM channel IDs are fixed per user, so repeat jobs should not
+# spend Slack rate-limit budget looking them up again.
+SLACK_USER_CACHE_TTL = int(os.environ.get("SLACK_USER_CACHE_TTL", "3600"))
+user_profile_cache = TTLCache(ttl=SLACK_USER_CACHE_TTL, name="slack_user_profile")
+dm_channel_cache = TTLCache(ttl=SLACK_USER_CACHE_TTL, name="slack_dm_channel")
 
 # ------------------- Helpers -------------------
 
@@ -79,24 +155,225 @@ def parse_keywords_from_text(raw_text):
     return list(dict.fromkeys(keywords))
 
 
+def get_user_profile(slack_app, user_id):
+    """
+    Return the user's Slack profile, calling users.info only on a cache miss.
+    """
+    def load():
+        response = slack_app.client.users_info(user=user_id)
+        return response["user"]["profile"]
+
+    return user_profile_cache.get_or_load(user_id, load)
+
+
 def get_user_email(slack_app, user_id):
     try:
-        response = slack_app.client.users_info(user=user_id)
-        if response["ok"]:
-            return response["user"]["profile"].get("email")
+        return get_user_profile(slack_app, user_id).get("email")
     except Exception as e:
         print(f"[Email Fetch Error] {e}")
     return None
 
+
+def get_dm_channel_id(slack_app, user_id):
+    """
+    Return the DM channel ID for a user, calling conversations.open only on a cache miss.
+    """
+    def load():
+        response = slack_app.client.conversations_open(users=user_id)
+        return response["channel"]["id"]
+
+    return dm_channel_cache.get_or_load(user_id, load)
+
 # ------------------- Main Processing -------------------
 
+def cluster_and_research(cleaned, user_id, channel_id, stats=None, budget=None, max_keywords=None):
+    """
+    Cluster keywords and fetch outlines within the research budget. With
+    keyword sessions enabled the submission is merged into the user's
+    session for this channel and only clusters whose membership changed are
+    researched again.
+
+    Returns (session keywords, clusters, outlines, summary line or None).
+    Clustering details (e.g. automatic k selection) are added to stats.
+    max_keywords (from admission) caps the session, not just this submission.
+    """
+    if not KEYWORD_SESSIONS_ENABLED:
+        clusters = cluster_keywords(cleaned, stats=stats)
+        return cleaned, clusters, fetch_top_results(clusters, budget=budget, stats=stats), None
+
+    with session_store.lock(user_id, channel_id):
+        session = session_store.load(user_id, channel_id)
+        clusters = session.add_keywords(cleaned, stats=stats, max_keywords=max_keywords)
+        cached = [session.cached_outline(c) for c in clusters]
+        stale = [c for c, outline in zip(clusters, cached) if outline is None]
+        outlines = fetch_top_results(stale, budget=budget, stats=stats) if stale else []
+        session.store_outlines(clusters, outlines)
+        session_store.save(session)
+
+    # Keep the report in cluster order, whichever outlines came from the session
+    fresh = {outline["cluster"]: outline for outline in outlines}
+    outlines = [outline or fresh.get(c["cluster_name"]) for c, outline in zip(clusters, cached)]
+    outlines = [outline for outline in outlines if outline is not None]
+
+    summary = None
+    if len(session.keywords) > len(cleaned):
+        summary = (f"♻️ Added {session.last_update['new_keywords']} new keywords to your session "
+                   f"({len(session.keywords)} total); researched {len(stale)} of {len(clusters)} clusters. "
+                   f"Send `keyword reset` to start over.")
+    return list(session.keywords), clusters, outlines, summary
+
+def find_reusable_report(cleaned, user_id, channel_id):
+    """
+    Manifest of a recent stored report for exactly this keyword set, or None.
+    With keyword sessions a report is only reused when the submission adds
+    nothing to the session (so the session's report would be identical).
+    """
+    if not ARTIFACTS_ENABLED or not ARTIFACT_REUSE_HOURS:
+        return None
+    keywords = cleaned
+    if KEYWORD_SESSIONS_ENABLED:
+        session = session_store.load(user_id, channel_id)
+        if not session.keywords or not set(cleaned) <= set(session.keywords):
+            return None
+        keywords = session.keywords
+    manifest = artifact_store.find_by_keywords(keyword_set_hash(keywords), max_age_s=ARTIFACT_REUSE_HOURS * 3600)
+    if manifest is None or "result.json" not in manifest["files"]:
+        return None
+    return manifest
+
+def store_job_artifacts(job_id, user_id, result, rendered):
+    """
+    Keep the job's rendered reports and a compact JSON of its results in
+    the artifact store
+    """
+    files = {FORMATS[name].artifact: (data, FORMATS[name].content_type) for name, data in rendered.items()}
+    files["result.json"] = (json.dumps(result, separators=(",", ":"), default=str).encode(), "application/json")
+    return artifact_store.save_job(job_id, result["cleaned"], files, user_id=user_id)
+
+def deliver_report(slack_app, user_id, rendered):
+    """
+    Send rendered reports to the user's DM: Block Kit reports as messages,
+    everything else as file uploads
+    """
+    dm_channel_id = get_dm_channel_id(slack_app, user_id)
+    for name, data in rendered.items():
+        with metrics.span("slack_upload", format=name):
+            if name == "blocks":
+                for message in json.loads(data):
+                    slack_app.client.chat_postMessage(channel=dm_channel_id, **message)
+                continue
+            slack_app.client.files_upload_v2(
+                channel=dm_channel_id,
+                file=data,
+                filename=FORMATS[name].filename,
+                title="Content Pipeline Report"
+            )
+    return dm_channel_id
+
+def redeliver_report(slack_app, manifest, user_id, formats):
+    """
+    Send a stored report to the user's DM without running the pipeline.
+    Formats the job did not produce (e.g. a PDF for a JSON-only job) are
+    rendered from its stored result and kept for next time.
+    """
+    rendered, missing = {}, {}
+    result = None
+    for name in formats:
+        artifact = FORMATS[name].artifact
+        if artifact in manifest["files"]:
+            rendered[name] = artifact_store.read(manifest, artifact)
+            continue
+        if result is None:
+            result = json.loads(artifact_store.read(manifest, "result.json"))
+        rendered[name] = missing[name] = render_report(name, result)
+    if missing:
+        artifact_store.add_files(manifest["job_id"], {
+            FORMATS[name].artifact: (data, FORMATS[name].content_type) for name, data in missing.items()})
+    deliver_report(slack_app, user_id, rendered)
+    metrics.inc("reports_redelivered_total")
+
+def with_formats(command):
+    """
+    Move a trailing `format=csv,json` option from the request text into
+    the command
+    """
+    formats, text = parse_formats(command.get("text", ""))
+    return dict(command, text=text, formats=formats) if formats else command
+
+def admit_job(command, channel_id=None):
+    """
+    Cost a keyword job and ask the admission controller whether to run it
+    """
+    with metrics.span("admission"):
+        cleaned = clean_keywords(parse_keywords_from_text(command.get("text", "")))
+        n_keywords = len(cleaned)
+        if KEYWORD_SESSIONS_ENABLED and cleaned:
+            # The whole session is clustered and researched, not just this submission
+            session = session_store.load(command.get("user_id"), channel_id)
+            n_keywords = len(set(session.keywords) | set(cleaned))
+        return admission_controller.admit(command["job_id"], command.get("user_id"), command.get("team_id"),
+                                          n_keywords)
+
+def submit_job(command, channel_id=None):
+    """
+    Admit a keyword job, then run it on a local thread, or enqueue it for
+    the workers when a durable JOB_QUEUE_BACKEND is configured. Returns the
+    admission decision; rejected jobs are not started.
+    """
+    command = dict(command, job_id=command.get("job_id") or uuid.uuid4().hex[:12])
+    decision = admit_job(command, channel_id)
+    if not decision.admitted:
+        return decision
+    command["admission"] = decision.to_dict()
+    try:
+        if JOB_QUEUE_BACKEND == "thread":
+            threading.Thread(
+                target=process_keywords_async,
+                args=(command, slack_app, channel_id),
+                daemon=True
+            ).start()
+        else:
+            get_job_queue().enqueue({"command": command, "channel_id": channel_id}, job_id=command["job_id"])
+    except Exception:
+        # The job will never run; give its slot and quota back
+        admission_controller.finish(command["job_id"], 0, 0)
+        raise
+    return decision
+
 def process_keywords_async(command, slack_app, channel_id=None):
+    job_id = command.get("job_id") or uuid.uuid4().hex[:12]
+    usage = {}
+    # Profiled jobs (admin `profile` command) only; others pay nothing
+    profile = JobProfile() if command.get("profile") else None
+    if "admission" in command and "attempt" in command:
+        if command["attempt"] > 1:
+            # The failed attempt before this one released the slot
+            admission_controller.restart(job_id)
+        # Run by a queue worker: from here on the slot is held by the lease
+        # the worker's heartbeat keeps extending
+        admission_controller.extend(job_id)
     try:
-        print("🔹 Starting keyword processing...")
+        with metrics.job_trace(job_id), profile or nullcontext():
+            _process_keywords(command, slack_app, channel_id, job_id, usage)
+        if profile is not None:
+            deliver_profile(slack_app, job_id, command.get("user_id"), profile)
+    finally:
+        if "admission" in command:
+            admission_controller.finish(job_id, usage.get("keywords"), usage.get("calls"))
+
+
+def _process_keywords(command, slack_app, channel_id, job_id, usage):
+    # Once the user has been told the job completed, a retry would repeat
+    # messages and uploads, so later failures are final
+    delivering = False
+    try:
+        print(f"🔹 Starting keyword processing (job {job_id})...")
         text = command.get("text", "")
         user_id = command.get("user_id")
+        formats = command.get("formats") or default_formats()
 
-        keywords_list = parse_keywords_from_text(text)
+        with metrics.span("parse"):
+            keywords_list = parse_keywords_from_text(text)
         if not keywords_list:
             slack_app.client.chat_postMessage(
                 channel=channel_id or user_id,
@@ -106,80 +383,292 @@ def process_keywords_async(command, slack_app, channel_id=None):
 
         print(f"🔹 Keywords parsed: {keywords_list}")
 
-        cleaned = clean_keywords(keywords_list)
-        clusters = cluster_keywords(cleaned)
-        outlines = fetch_top_results(clusters)
-        ideas = generate_post_idea(clusters)
+        with metrics.span("clean", keywords=len(keywords_list)):
+            cleaned = clean_keywords(keywords_list)
 
-        print("🔹 Pipeline complete. Generating PDF...")
-        pdf_path = generate_pdf_report(
-            raw_keywords=keywords_list,
-            cleaned=cleaned,
-            clusters=clusters,
-            outlines=outlines,
-            ideas=ideas
-        )
-        print(f"🔹 PDF generated at {pdf_path}")
+        admission = Admission.from_dict(command["admission"]) if "admission" in command else None
+        if admission and admission.max_keywords and len(cleaned) > admission.max_keywords:
+            cleaned = cleaned[:admission.max_keywords]
+        budget = None if admission is None or admission.research else ResearchBudget(skip_reason=DEGRADED_ADMISSION)
 
+        # A profiled job must run the pipeline, not re-send a stored report
+        reusable = None if command.get("profile") else find_reusable_report(cleaned, user_id, channel_id)
+        if reusable:
+            created = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(reusable["created_at"]))
+            slack_app.client.chat_postMessage(
+                channel=channel_id or user_id,
+                text=f"♻️ Same keywords as report `{reusable['job_id']}` ({created}); re-sending it to your DM."
+            )
+            redeliver_report(slack_app, reusable, user_id, formats)
+            usage.update(keywords=0, calls=0)
+            metrics.inc("jobs_total", status="reused")
+            return
+
+        stats = {}
+        submitted = set(cleaned)
+        cleaned, clusters, outlines, session_summary = cluster_and_research(
+            cleaned, user_id, channel_id, stats, budget, max_keywords=admission.max_keywords if admission else None)
+        usage["keywords"] = len(cleaned)
+        # A session report also covers earlier submissions, so count their
+        # keywords as input too
+        raw_keywords = keywords_list + [kw for kw in cleaned if kw not in submitted]
+        usage["calls"] = stats.get("research", {}).get("api_calls", 0)
+        ideas = generate_post_idea(clusters)
+
+        print(f"🔹 Pipeline complete. Rendering {', '.join(formats)}...")
+        result = {
+            "job_id": job_id,
+            "raw_keywords": raw_keywords,
+            "cleaned": cleaned,
+            "clusters": clusters,
+            "outlines": outlines,
+            "ideas": ideas,
+            "stats": stats,
+        }
+        rendered = {name: render_report(name, result) for name in formats}
+
+        stored = False
+        if ARTIFACTS_ENABLED:
+            try:
+                store_job_artifacts(job_id, user_id, result, rendered)
+                stored = True
+            except Exception as e:
+                print(f"[Artifact Store Error] {e}")
+
+        delivering = True
         slack_app.client.chat_postMessage(
             channel=channel_id or user_id,
-            text=f"✅ Keyword processing completed! PDF report will be uploaded shortly."
+            text=f"✅ Keyword processing completed! Sending the report to your DM "
+                 f"({', '.join(FORMATS[name].label for name in formats)})."
+                 + (f" Report ID: `{job_id}` (send `report {job_id} [format]` to get it again)." if stored else "")
+                 + (f"\n{session_summary}" if session_summary else "")
+                 + (f"\n{format_k_selection(stats['k_selection'])}" if "k_selection" in stats else "")
+                 + (f"\n⚖️ Reduced job: {'; '.join(admission.reasons)}." if admission and admission.reasons else "")
+                 + (f"\n{format_research(stats['research'])}" if stats.get("research", {}).get("degraded")
+                    and budget is None else "")
         )
 
-        dm_response = slack_app.client.conversations_open(users=user_id)
-        dm_channel_id = dm_response["channel"]["id"]
-        with open(pdf_path, "rb") as f:
-            slack_app.client.files_upload_v2(
-                channel=dm_channel_id,
-                file=f,
-                filename="content_pipeline_report.pdf",
-                title="Content Pipeline Report"
-            )
-
-        print("🔹 PDF uploaded to Slack DM")
+        dm_channel_id = deliver_report(slack_app, user_id, rendered)
+        print("🔹 Report sent to Slack DM")
 
-        user_email = get_user_email(slack_app, user_id)
+        # The email carries the PDF, so it is only sent when a PDF was asked for
+        user_email = get_user_email(slack_app, user_id) if "pdf" in rendered else None
         if user_email:
-            if send_pdf_via_email(user_email, pdf_path, "User"):
+            with metrics.span("email"):
+                sent = send_pdf_via_email(user_email, rendered["pdf"], "User")
+            if sent:
                 slack_app.client.chat_postMessage(
                     channel=dm_channel_id,
                     text=f"📧 Report also sent to your email: {user_email}"
                 )
+            else:
+                metrics.inc("email_failures_total")
+
+        if TOPIC_INDEX_ENABLED:
+            try:
+                topic_index.add_clusters(clusters, outlines, user_id, command.get("team_id"))
+            except Exception as e:
+                print(f"[Topic Index Error] {e}")
+
+        metrics.inc("jobs_total", status="completed")
 
     except Exception as e:
         print(f"[Processing Error] {e}")
+        if not command.get("final_attempt", True) and not delivering:
+            # The worker nacks the job and a later attempt runs it again
+            metrics.inc("jobs_total", status="retried")
+            raise
+        metrics.inc("jobs_total", status="failed")
         slack_app.client.chat_postMessage(
             channel=channel_id or command.get("user_id"),
             text=f"❌ Something went wrong:\n```{e}```"
+                 + (f"\nSend `report {job_id}` to get the report again." if delivering and stored else "")
         )
 
+def deliver_profile(slack_app, job_id, user_id, profile):
+    """
+    Attach a job's profile to its artifacts and send it to the requesting
+    admin's DM
+    """
+    try:
+        files = profile.files()
+        stored = ARTIFACTS_ENABLED and artifact_store.add_files(job_id, files) is not None
+        dm_channel_id = get_dm_channel_id(slack_app, user_id)
+        slack_app.client.chat_postMessage(
+            channel=dm_channel_id,
+            text=f"🔬 Profile of job `{job_id}`: {profile.summary()}"
+                 + (f"\nStored with the job's artifacts as {', '.join(sorted(files))}." if stored else "")
+        )
+        for name, (data, _) in files.items():
+            slack_app.client.files_upload_v2(channel=dm_channel_id, file=data,
+                                             filename=f"{job_id}-{name}", title=f"Profile {name}")
+    except Exception as e:
+        print(f"[Profiler Error] {e}")
+
+def format_k_selection(report):
+    return (f"🔢 Chose {report['k']} clusters automatically ({report['metric']} {report['score']}, "
+            f"{len(report['evaluated'])} candidates in {report['elapsed_s']}s)")
+
+def format_admission(decision, accepted_text):
+    """
+    Reply to a submission: the acknowledgement, or why the job was reduced
+    or not started
+    """
+    if not decision.admitted:
+        return f"⛔ Not started: {'; '.join(decision.reasons)}."
+    if not decision.reasons:
+        return accepted_text
+    return f"{accepted_text}\n⚖️ Running a reduced job: {'; '.join(decision.reasons)}."
+
+def format_research(research):
+    return (f"⏳ Research budget reached: {research['degraded']} of {research['clusters']} clusters were "
+            f"outlined from cached results or templates (marked in the report).")
+
+def format_related_clusters(keyword, results):
+    if not results:
+        return f"🔍 No past clusters related to `{keyword}` yet."
+    lines = [f"🔍 *Past clusters related to* `{keyword}`:"]
+    for r in results:
+        lines.append(f"\n• *{r['cluster_name']}* ({r['category']}, {r['size']} keywords, similarity {r['score']:.2f})")
+        if r["outline"]:
+            lines.append("   " + " → ".join(r["outline"][:4]))
+        for src in r["sources"][:2]:
+            lines.append(f"   <{src}>")
+    return "\n".join(lines)
+
+def handle_report_request(text, user_id):
+    """
+    Re-send one of the user's stored reports (`<id> [format ...]`); returns
+    the reply text
+    """
+    job_id, _, options = (text or "").strip().partition(" ")
+    if not job_id:
+        return "❌ Please provide a report ID. Example: `report 1a2b3c4d5e6f` or `report 1a2b3c4d5e6f csv`"
+    formats, options = parse_formats(options)
+    if formats is None and options.strip():
+        names = re.sub(r"^(?:--)?formats?=", "", options.strip().lower()).replace(",", " ").split()
+        unknown = [name for name in names if name not in FORMATS]
+        if unknown:
+            return f"❌ Unknown report format {', '.join(unknown)}; choose from {', '.join(FORMATS)}"
+        formats = list(dict.fromkeys(names))
+    manifest = artifact_store.load_job(job_id)
+    if manifest is None or manifest.get("user_id") != user_id or "result.json" not in manifest["files"]:
+        return f"🔍 No stored report `{job_id}` found for you."
+    formats = formats or default_formats()
+    redeliver_report(slack_app, manifest, user_id, formats)
+    return f"📄 Re-sent report `{job_id}` ({', '.join(FORMATS[name].label for name in formats)}) to your DM."
+
+# ------------------- HTTP Routes -------------------
+
+@app.post("/slack/events")
+async def slack_events(req: Request):
+    # Events, slash commands and interactivity all use this Request URL.
+    # Bolt's dispatch is synchronous (signature check, middleware, ack
+    # listener), so run it off the event loop, which the FastAPI adapter's
+    # SlackRequestHandler.handle() does not
+    body = await req.body()
+    bolt_response = await run_in_threadpool(slack_app.dispatch, to_bolt_request(req, body))
+    return to_starlette_response(bolt_response)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # ------------------- Slack Event Handlers -------------------
+#
+# Every listener acks first and does its work in a lazy listener, so HTTP
+# requests are answered well inside Slack's 3 second window even with
+# process_before_response (HTTP mode). Lazy listeners run on Bolt's thread
+# pool; long jobs are handed to submit_job().
+
+def ack_now(ack):
+    ack()
+
+def first_delivery(body):
+    """
+    False for an event Slack already delivered (retries after a slow ack)
+    """
+    event_id = body.get("event_id")
+    if not event_id:
+        return True
+    # Add-if-absent, so concurrent deliveries to several workers start one job
+    if not seen_events.add(event_id, True):
+        metrics.inc("slack_event_retries_total")
+        return False
+    return True
 
-@slack_app.event("app_mention")
 def handle_app_mention(body, say):
     user = body["event"]["user"]
     say(f"Hello <@{user}>! I'm running on Render! 🚀")
 
-@slack_app.event("message")
-def handle_keyword_messages(event, say):
+slack_app.event("app_mention")(ack=ack_now, lazy=[handle_app_mention])
+
+def handle_keyword_messages(body, event, say):
     text = event.get("text", "")
     user_id = event.get("user")
     channel_id = event.get("channel")
 
-    if "bot_id" in event:
+    if "bot_id" in event or not first_delivery(body):
+        return
+
+    if text.lower().startswith("related "):
+        keyword = text[len("related "):].strip()
+        say(format_related_clusters(keyword, topic_index.related(keyword, user_id=user_id,
+                                                                 team_id=body.get("team_id"))))
+        return
+
+    if text.lower().startswith("report "):
+        say(handle_report_request(text[len("report "):].strip(), user_id))
+        return
+
+    if text.lower().startswith("profile "):
+        if user_id not in PROFILE_ADMINS:
+            # Not a command for anyone else; don't advertise it
+            return
+        command_like = with_formats({"user_id": user_id, "team_id": body.get("team_id"),
+                                     "text": text[len("profile "):].strip(), "profile": True})
+        say(format_admission(submit_job(command_like, channel_id),
+                             "🔬 Received keywords. Processing with the profiler on..."))
+        return
+
+    if text.lower().strip() == "keyword reset":
+        with session_store.lock(user_id, channel_id):
+            session_store.delete(user_id, channel_id)
+        say("🧹 Your keyword session for this channel has been cleared.")
         return
 
     if text.lower().startswith("keyword"):
-        say("✅ Received keywords. Processing...")
-        command_like = {"user_id": user_id, "text": text}
-        threading.Thread(
-    target=process_keywords_async,
-    args=(command_like, slack_app, channel_id),
-    daemon=True
-    ).start()
-
-@slack_app.event("file_shared")
-def handle_file_shared(event, say):
+        command_like = with_formats({"user_id": user_id, "team_id": body.get("team_id"), "text": text})
+        say(format_admission(submit_job(command_like, channel_id), "✅ Received keywords. Processing..."))
+
+slack_app.event("message")(ack=ack_now, lazy=[handle_keyword_messages])
+
+def handle_related_command(respond, command):
+    keyword = command.get("text", "").strip()
+    if not keyword:
+        respond("❌ Please provide a keyword. Example: `/related keyword research`")
+        return
+    respond(format_related_clusters(keyword, topic_index.related(keyword, user_id=command.get("user_id"),
+                                                                 team_id=command.get("team_id"))))
+
+slack_app.command("/related")(ack=ack_now, lazy=[handle_related_command])
+
+def handle_report_command(respond, command):
+    respond(handle_report_request(command.get("text", "").strip(), command.get("user_id")))
+
+slack_app.command("/report")(ack=ack_now, lazy=[handle_report_command])
+
+def handle_user_change(event):
+    # Keep cached profiles warm (and emails correct) when a user edits their profile
+    user = event.get("user", {})
+    if user.get("id") and user.get("profile"):
+        user_profile_cache.set(user["id"], user["profile"])
+
+slack_app.event("user_change")(ack=ack_now, lazy=[handle_user_change])
+
+def handle_file_shared(body, event, say):
+    if not first_delivery(body):
+        return
     try:
         file_id = event["file"]["id"]
         file_info = slack_app.client.files_info(file=file_id)
@@ -193,15 +682,17 @@ def handle_file_shared(event, say):
             # Convert CSV lines to newline-separated text
             keywords_text = "\n".join([line.strip() for line in text_content.splitlines() if line.strip()])
 
-            say("✅ File received. Processing in background...")
-
-            command_like = {"user_id": user_id, "text": keywords_text}
-            threading.Thread(
-                target=process_keywords_async,
-                args=(command_like, slack_app, None),
-                daemon=True
-            ).start()
+            command_like = {"user_id": user_id, "team_id": body.get("team_id"), "text": keywords_text}
+            # The format option is read from the end of the file's title, e.g. "keywords format=csv"
+            formats, _ = parse_formats(file_info["file"].get("title", ""))
+            if formats:
+                command_like["formats"] = formats
+            # Same session (and reply channel) as keywords typed where the file was shared
+            channel_id = event.get("channel_id") or get_dm_channel_id(slack_app, user_id)
+            say(format_admission(submit_job(command_like, channel_id), "✅ File received. Processing in background..."))
         else:
             say("❌ Failed to download the file.")
     except Exception as e:
         say(f"⚠️ Error processing uploaded file: {e}")
+
+slack_app.event("file_shared")(ack=ack_now, lazy=[handle_file_shared])
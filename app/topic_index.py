@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import uuid
+import threading
+from dotenv import load_dotenv
+from app import metrics
+from app.locks import file_lock
+from app.embeddings import encode
+from app.sessions import cluster_signature
+
+load_dotenv()
+
+# Nearest-neighbour index over every processed keyword and cluster centroid.
+# Vectors are L2-normalised float32 rows appended to a memory-mapped file;
+# once the index is large enough an IVF layer (k-means coarse quantizer)
+# restricts each query to the closest NPROBE lists.
+TOPIC_INDEX_ENABLED = os.getenv("TOPIC_INDEX_ENABLED", "true").lower() != "false"
+TOPIC_INDEX_DIR = os.getenv("TOPIC_INDEX_DIR", os.path.join(os.getcwd(), "topic_index"))
+TOPIC_INDEX_IVF_MIN_SIZE = int(os.getenv("TOPIC_INDEX_IVF_MIN_SIZE", "20000"))
+TOPIC_INDEX_NPROBE = int(os.getenv("TOPIC_INDEX_NPROBE", "8"))
+# Whose past clusters related() returns: the caller's own ("user") or
+# everything from their workspace ("team")
+TOPIC_INDEX_SCOPE = os.getenv("TOPIC_INDEX_SCOPE", "user")
+
+KIND_KEYWORD = 0
+KIND_CLUSTER = 1
+
+
+def _normalize(vectors):
+    import numpy as np
+
+    vectors = np.asarray(vectors, dtype="float32")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TopicIndex:
+    """
+    Files under root:
+      vectors.f32      n x dim float32 rows (append-only, memory-mapped for search)
+      entries.jsonl    one {"kind", "cluster_id", "text"} line per row
+      clusters.jsonl   one line per cluster with its name, outline, sources and submitter
+                       (written after its rows, so rows without a cluster are skipped)
+      ivf.npz          coarse centroids and per-row list assignments
+    """
+
+    def __init__(self, root=TOPIC_INDEX_DIR, ivf_min_size=TOPIC_INDEX_IVF_MIN_SIZE, nprobe=TOPIC_INDEX_NPROBE):
+        self.root = root
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.dim = None
+        self.entries = []
+        self.clusters = {}
+        self._vectors = None
+        self._vectors_rows = 0
+        self._ivf_centroids = None
+        self._assignments = None
+        self._ivf_trained_size = 0
+        self._lists = None
+        self._signatures = set()
+        self._lock = threading.RLock()
+        # How far entries.jsonl / clusters.jsonl have been read, and the
+        # ivf.npz version loaded; other worker processes append to the same files
+        self._offsets = {"entries.jsonl": 0, "clusters.jsonl": 0}
+        self._ivf_mtime = None
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    # ---------------- Persistence ----------------
+
+    def _read_new_lines(self, name):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            f.seek(self._offsets[name])
+            data = f.read()
+        # A writer may be mid-line; only take complete lines
+        end = data.rfind(b"\n") + 1
+        self._offsets[name] += end
+        return [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+
+    def load(self):
+        """
+        Read whatever has been appended since the last call (by this or
+        another process)
+        """
+        import numpy as np
+
+        with self._lock:
+            if self.dim is None:
+                if not os.path.exists(self._path("meta.json")):
+                    return self
+                with open(self._path("meta.json")) as f:
+                    self.dim = json.load(f)["dim"]
+            initial = not self.entries
+            self.entries.extend(self._read_new_lines("entries.jsonl"))
+            for cluster in self._read_new_lines("clusters.jsonl"):
+                self.clusters[cluster["cluster_id"]] = cluster
+                self._signatures.add((cluster.get("team_id"), cluster.get("user_id"), cluster.get("signature")))
+            if initial and os.path.exists(self._path("vectors.f32")):
+                # A crash between the two appends can leave one side longer
+                rows = os.path.getsize(self._path("vectors.f32")) // (4 * self.dim)
+                self.entries = self.entries[:rows]
+
+            ivf_path = self._path("ivf.npz")
+            mtime = os.path.getmtime(ivf_path) if os.path.exists(ivf_path) else None
+            if mtime != self._ivf_mtime:
+                self._ivf_mtime = mtime
+                self._ivf_centroids, self._assignments, self._ivf_trained_size, self._lists = None, None, 0, None
+                if mtime is not None:
+                    with np.load(ivf_path) as ivf:
+                        self._ivf_centroids = ivf["centroids"]
+                        self._assignments = ivf["assignments"]
+                        self._ivf_trained_size = int(ivf["trained_size"])
+            if self._assignments is not None and len(self._assignments) != len(self.entries):
+                # Fall back to exact search until the next insert retrains
+                self._ivf_centroids, self._assignments, self._ivf_trained_size, self._lists = None, None, 0, None
+            return self
+
+    def _vectors_view(self):
+        import numpy as np
+
+        n = len(self.entries)
+        if n == 0:
+            return np.zeros((0, self.dim or 0), dtype="float32")
+        if self._vectors is None or self._vectors_rows != n:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype="float32", mode="r", shape=(n, self.dim))
+            self._vectors_rows = n
+        return self._vectors
+
+    def _save_ivf(self):
+        import numpy as np
+
+        tmp = self._path("ivf.tmp.npz")
+        np.savez(tmp, centroids=self._ivf_centroids, assignments=self._assignments,
+                 trained_size=np.array(self._ivf_trained_size))
+        os.replace(tmp, self._path("ivf.npz"))
+        self._ivf_mtime = os.path.getmtime(self._path("ivf.npz"))
+
+    # ---------------- IVF ----------------
+
+    def _train_ivf(self):
+        import numpy as np
+        from sklearn.cluster import MiniBatchKMeans
+
+        vectors = self._vectors_view()
+        n = len(vectors)
+        nlist = max(8, int(np.sqrt(n)))
+        sample = vectors[np.random.default_rng(42).choice(n, size=min(n, nlist * 64), replace=False)]
+        with metrics.span("topic_index_train", rows=n, nlist=nlist):
+            kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=42, batch_size=4096, n_init=1)
+            kmeans.fit(sample)
+        self._ivf_centroids = _normalize(kmeans.cluster_centers_)
+        self._assignments = self._assign(vectors)
+        self._ivf_trained_size = n
+        self._lists = None
+        self._save_ivf()
+
+    def _assign(self, vectors, chunk=8192):
+        import numpy as np
+
+        out = np.empty(len(vectors), dtype="int32")
+        for start in range(0, len(vectors), chunk):
+            out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ self._ivf_centroids.T, axis=1)
+        return out
+
+    def _inverted_lists(self):
+        import numpy as np
+
+        if self._lists is None:
+            order = np.argsort(self._assignments, kind="stable")
+            bounds = np.searchsorted(self._assignments[order], np.arange(len(self._ivf_centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    # ---------------- Writes ----------------
+
+    def _write_lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        return file_lock(self._path(".lock"))
+
+    def add(self, vectors, entries):
+        """
+        Append normalised vectors with their entry metadata
+        """
+        with self._lock, self._write_lock():
+            self._append(vectors, entries)
+
+    def _truncate_to_entries(self):
+        # Callers hold the write lock, and have loaded every complete entry
+        # line. A writer (in any process) that died after appending its
+        # vectors, or part of a row or entry line, leaves rows with no entry
+        # and a torn last line; appending after them would shift every later
+        # row and glue the next entry onto the torn line
+        path = self._path("entries.jsonl")
+        if os.path.exists(path) and os.path.getsize(path) > self._offsets["entries.jsonl"]:
+            with open(path, "r+b") as f:
+                f.truncate(self._offsets["entries.jsonl"])
+        path = self._path("vectors.f32")
+        size = len(self.entries) * 4 * self.dim
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+            self._vectors, self._vectors_rows = None, 0
+
+    def _append(self, vectors, entries):
+        # Callers hold the write lock
+        import numpy as np
+
+        vectors = _normalize(vectors)
+        with self._lock:
+            self.load()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._path("meta.json"), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            self._truncate_to_entries()
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._path("entries.jsonl"), "a") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+            self.entries.extend(self._read_new_lines("entries.jsonl"))
+
+            n = len(self.entries)
+            if self._ivf_centroids is not None and n < 4 * self._ivf_trained_size:
+                self._assignments = np.concatenate([self._assignments, self._assign(vectors)])
+                self._lists = None
+                self._save_ivf()
+            elif n >= self.ivf_min_size:
+                # First build, or the index grew enough that the lists are unbalanced
+                self._train_ivf()
+
+    def add_clusters(self, clusters, outlines, user_id=None, team_id=None):
+        """
+        Index every keyword and the centroid of every cluster from a finished
+        job, recording who submitted it so related() only shows it to them
+        (or to their workspace)
+        """
+        import numpy as np
+
+        outlines_by_name = {o["cluster"]: o for o in outlines}
+        with self._lock:
+            self.load()
+            # Session follow-ups resubmit unchanged clusters; index each membership once per submitter
+            clusters = [c for c in clusters
+                        if (team_id, user_id, cluster_signature(c["keywords"])) not in self._signatures]
+        all_keywords = [kw for c in clusters for kw in c["keywords"]]
+        if not all_keywords:
+            return
+        with metrics.span("topic_index_insert", keywords=len(all_keywords)):
+            embeddings = encode(all_keywords)
+            vectors, entries, records, offset = [], [], [], 0
+            with self._lock, self._write_lock():
+                self.load()
+                for cluster in clusters:
+                    signature = cluster_signature(cluster["keywords"])
+                    n = len(cluster["keywords"])
+                    cluster_vectors = embeddings[offset:offset + n]
+                    offset += n
+                    if (team_id, user_id, signature) in self._signatures:
+                        # Indexed by another worker while this one was encoding
+                        continue
+                    cluster_id = uuid.uuid4().hex[:12]
+                    outline = outlines_by_name.get(cluster["cluster_name"], {})
+                    records.append({
+                        "cluster_id": cluster_id,
+                        "signature": signature,
+                        "user_id": user_id,
+                        "team_id": team_id,
+                        "cluster_name": cluster["cluster_name"],
+                        "category": cluster.get("category", "General"),
+                        "keywords": list(cluster["keywords"][:50]),
+                        "size": n,
+                        "outline": outline.get("outline", []),
+                        "sources": outline.get("sources", []),
+                        "created_at": time.time(),
+                    })
+                    vectors.append(np.mean(cluster_vectors, axis=0, keepdims=True))
+                    entries.append({"kind": KIND_CLUSTER, "cluster_id": cluster_id, "text": cluster["cluster_name"]})
+                    vectors.append(cluster_vectors)
+                    entries.extend({"kind": KIND_KEYWORD, "cluster_id": cluster_id, "text": kw}
+                                   for kw in cluster["keywords"])
+                if not records:
+                    return
+                # Cluster records last: a crash before them leaves rows that
+                # point at no cluster (never returned), not a signature marked
+                # as indexed without its vectors
+                self._append(np.vstack(vectors), entries)
+                with open(self._path("clusters.jsonl"), "a") as f:
+                    for record in records:
+                        f.write(json.dumps(record) + "\n")
+                self.load()
+
+    # ---------------- Reads ----------------
+
+    def search_vectors(self, query, k=10, nprobe=None, exact=False):
+        """
+        Return [(row, score)] for the k rows most similar to a normalised query vector
+        """
+        import numpy as np
+
+        with self._lock:
+            self.load()
+            vectors = self._vectors_view()
+            if len(vectors) == 0:
+                return []
+            if exact or self._ivf_centroids is None:
+                candidates = None
+            else:
+                nprobe = nprobe or self.nprobe
+                probe = np.argsort(self._ivf_centroids @ query)[::-1][:nprobe]
+                order, bounds = self._inverted_lists()
+                candidates = np.concatenate([order[bounds[p]:bounds[p + 1]] for p in probe])
+                # Sorted rows read the memory map sequentially
+                candidates.sort()
+
+        if candidates is None:
+            scores = vectors @ query
+            rows = np.arange(len(scores))
+        else:
+            scores = vectors[candidates] @ query
+            rows = candidates
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def related(self, keyword, k=5, user_id=None, team_id=None, scope=None):
+        """
+        Nearest past clusters for a keyword, with their outlines and sources,
+        among those the caller may see: their own, or with scope "team" any
+        from their workspace
+        """
+        scope = scope or TOPIC_INDEX_SCOPE
+
+        def visible(cluster):
+            if cluster.get("team_id") != team_id:
+                return False
+            return scope == "team" and team_id is not None or cluster.get("user_id") == user_id
+
+        with metrics.span("topic_index_query"):
+            query = _normalize(encode([keyword]))[0]
+            n_hits = k * 10
+            while True:
+                hits = self.search_vectors(query, k=n_hits)
+                results, seen = [], set()
+                for row, score in hits:
+                    cluster = self.clusters.get(self.entries[row]["cluster_id"])
+                    if cluster is None or not visible(cluster) or cluster["signature"] in seen:
+                        continue
+                    seen.add(cluster["signature"])
+                    results.append(dict(cluster, score=round(score, 4), matched=self.entries[row]["text"]))
+                    if len(results) >= k:
+                        return results
+                # Other submitters' rows crowded out the caller's; look further
+                if len(hits) < n_hits:
+                    return results
+                n_hits *= 4
+
+
+topic_index = TopicIndex()
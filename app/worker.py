@@ -0,0 +1,153 @@
+"""
+Job worker for the distributed execution mode.
+
+Slack event receivers (main.py) enqueue keyword jobs when JOB_QUEUE_BACKEND
+is sqlite or redis; any number of these workers, on any node that can reach
+the queue, lease and run them:
+
+    JOB_QUEUE_BACKEND=sqlite python -m app.worker --concurrency 2
+
+A job is acked only after it finished. If a worker dies mid-job its lease
+expires after JOB_LEASE_SECONDS and another worker runs the job again (up
+to JOB_MAX_ATTEMPTS times). SIGTERM/SIGINT stop leasing new jobs and let
+running ones finish.
+"""
+import os
+import time
+import socket
+import signal
+import argparse
+import threading
+from dotenv import load_dotenv
+from app import metrics
+from app.admission import admission_controller
+from app.job_queue import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, get_job_queue
+
+load_dotenv()
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_INTERVAL_S = float(os.getenv("WORKER_POLL_INTERVAL_S", "1.0"))
+# Serve this worker's /metrics on its own port (0 = off); for workers that do
+# not share METRICS_MULTIPROC_DIR with a web process
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+
+def run_job(job):
+    """
+    Default job handler: the same processing the in-process thread mode runs.
+    Failures raise (and the job is nacked) until the last attempt, which
+    reports the error to the user instead.
+    """
+    from app.slack_app import slack_app, process_keywords_async
+
+    payload = job.payload
+    command = dict(payload["command"], job_id=job.id, attempt=job.attempt,
+                   final_attempt=job.attempt >= JOB_MAX_ATTEMPTS)
+    process_keywords_async(command, slack_app, payload.get("channel_id"))
+
+
+class Worker:
+    """
+    Leases jobs on `concurrency` threads and keeps their leases alive with
+    a heartbeat while they run
+    """
+
+    def __init__(self, queue=None, handler=run_job, concurrency=WORKER_CONCURRENCY,
+                 poll_interval=WORKER_POLL_INTERVAL_S, name=None):
+        self.queue = queue or get_job_queue()
+        self.handler = handler
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.stopping = threading.Event()
+        self._running = {}  # thread name -> Job
+        self._running_lock = threading.Lock()
+        self._threads = []
+
+    def _loop(self, slot):
+        worker_id = f"{self.name}-{slot}"
+        while not self.stopping.is_set():
+            try:
+                job = self.queue.lease(worker_id)
+            except Exception as e:
+                print(f"[Worker Lease Error] {e}")
+                job = None
+            if job is None:
+                self.stopping.wait(self.poll_interval)
+                continue
+
+            print(f"🔹 {worker_id} running job {job.id} (attempt {job.attempt})")
+            with self._running_lock:
+                self._running[worker_id] = job
+            try:
+                self.handler(job)
+            except Exception as e:
+                print(f"[Worker Job Error] {job.id}: {e}")
+                metrics.inc("worker_jobs_total", status="failed")
+                self.queue.nack(job, error=str(e))
+            else:
+                metrics.inc("worker_jobs_total", status="done")
+                if not self.queue.ack(job):
+                    print(f"[Worker] lease on job {job.id} was lost before ack")
+            finally:
+                with self._running_lock:
+                    self._running.pop(worker_id, None)
+
+    def _heartbeat(self):
+        while not self.stopping.is_set() or self._running:
+            time.sleep(max(1.0, JOB_LEASE_SECONDS / 3))
+            with self._running_lock:
+                jobs = list(self._running.values())
+            for job in jobs:
+                try:
+                    if self.queue.extend(job):
+                        admission_controller.extend(job.id)
+                except Exception as e:
+                    print(f"[Worker Heartbeat Error] {job.id}: {e}")
+
+    def start(self):
+        for slot in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, args=(slot,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def wait(self):
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT)
+    args = parser.parse_args()
+
+    if metrics.METRICS_ENABLED and args.metrics_port:
+        metrics.serve(args.metrics_port)
+
+    from app.pipeline import warm_up
+
+    if os.environ.get("PRELOAD_MODELS", "true").lower() != "false":
+        warm_up()
+    worker = Worker(concurrency=args.concurrency).start()
+    print(f"🔹 Worker {worker.name} consuming jobs with {args.concurrency} threads")
+
+    def shutdown(signum, frame):
+        print("🔹 Worker stopping after running jobs finish...")
+        worker.stopping.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    worker.wait()
+
+
+if __name__ == "__main__":
+    main()
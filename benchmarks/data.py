@@ -0,0 +1,67 @@
+"""
+Deterministic synthetic keyword sets for benchmarks.
+"""
+import random
+
+TOPICS = {
+    "seo": ["seo", "keyword research", "backlinks", "google ranking", "search optimization",
+            "meta tags", "site speed", "technical seo", "local seo", "serp features"],
+    "python": ["python", "django", "flask", "pandas", "numpy", "python tutorials",
+               "asyncio", "type hints", "packaging", "virtualenv"],
+    "javascript": ["javascript", "react", "vue", "node", "typescript", "webpack",
+                   "frontend frameworks", "css grid", "web components", "nextjs"],
+    "ai": ["machine learning", "deep learning", "neural networks", "natural language processing",
+           "computer vision", "data visualization", "ai automation", "transformers", "llm", "embeddings"],
+    "devices": ["laptop", "smartphone", "tablet", "smartwatch", "wireless earbuds",
+                "gaming console", "external drive", "bluetooth speaker", "monitor", "keyboard"],
+    "food": ["apple", "banana", "mango", "strawberry", "fruit nutrition",
+             "healthy diet", "fitness meals", "blueberry", "kiwi", "pineapple"],
+    "security": ["cybersecurity", "network security", "firewall", "monitoring tools",
+                 "phishing", "zero trust", "password manager", "vpn", "malware", "encryption"],
+    "marketing": ["content marketing", "email campaign", "social media", "affiliate marketing",
+                  "blog post ideas", "marketing strategy", "advertising", "influencer", "newsletter", "branding"],
+}
+
+MODIFIERS = ["best", "guide", "tips", "for beginners", "2025", "vs", "review", "cheap",
+             "how to", "advanced", "tools", "examples", "course", "checklist", "trends"]
+
+
+def synthetic_keywords(n, seed=42):
+    """
+    Return n keywords drawn from a fixed set of topics plus modifiers that
+    are still n distinct keywords after clean_keywords
+    """
+    from app.pipeline import clean_keywords
+
+    rng = random.Random(seed)
+    topics = list(TOPICS.values())
+    keywords, seen = [], set()
+    while len(keywords) < n:
+        base = rng.choice(rng.choice(topics))
+        extra = rng.sample(MODIFIERS, rng.randint(0, 2))
+        kw = " ".join([base] + extra)
+        # Cleaning drops stopwords and numbers ("how to", "2025"), so compare cleaned forms
+        cleaned = clean_keywords([kw])
+        if len(seen) > 0.9 * n or not cleaned or cleaned[0] in seen:
+            # The vocabulary runs out for large n; make the rest unique
+            kw = f"{kw} {_suffix(len(keywords))}"
+            cleaned = clean_keywords([kw])
+        if cleaned and cleaned[0] not in seen:
+            seen.add(cleaned[0])
+            keywords.append(kw)
+    return keywords
+
+
+def _suffix(i):
+    """
+    A distinct word per i that survives cleaning: letters only (digits are
+    stripped), and the "z" prefix keeps it clear of stopwords and of
+    one-letter words
+    """
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        out = letters[r] + out
+    return "variant z" + out
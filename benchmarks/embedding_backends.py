@@ -0,0 +1,139 @@
+"""
+Embedding backend benchmark and parity check.
+
+Each backend runs in its own interpreter so resident memory is measured in
+isolation. Clustering assignments of every backend are compared with the
+reference torch backend; the exit code is non-zero if any backend falls
+below --min-ari or a backend named with --backend fails to run, so this
+can be used as a regression gate. Without --backend, backends that cannot
+run here (e.g. onnx without optimum) are reported as skipped.
+
+    python -m benchmarks.embedding_backends --keywords 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.data import synthetic_keywords
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REFERENCE = "torch"
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(backend, n_keywords, threads, out_path):
+    """
+    Load one backend, encode the synthetic keywords and save the embeddings
+    """
+    import numpy as np
+    from app.embeddings import load_model, EMBEDDING_BATCH_SIZE
+
+    keywords = synthetic_keywords(n_keywords)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    model = load_model(backend, threads=threads)
+    load_s = time.perf_counter() - start
+
+    model.encode(keywords[:32])  # warm-up
+    start = time.perf_counter()
+    embeddings = model.encode(keywords, batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+    encode_s = time.perf_counter() - start
+
+    np.save(out_path, embeddings.astype("float32"))
+    print(json.dumps({
+        "backend": backend,
+        "load_s": load_s,
+        "encode_s": encode_s,
+        "keywords_per_s": len(keywords) / encode_s,
+        "peak_rss_mb": _rss_mb(),
+        "model_rss_mb": _rss_mb() - rss_before,
+    }))
+
+
+def cluster_labels(embeddings, n_clusters):
+    from sklearn.cluster import KMeans
+
+    return KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit_predict(embeddings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keywords", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--clusters", type=int, default=8)
+    parser.add_argument("--backend", action="append", choices=["torch", "torch-int8", "onnx"])
+    parser.add_argument("--min-ari", type=float, default=0.9,
+                        help="minimum adjusted Rand index against the torch backend")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.keywords, args.threads, args.out)
+        return
+
+    import numpy as np
+    from sklearn.metrics import adjusted_rand_score
+
+    requested = set(args.backend or [])
+    backends = args.backend or ["torch", "torch-int8", "onnx"]
+    if REFERENCE not in backends:
+        backends.insert(0, REFERENCE)
+
+    results, embeddings, broken = {}, {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            out_path = os.path.join(tmp, f"{backend}.npy")
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.embedding_backends", "--worker", backend,
+                 "--keywords", str(args.keywords), "--threads", str(args.threads), "--out", out_path],
+                cwd=ROOT, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                # Only backends left to the default list may be missing (e.g. onnx without optimum)
+                if backend in requested:
+                    broken.append(backend)
+                    print(f"{backend}: failed\n{proc.stderr[-1500:]}")
+                else:
+                    print(f"{backend}: skipped, it failed to run and was not requested with --backend\n"
+                          f"{proc.stderr[-300:]}")
+                continue
+            results[backend] = json.loads(proc.stdout.strip().splitlines()[-1])
+            embeddings[backend] = np.load(out_path)
+
+    if REFERENCE not in embeddings:
+        print("Reference backend failed; cannot check parity")
+        sys.exit(1)
+
+    reference_labels = cluster_labels(embeddings[REFERENCE], args.clusters)
+    ref = embeddings[REFERENCE] / np.linalg.norm(embeddings[REFERENCE], axis=1, keepdims=True)
+    low_ari = False
+
+    print(f"{'backend':<12}{'load s':>8}{'kw/s':>10}{'peak MB':>10}{'model MB':>10}{'cos':>8}{'ARI':>8}")
+    for backend, r in results.items():
+        emb = embeddings[backend] / np.linalg.norm(embeddings[backend], axis=1, keepdims=True)
+        cosine = float(np.mean(np.sum(emb * ref, axis=1)))
+        ari = adjusted_rand_score(reference_labels, cluster_labels(embeddings[backend], args.clusters))
+        low_ari |= ari < args.min_ari
+        print(f"{backend:<12}{r['load_s']:>8.2f}{r['keywords_per_s']:>10.0f}{r['peak_rss_mb']:>10.0f}"
+              f"{r['model_rss_mb']:>10.0f}{cosine:>8.4f}{ari:>8.3f}")
+
+    if broken:
+        print(f"Parity check failed: requested backend {', '.join(broken)} did not run")
+    if low_ari:
+        print(f"Parity check failed: ARI below {args.min_ari}")
+    if broken or low_ari:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
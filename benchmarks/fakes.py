@@ -0,0 +1,268 @@
+"""
+Local stand-ins for the external services used by the pipeline: the Serper
+search API, the web pages it links to, the Slack Web API and SendGrid.
+
+Every fake runs a ThreadingHTTPServer on 127.0.0.1 with an ephemeral port,
+records the calls it receives and can add a fixed artificial latency.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+class FakeServer:
+    """
+    Minimal HTTP server that dispatches every request to self.handle()
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if server.latency:
+                    time.sleep(server.latency)
+                status, content_type, payload = server.handle(self.command, self.path, self.headers, body)
+                with server._lock:
+                    server.bytes_in += len(body)
+                    server.bytes_out += len(payload)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _dispatch
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def record(self, name, count=1):
+        with self._lock:
+            self.calls[name] += count
+
+    def handle(self, method, path, headers, body):
+        """
+        (status, content type, payload bytes) for a request; subclasses
+        route their API here, anything else is a 404
+        """
+        return _json({"error": f"no route for {method} {path}"}, status=404)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _json(payload, status=200):
+    return status, "application/json", json.dumps(payload).encode()
+
+
+class FakePages(FakeServer):
+    """
+    Serves the saved HTML corpus. /<site>/<slug> returns <site>.html if it
+    exists, otherwise a corpus page chosen by hashing the path.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.pages = {}
+        for name in sorted(os.listdir(CORPUS_DIR)):
+            if name.endswith(".html"):
+                with open(os.path.join(CORPUS_DIR, name), "rb") as f:
+                    self.pages[name[:-5]] = f.read()
+        self.sites = sorted(self.pages)
+
+    def handle(self, method, path, headers, body):
+        self.record("page")
+        site = urlparse(path).path.strip("/").split("/")[0]
+        if site not in self.pages:
+            site = self.sites[int(hashlib.md5(path.encode()).hexdigest(), 16) % len(self.sites)]
+        return 200, "text/html; charset=utf-8", self.pages[site]
+
+
+class FakeSerper(FakeServer):
+    """
+    Serper /search stand-in. Organic results link to the FakePages server.
+    Accepts a single query object or a list of them.
+    """
+
+    def __init__(self, pages_url, latency=0.0):
+        super().__init__(latency)
+        self.pages_url = pages_url
+        self.sites = ["wikipedia", "medium", "geeksforgeeks", "hubspot"]
+
+    def _result(self, query):
+        q = query.get("q", "")
+        num = int(query.get("num", 10))
+        slug = "-".join(q.lower().split()) or "empty"
+        offset = int(hashlib.md5(q.encode()).hexdigest(), 16) % len(self.sites)
+        organic = []
+        for i in range(num):
+            site = self.sites[(offset + i) % len(self.sites)]
+            organic.append({
+                "title": f"{q.title()} - {site.title()}",
+                "link": f"{self.pages_url}/{site}/{slug}-{i}",
+                "snippet": f"Everything you need to know about {q}.",
+                "position": i + 1,
+            })
+        return {"searchParameters": query, "organic": organic}
+
+    def handle(self, method, path, headers, body):
+        payload = json.loads(body or b"{}")
+        if isinstance(payload, list):
+            self.record("search_batch")
+            self.record("search_query", len(payload))
+            return _json([self._result(q) for q in payload])
+        self.record("search")
+        self.record("search_query")
+        return _json(self._result(payload))
+
+
+class FakeSlack(FakeServer):
+    """
+    Slack Web API stand-in covering the methods the bot calls, including the
+    files_upload_v2 three-step upload.
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.messages = []
+        self.uploaded_bytes = 0
+
+    def _params(self, headers, body):
+        content_type = headers.get("Content-Type", "")
+        if "application/json" in content_type:
+            return json.loads(body or b"{}")
+        if "application/x-www-form-urlencoded" in content_type:
+            return {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        return {}
+
+    def handle(self, method, path, headers, body):
+        parsed = urlparse(path)
+        if parsed.path.startswith("/upload/"):
+            self.record("upload")
+            with self._lock:
+                self.uploaded_bytes += len(body)
+            return 200, "text/plain", b"OK - 1"
+
+        api_method = parsed.path.rsplit("/", 1)[-1]
+        self.record(api_method)
+        params = self._params(headers, body)
+        params.update({k: v[0] for k, v in parse_qs(parsed.query).items()})
+
+        if api_method == "auth.test":
+            return _json({"ok": True, "user_id": "UBOT", "bot_id": "BBOT", "team_id": "T0001"})
+        if api_method == "chat.postMessage":
+            with self._lock:
+                self.messages.append({"channel": params.get("channel"), "text": params.get("text", "")})
+            return _json({"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"})
+        if api_method == "conversations.open":
+            return _json({"ok": True, "channel": {"id": f"D{params.get('users', 'U0')}"}})
+        if api_method == "users.info":
+            user = params.get("user", "U0")
+            return _json({"ok": True, "user": {"id": user, "profile": {
+                "email": f"{user.lower()}@example.com", "real_name": f"User {user}"}}})
+        if api_method == "files.getUploadURLExternal":
+            file_id = "F" + hashlib.md5(body).hexdigest()[:10].upper()
+            return _json({"ok": True, "upload_url": f"{self.url}/upload/{file_id}", "file_id": file_id})
+        if api_method == "files.completeUploadExternal":
+            files = json.loads(params.get("files", "[]"))
+            return _json({"ok": True, "files": [{"id": f["id"], "title": f.get("title")} for f in files]})
+        if api_method == "files.info":
+            return _json({"ok": True, "file": {"id": params.get("file"), "user": "U0"}})
+        return _json({"ok": False, "error": "unknown_method"})
+
+
+class FakeSendGrid(FakeServer):
+    """
+    SendGrid v3 mail/send stand-in
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__(latency)
+        self.sent = 0
+
+    def handle(self, method, path, headers, body):
+        self.record("mail.send")
+        with self._lock:
+            self.sent += 1
+        return 202, "application/json", b""
+
+
+class FakeServices:
+    """
+    Starts all fakes and exposes the environment variables that point the
+    app at them
+    """
+
+    def __init__(self, latency=0.0, page_latency=0.0):
+        self.pages = FakePages(page_latency)
+        self.slack = FakeSlack(latency)
+        self.sendgrid = FakeSendGrid(latency)
+        self.serper = None
+        self._latency = latency
+
+    def start(self):
+        self.pages.start()
+        self.serper = FakeSerper(self.pages.url, self._latency).start()
+        self.slack.start()
+        self.sendgrid.start()
+        return self
+
+    def stop(self):
+        for server in (self.serper, self.pages, self.slack, self.sendgrid):
+            if server:
+                server.stop()
+
+    def env(self):
+        return {
+            "SERPER_API_URL": f"{self.serper.url}/search",
+            "SERPER_API_KEY": "bench-serper-key",
+            "SLACK_API_URL": f"{self.slack.url}/api/",
+            "SLACK_BOT_TOKEN": "xoxb-bench",
+            "SLACK_SIGNING_SECRET": "bench-signing-secret",
+            "SENDGRID_API_HOST": self.sendgrid.url,
+            "SENDGRID_API_KEY": "SG.bench",
+            "SENDGRID_FROM_EMAIL": "bench@example.com",
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,93 @@
+"""
+Job queue benchmark: throughput of N worker processes on the SQLite queue
+and recovery of jobs held by a worker that is killed mid-job.
+
+Jobs are synthetic (sleep for --job-ms) so the run measures the queue, not
+the pipeline. With --kill, one worker is SIGKILLed while it holds leases;
+its jobs must be picked up again once the lease expires, and every job
+must end up done exactly once per successful attempt.
+
+    python -m benchmarks.job_queue --workers 4 --jobs 200 --job-ms 20 --kill
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+
+from app.job_queue import SQLiteQueue
+from app.worker import Worker
+
+
+def _sleep_handler(job):
+    time.sleep(job.payload["ms"] / 1000)
+    with open(job.payload["log"], "a") as f:
+        f.write(json.dumps({"id": job.id, "attempt": job.attempt, "pid": os.getpid()}) + "\n")
+
+
+def _run_worker(path, lease_seconds, concurrency):
+    queue = SQLiteQueue(path, lease_seconds=lease_seconds)
+    worker = Worker(queue, handler=_sleep_handler, concurrency=concurrency, poll_interval=0.05).start()
+    worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--concurrency", type=int, default=2, help="threads per worker")
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--job-ms", type=int, default=20)
+    parser.add_argument("--lease", type=float, default=2.0, help="lease seconds")
+    parser.add_argument("--kill", action="store_true", help="SIGKILL one worker mid-run")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        path, log = os.path.join(root, "jobs.db"), os.path.join(root, "done.jsonl")
+        queue = SQLiteQueue(path, lease_seconds=args.lease)
+        start = time.perf_counter()
+        for i in range(args.jobs):
+            queue.enqueue({"ms": args.job_ms, "log": log}, job_id=f"job{i}")
+        enqueue_s = time.perf_counter() - start
+
+        ctx = multiprocessing.get_context("spawn")
+        procs = [ctx.Process(target=_run_worker, args=(path, args.lease, args.concurrency), daemon=True)
+                 for _ in range(args.workers)]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+
+        killed_at = None
+        while time.perf_counter() - start < args.timeout:
+            stats = queue.stats()
+            if args.kill and killed_at is None and stats.get("done", 0) >= args.jobs // 4:
+                os.kill(procs[0].pid, signal.SIGKILL)
+                killed_at = time.perf_counter() - start
+            if stats.get("done", 0) + stats.get("dead", 0) >= args.jobs:
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        for p in procs:
+            if p.is_alive():
+                p.kill()
+
+        with open(log) as f:
+            runs = [json.loads(line) for line in f]
+        stats = queue.stats()
+        retried = sorted({r["id"] for r in runs if r["attempt"] > 1})
+        print(f"enqueue: {args.jobs} jobs in {enqueue_s * 1000:.0f} ms")
+        print(f"run:     {elapsed:.2f}s with {args.workers}x{args.concurrency} workers "
+              f"({args.jobs / elapsed:.0f} jobs/s, ideal {args.workers * args.concurrency * 1000 / args.job_ms:.0f})")
+        print(f"queue:   {stats}")
+        if killed_at is not None:
+            print(f"killed worker at {killed_at:.2f}s; {len(retried)} jobs re-run after lease expiry")
+        missing = args.jobs - len({r["id"] for r in runs})
+        if missing or stats.get("done", 0) != args.jobs:
+            print(f"FAILED: {missing} jobs never completed")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+End-to-end pipeline benchmark against local fakes (no network needed).
+
+Drives process_keywords_async with synthetic keyword sets and reports
+per-stage latency, throughput (keywords left after cleaning per second),
+outbound calls and peak memory. Each size runs in a fresh process, so its
+peak RSS is measured on its own. The embedding model must already be in
+the Hugging Face cache; the harness runs with HF_HUB_OFFLINE=1.
+
+    python -m benchmarks.pipeline_e2e --sizes 10 1000
+    python -m benchmarks.pipeline_e2e --sizes 10 1000 --save-baseline bench.json
+    python -m benchmarks.pipeline_e2e --sizes 10 1000 --baseline bench.json --tolerance 0.25
+
+With --baseline the exit code is non-zero if any size got slower than the
+baseline by more than --tolerance, or if a job failed.
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks.data import synthetic_keywords
+from benchmarks.fakes import FakeServices
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pipeline functions as referenced from app.slack_app, in execution order
+STAGES = [
+    "parse_keywords_from_text",
+    "clean_keywords",
+    "cluster_keywords",
+    "fetch_top_results",
+    "generate_post_idea",
+    "render_report",
+    "send_pdf_via_email",
+]
+
+
+class StageTimer:
+    """
+    Wraps the pipeline functions imported into a module so each call is timed
+    """
+
+    def __init__(self, module, names):
+        self.module = module
+        self.names = names
+        self.timings = defaultdict(float)
+        self._originals = {}
+        self._lock = threading.Lock()
+
+    def _wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.timings[name] += time.perf_counter() - start
+        return timed
+
+    def __enter__(self):
+        for name in self.names:
+            func = getattr(self.module, name)
+            self._originals[name] = func
+            setattr(self.module, name, self._wrap(name, func))
+        return self
+
+    def __exit__(self, *exc):
+        for name, func in self._originals.items():
+            setattr(self.module, name, func)
+
+
+def _rss_mb():
+    # Peak of this process; each size runs in its own process (see run_size)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_job(slack_module, n_keywords, trace_memory, verbose=False):
+    """
+    Run one job of n_keywords in this process and time it
+    """
+    keywords = synthetic_keywords(n_keywords)
+    # Python list syntax keeps multi-word keywords intact through parsing
+    command = {"user_id": "UBENCH", "text": repr(keywords)}
+    n_cleaned = len(slack_module.clean_keywords(keywords))
+    rss_before = _rss_mb()
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with StageTimer(slack_module, STAGES) as timer, _maybe_silenced(verbose):
+        slack_module.process_keywords_async(command, slack_module.slack_app, "CBENCH")
+    total = time.perf_counter() - start
+    peak_traced = None
+    if trace_memory:
+        peak_traced = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        "keywords": n_keywords,
+        "cleaned": n_cleaned,
+        "total_s": total,
+        "keywords_per_s": n_cleaned / total if total else 0.0,
+        "stages_s": {name: timer.timings.get(name, 0.0) for name in STAGES},
+        "startup_rss_mb": rss_before,
+        "peak_rss_mb": _rss_mb(),
+        "peak_traced_mb": peak_traced,
+    }
+
+
+def run_size(services, n_keywords, args, workdir):
+    """
+    Run one size in a fresh process, so its peak RSS is its own and not the
+    high-water mark of every size before it. The fakes stay in this process;
+    calls and failure messages are counted here.
+    """
+    messages_before = len(services.slack.messages)
+    calls_before = {name: dict(s.calls) for name, s in _servers(services).items()}
+
+    result_path = os.path.join(workdir, f"result-{n_keywords}.json")
+    command = [sys.executable, "-m", "benchmarks.pipeline_e2e", "--sizes", str(n_keywords),
+               "--child-result", result_path]
+    command += ["--trace-memory"] * args.trace_memory + ["--verbose"] * args.verbose
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    subprocess.run(command, cwd=workdir, env=env, check=True)
+    with open(result_path) as f:
+        result = json.load(f)
+
+    new_messages = services.slack.messages[messages_before:]
+    result["failed"] = [m["text"] for m in new_messages if m["text"].startswith(("❌", "⚠️"))]
+    result["calls"] = {}
+    for name, server in _servers(services).items():
+        for method, count in server.calls.items():
+            delta = count - calls_before[name].get(method, 0)
+            if delta:
+                result["calls"][f"{name}.{method}"] = delta
+    return result
+
+
+def run_child(args):
+    """
+    --child-result: run a single size against the fakes the parent started
+    (their URLs are in the environment) and write the result as JSON
+    """
+    import app.slack_app as slack_module
+    from app.pipeline import warm_up
+
+    warm_up()  # imports and model load are startup costs, not per-job ones
+    [size] = args.sizes
+    result = run_job(slack_module, size, args.trace_memory, args.verbose)
+    with open(args.child_result, "w") as f:
+        json.dump(result, f)
+
+
+@contextlib.contextmanager
+def _maybe_silenced(verbose):
+    # The pipeline prints every parsed keyword, which swamps the report at 50k
+    if verbose:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _servers(services):
+    return {"serper": services.serper, "pages": services.pages,
+            "slack": services.slack, "sendgrid": services.sendgrid}
+
+
+def print_report(result):
+    status = "FAILED" if result["failed"] else "ok"
+    print(f"\n== {result['keywords']} keywords ({result['cleaned']} after cleaning): {result['total_s']:.2f}s total, "
+          f"{result['keywords_per_s']:.1f} kw/s, peak RSS {result['peak_rss_mb']:.0f} MB "
+          f"({result['startup_rss_mb']:.0f} MB after warm-up)"
+          + (f", peak traced {result['peak_traced_mb']:.1f} MB" if result["peak_traced_mb"] is not None else "")
+          + f" [{status}]")
+    for name, seconds in result["stages_s"].items():
+        share = seconds / result["total_s"] * 100 if result["total_s"] else 0
+        print(f"   {name:<26}{seconds * 1000:>10.1f} ms {share:>5.1f}%")
+    print("   calls: " + ", ".join(f"{k}={v}" for k, v in sorted(result["calls"].items())))
+    for text in result["failed"]:
+        print(f"   failure: {text[:200]}")
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    by_size = {str(r["keywords"]): r for r in baseline.get("results", [])}
+    for r in results:
+        base = by_size.get(str(r["keywords"]))
+        if base and r["total_s"] > base["total_s"] * (1 + tolerance):
+            regressions.append(f"{r['keywords']} keywords: {r['total_s']:.2f}s vs baseline {base['total_s']:.2f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial latency per fake API call (s)")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="artificial latency per page fetch (s)")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc peak (slower)")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against results saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="save results as a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--child-result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child_result:
+        run_child(args)
+        return
+    for name in ("json", "baseline", "save_baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    services = FakeServices(latency=args.latency, page_latency=args.page_latency).start()
+    # Background threads (e.g. artifact GC) may still be writing when it is removed
+    workdir = tempfile.TemporaryDirectory(prefix="pipeline-bench-", ignore_cleanup_errors=True)
+    cwd = os.getcwd()
+    try:
+        os.environ.update(services.env())
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ["SLACK_TOKEN_VERIFICATION"] = "false"
+        # Each size should run the full pipeline, not a delta against the previous size
+        os.environ.setdefault("KEYWORD_SESSIONS_ENABLED", "false")
+        # Reports are written relative to the working directory
+        os.chdir(workdir.name)
+
+        results = []
+        for size in args.sizes:
+            result = run_size(services, size, args, workdir.name)
+            print_report(result)
+            results.append(result)
+    finally:
+        services.stop()
+        os.chdir(cwd)
+        workdir.cleanup()
+
+    output = {"python": sys.version.split()[0], "results": results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(output, f, indent=2)
+
+    exit_code = 1 if any(r["failed"] for r in results) else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        exit_code = exit_code or (1 if regressions else 0)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Report format benchmark: render time and payload size of each report
+format for jobs of increasing size.
+
+Results are synthetic (clusters of generated keywords with adaptive
+outlines) so the run needs neither the embedding model nor the network.
+"delivered" is what leaves the process: the payload itself, plus the
+base64 email attachment for the PDF.
+
+    python -m benchmarks.report_formats --clusters 8 30 100 --keywords-per-cluster 50 --repeat 5
+"""
+import argparse
+import gzip
+import json
+import statistics
+import time
+
+from app.pipeline import build_outline, generate_post_idea
+from app.report_formats import FORMATS, render_report
+from benchmarks.data import synthetic_keywords
+
+
+def synthetic_result(n_clusters, per_cluster):
+    keywords = synthetic_keywords(n_clusters * per_cluster)
+    clusters = [{"cluster_name": f"{keywords[i * per_cluster].title()} {i}",
+                 "keywords": keywords[i * per_cluster:(i + 1) * per_cluster],
+                 "category": "Technology"} for i in range(n_clusters)]
+    outlines = [build_outline(c, [], [f"https://example.com/{i}/{j}" for j in range(3)],
+                              degraded="beyond top clusters" if i >= 20 else None)
+                for i, c in enumerate(clusters)]
+    return {"job_id": "bench", "raw_keywords": keywords, "cleaned": keywords, "clusters": clusters,
+            "outlines": outlines, "ideas": generate_post_idea(clusters), "stats": {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clusters", type=int, nargs="+", default=[8, 30, 100])
+    parser.add_argument("--keywords-per-cluster", type=int, default=50)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Import reportlab (and warm its font metrics) outside the timed runs
+    render_report("pdf", synthetic_result(2, 5))
+
+    print(f"{'clusters':>8} {'format':<8}{'render ms':>11}{'bytes':>10}{'gzip':>9}{'delivered':>11}  notes")
+    for n_clusters in args.clusters:
+        result = synthetic_result(n_clusters, args.keywords_per_cluster)
+        for name in args.formats:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                data = render_report(name, result)
+                timings.append((time.perf_counter() - start) * 1000)
+            delivered, notes = len(data), ""
+            if name == "pdf":
+                delivered += (len(data) + 2) // 3 * 4
+                notes = "upload + base64 email attachment"
+            elif name == "blocks":
+                notes = f"{len(json.loads(data))} Slack messages"
+            print(f"{n_clusters:>8} {name:<8}{statistics.median(timings):>11.2f}{len(data):>10}"
+                  f"{len(gzip.compress(data)):>9}{delivered:>11}  {notes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Slack HTTP events load test: ack latency of /slack/events under concurrent
+bursts of signed event and slash-command requests.
+
+Starts `python main.py` in HTTP mode (uvicorn, --workers processes) against
+the fake Slack Web API, with jobs going to a SQLite queue that nothing
+consumes, so the run measures the receive/ack path only. Some events are
+re-sent as Slack retries (X-Slack-Retry-Num) to check they are not
+enqueued twice.
+
+    python -m benchmarks.slack_events --workers 2 --bursts 5 --burst-size 200 --concurrency 64
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+from benchmarks.fakes import FakeServices
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIGNING_SECRET = "bench-signing-secret"  # matches FakeServices.env()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _signed(body, content_type, extra_headers=None):
+    timestamp = str(int(time.time()))
+    digest = hmac.new(SIGNING_SECRET.encode(), f"v0:{timestamp}:{body}".encode(), hashlib.sha256).hexdigest()
+    headers = {"Content-Type": content_type, "X-Slack-Request-Timestamp": timestamp,
+               "X-Slack-Signature": f"v0={digest}"}
+    headers.update(extra_headers or {})
+    return body, headers
+
+
+def message_event(event_id, n):
+    body = json.dumps({
+        "token": "bench", "team_id": "T0001", "api_app_id": "A0001", "type": "event_callback",
+        "event_id": event_id, "event_time": int(time.time()),
+        "event": {"type": "message", "user": f"U{n % 50}", "channel": f"C{n % 10}", "ts": f"{time.time():.6f}",
+                  "text": f"keyword seo tips {n}, python basics {n}, apple pie {n}"},
+    })
+    return _signed(body, "application/json")
+
+
+def slash_command(n, response_url):
+    body = urlencode({"command": "/report", "text": f"missing{n}", "user_id": f"U{n % 50}", "team_id": "T0001",
+                      "channel_id": f"C{n % 10}", "response_url": response_url, "trigger_id": f"t{n}"})
+    return _signed(body, "application/x-www-form-urlencoded")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight")
+    parser.add_argument("--command-ratio", type=float, default=0.1, help="share of slash commands")
+    parser.add_argument("--retry-ratio", type=float, default=0.05, help="share of events re-sent as Slack retries")
+    parser.add_argument("--max-ack-ms", type=float, default=3000, help="fail if p99 ack latency exceeds this")
+    args = parser.parse_args()
+
+    with FakeServices() as services, tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        env = dict(os.environ, **services.env(),
+                   SLACK_MODE="http", WEB_CONCURRENCY=str(args.workers),
+                   PORT=str(port), JOB_QUEUE_BACKEND="sqlite", JOB_QUEUE_PATH=os.path.join(workdir, "jobs.db"),
+                   CACHE_BACKEND="sqlite", CACHE_SQLITE_PATH=os.path.join(workdir, "cache.db"),
+                   RECEIVER_WORKERS="0", PRELOAD_MODELS="false", SLACK_TOKEN_VERIFICATION="false",
+                   PYTHONPATH=ROOT)
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=workdir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        url = f"http://127.0.0.1:{port}/slack/events"
+        try:
+            deadline = time.time() + 120
+            while True:
+                try:
+                    body, headers = _signed(json.dumps({"type": "url_verification", "challenge": "up"}),
+                                            "application/json")
+                    if requests.post(url, data=body, headers=headers, timeout=2).status_code == 200:
+                        break
+                except requests.ConnectionError:
+                    pass
+                if server.poll() is not None or time.time() > deadline:
+                    raise SystemExit(f"server did not start:\n{server.stderr.read().decode()[-2000:]}")
+                time.sleep(0.2)
+
+            session = requests.Session()
+            session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+            def send(item):
+                body, headers = item
+                start = time.perf_counter()
+                response = session.post(url, data=body.encode(), headers=headers, timeout=30)
+                return (time.perf_counter() - start) * 1000, response.status_code
+
+            all_latencies, statuses, unique_events, n = [], {}, 0, 0
+            response_url = f"{services.slack.url}/respond"
+            print(f"{'burst':<7}{'reqs':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+            command_every = round(1 / args.command_ratio) if args.command_ratio else 0
+            retry_every = round(1 / args.retry_ratio) if args.retry_ratio else 0
+            for burst in range(args.bursts):
+                items = []
+                for _ in range(args.burst_size):
+                    n += 1
+                    if command_every and n % command_every == 0:
+                        items.append(slash_command(n, response_url))
+                        continue
+                    event_id = f"Ev{uuid.uuid4().hex[:10]}"
+                    items.append(message_event(event_id, n))
+                    unique_events += 1
+                    if retry_every and n % retry_every == 0:
+                        body, headers = message_event(event_id, n)
+                        headers.update({"X-Slack-Retry-Num": "1", "X-Slack-Retry-Reason": "http_timeout"})
+                        items.append((body, headers))
+                with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                    results = list(executor.map(send, items))
+                latencies = [ms for ms, _ in results]
+                for _, status in results:
+                    statuses[status] = statuses.get(status, 0) + 1
+                all_latencies.extend(latencies)
+                print(f"{burst + 1:<7}{len(items):>6}{statistics.median(latencies):>9.1f}"
+                      f"{percentile(latencies, 95):>9.1f}{percentile(latencies, 99):>9.1f}{max(latencies):>9.1f}")
+
+            print(f"{'all':<7}{len(all_latencies):>6}{statistics.median(all_latencies):>9.1f}"
+                  f"{percentile(all_latencies, 95):>9.1f}{percentile(all_latencies, 99):>9.1f}"
+                  f"{max(all_latencies):>9.1f}")
+
+            # Lazy listeners enqueue after the ack; wait for them to catch up
+            queued = 0
+            deadline = time.time() + 60
+            while time.time() < deadline:
+                with sqlite3.connect(os.path.join(workdir, "jobs.db")) as conn:
+                    queued = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+                if queued >= unique_events:
+                    break
+                time.sleep(0.2)
+            time.sleep(0.5)
+            with sqlite3.connect(os.path.join(workdir, "jobs.db")) as conn:
+                queued = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            print(f"statuses: {statuses}; jobs enqueued: {queued} for {unique_events} distinct events; "
+                  f"slack calls: {dict(services.slack.calls)}")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    failed = []
+    if set(statuses) != {200}:
+        failed.append(f"non-200 responses {statuses}")
+    if percentile(all_latencies, 99) > args.max_ack_ms:
+        failed.append(f"p99 ack {percentile(all_latencies, 99):.0f} ms > {args.max_ack_ms:.0f} ms")
+    if queued != unique_events:
+        failed.append(f"{queued} jobs enqueued for {unique_events} events")
+    if failed:
+        print("FAILED: " + "; ".join(failed))
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Startup benchmark: measures cold import time of the bot modules.
+
+Each run starts a fresh interpreter so nothing is shared between runs.
+
+    python -m benchmarks.startup --runs 10 --module app.slack_app
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["app.pipeline", "app.slack_app"]
+
+
+def _bench_env():
+    env = dict(os.environ)
+    # Dummy credentials; token verification is disabled so no network is needed
+    env.setdefault("SLACK_BOT_TOKEN", "xoxb-benchmark")
+    env.setdefault("SLACK_SIGNING_SECRET", "benchmark-secret")
+    env["SLACK_TOKEN_VERIFICATION"] = "false"
+    return env
+
+
+def time_import(module, env):
+    """
+    Import a module in a fresh interpreter, returning (wall seconds, importtime lines)
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return elapsed, [line for line in proc.stderr.splitlines() if line.startswith("import time:")]
+
+
+def top_imports(importtime_lines, n=10):
+    """
+    Parse -X importtime output into the n slowest packages imported directly
+    by the interpreter or by the benchmarked module (cumulative us)
+    """
+    rows = []
+    for line in importtime_lines[1:]:
+        parts = line.split("|")
+        if len(parts) != 3:
+            continue
+        cumulative_us, name = parts[1].strip(), parts[2]
+        # Nested imports are indented by two extra spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth > 1 or not cumulative_us.isdigit():
+            continue
+        rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", action="append", help="module to import (repeatable)")
+    args = parser.parse_args()
+
+    env = _bench_env()
+    for module in args.module or DEFAULT_MODULES:
+        # One untimed run to populate the bytecode cache
+        time_import(module, env)
+        timings, lines = [], []
+        for _ in range(args.runs):
+            elapsed, lines = time_import(module, env)
+            timings.append(elapsed)
+        print(f"{module}: median {statistics.median(timings) * 1000:.0f} ms, "
+              f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms ({args.runs} runs)")
+        for cumulative_us, name in top_imports(lines):
+            print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Topic index benchmark: insert throughput, query latency and recall@k of
+IVF search (various nprobe) against exact search.
+
+Uses clustered random vectors so it runs without the embedding model.
+
+    python -m benchmarks.topic_index --rows 200000 --dim 768 --nprobe 1 4 8 16 32
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.topic_index import TopicIndex, _normalize
+
+
+def synthetic_vectors(rows, dim, topics, seed=42):
+    # Points scattered around topic centres, like keywords around clusters
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(topics, dim)).astype("float32")
+    labels = rng.integers(0, topics, size=rows)
+    return _normalize(centres[labels] + 0.6 * rng.normal(size=(rows, dim)).astype("float32"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=1000, help="rows per insert (one job's worth)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.rows + args.queries, args.dim, args.topics)
+    data, queries = vectors[:args.rows], vectors[args.rows:]
+
+    with tempfile.TemporaryDirectory() as root:
+        index = TopicIndex(root, ivf_min_size=min(20000, args.rows))
+        start = time.perf_counter()
+        for offset in range(0, args.rows, args.batch):
+            chunk = data[offset:offset + args.batch]
+            index.add(chunk, [{"kind": 0, "cluster_id": str(offset), "text": ""}] * len(chunk))
+        insert_s = time.perf_counter() - start
+        print(f"insert: {args.rows} rows in {insert_s:.2f}s ({args.rows / insert_s:.0f} rows/s), "
+              f"nlist={0 if index._ivf_centroids is None else len(index._ivf_centroids)}")
+
+        def run(**kwargs):
+            latencies, results = [], []
+            for q in queries:
+                t = time.perf_counter()
+                results.append({row for row, _ in index.search_vectors(q, k=args.k, **kwargs)})
+                latencies.append(time.perf_counter() - t)
+            latencies.sort()
+            return results, latencies
+
+        truth, exact_latency = run(exact=True)
+        print(f"\n{'mode':<14}{'p50 ms':>9}{'p99 ms':>9}{'recall@' + str(args.k):>12}")
+        print(f"{'exact':<14}{statistics.median(exact_latency) * 1000:>9.2f}"
+              f"{exact_latency[int(len(exact_latency) * 0.99) - 1] * 1000:>9.2f}{1.0:>12.3f}")
+        if index._ivf_centroids is None:
+            print("(index below IVF size; only exact search available)")
+            return
+        for nprobe in args.nprobe:
+            found, latency = run(nprobe=nprobe)
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+            print(f"{'ivf nprobe=' + str(nprobe):<14}{statistics.median(latency) * 1000:>9.2f}"
+                  f"{latency[int(len(latency) * 0.99) - 1] * 1000:>9.2f}{recall:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,43 @@
 import os
-from slack_bolt.adapter.socket_mode import SocketModeHandler
-from app.slack_app import slack_app  
+import threading
+
+# socket: hold a Socket Mode connection (default)
+# http:   serve /slack/events with uvicorn, WEB_CONCURRENCY worker processes
+SLACK_MODE = os.environ.get("SLACK_MODE", "socket")
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+PORT = int(os.environ.get("PORT", "10000"))
+
+
+def serve_http(app):
+    # Exposes /metrics from the FastAPI app alongside the Socket Mode connection
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=PORT, log_level="warning")
+
+
+def serve_events():
+    import uvicorn
+    # An import string, so that every worker process builds its own Bolt app;
+    # each worker warms up and starts its job runners in the app's lifespan
+    uvicorn.run("app.slack_app:app", host="0.0.0.0", port=PORT, workers=WEB_CONCURRENCY, log_level="warning")
+
+
+def run_socket_mode():
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+    from app.slack_app import slack_app, app, start_job_runners
+    from app import metrics
+
+    handler = SocketModeHandler(slack_app, os.environ.get("SLACK_APP_TOKEN"))
+    handler.connect()
+    # Start the model warm-up (and any embedded queue workers) only once the
+    # socket is up, so the bot is reachable immediately
+    start_job_runners()
+    if metrics.METRICS_ENABLED:
+        threading.Thread(target=serve_http, args=(app,), daemon=True).start()
+    threading.Event().wait()
+
 
 if __name__ == "__main__":
-    SocketModeHandler(slack_app, os.environ.get("SLACK_APP_TOKEN")).start()
+    if SLACK_MODE == "http":
+        serve_events()
+    else:
+        run_socket_mode()
@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+from app.admission import (ACCEPT, DOWNGRADE, REJECT, Admission, MemoryLedger, SQLiteLedger, decide,
+                           summarize_usage)
+
+LIMITS = dict(capacity=4, degrade_load=0.75, busy_max_keywords=100, max_keywords=1000, user_max_concurrent=2,
+              team_max_concurrent=3, user_daily_keywords=5000, team_daily_keywords=10000, user_daily_calls=500,
+              team_daily_calls=1000)
+
+
+def _usage(running=(0, 0, 0), keywords=(0, 0, 0), calls=(0, 0, 0)):
+    return {field: dict(zip(("all", "user", "team"), values))
+            for field, values in (("running", running), ("keywords", keywords), ("calls", calls))}
+
+
+def test_accepts_within_limits():
+    decision = decide(50, _usage(), **LIMITS)
+    assert decision.action == ACCEPT
+    assert decision.max_keywords is None and decision.research
+    assert decision.estimate["keywords"] == 50
+
+
+@pytest.mark.parametrize("running", [(4, 0, 0), (1, 2, 2), (3, 1, 3)])
+def test_rejects_at_concurrency_caps(running):
+    assert decide(50, _usage(running=running), **LIMITS).action == REJECT
+
+
+def test_caps_large_jobs_and_partly_used_quota():
+    decision = decide(3000, _usage(), **LIMITS)
+    assert (decision.action, decision.max_keywords) == (DOWNGRADE, 1000)
+    decision = decide(500, _usage(keywords=(0, 4800, 4800)), **LIMITS)
+    assert (decision.action, decision.max_keywords) == (DOWNGRADE, 200)
+
+
+def test_rejects_when_keyword_quota_is_used_up():
+    assert decide(10, _usage(keywords=(0, 5000, 5000)), **LIMITS).action == REJECT
+
+
+def test_busy_service_shrinks_jobs_and_skips_research():
+    decision = decide(500, _usage(running=(3, 0, 0)), **LIMITS)
+    assert (decision.action, decision.max_keywords, decision.research) == (DOWNGRADE, 100, False)
+
+
+def test_search_quota_turns_research_off():
+    decision = decide(50, _usage(calls=(0, 499, 499)), **LIMITS)
+    assert (decision.action, decision.research) == (DOWNGRADE, False)
+    assert decision.estimate["calls"] == 0
+
+
+def test_zero_limits_disable_checks():
+    off = {name: 0 for name in LIMITS}
+    assert decide(10 ** 6, _usage(running=(100, 100, 100), keywords=(0, 10 ** 9, 10 ** 9)), **off).action == ACCEPT
+
+
+def test_admission_round_trips_through_the_job_payload():
+    decision = decide(3000, _usage(), **LIMITS)
+    restored = Admission.from_dict(decision.to_dict())
+    assert (restored.action, restored.reasons, restored.max_keywords) == \
+        (decision.action, decision.reasons, decision.max_keywords)
+
+
+def test_summarize_usage_scopes_and_timeouts():
+    now = time.time()
+    records = [
+        {"user_id": "U1", "team_id": "T1", "keywords": 10, "calls": 4, "started_at": now - 10, "finished_at": None},
+        {"user_id": "U2", "team_id": "T1", "keywords": 20, "calls": 0, "started_at": now - 10, "finished_at": now},
+        {"user_id": "U3", "team_id": "T2", "keywords": 30, "calls": 8, "started_at": now - 5000, "finished_at": None},
+    ]
+    usage = summarize_usage(records, "U1", "T1", now, window_s=3600, job_timeout_s=3600)
+    assert usage["running"] == {"all": 1, "user": 1, "team": 1}
+    assert usage["keywords"] == {"all": 30, "user": 10, "team": 30}
+    assert usage["calls"] == {"all": 4, "user": 4, "team": 4}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def ledger(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteLedger(path=str(tmp_path / "admission.db"))
+    return MemoryLedger()
+
+
+def _reserve(ledger, job_id, user_id):
+    return ledger.reserve(job_id, user_id, "T1", lambda usage: decide(10, usage, **LIMITS))
+
+
+def test_ledger_counts_running_jobs_until_finished(ledger):
+    assert _reserve(ledger, "j1", "U1").admitted
+    assert _reserve(ledger, "j2", "U1").admitted
+    assert not _reserve(ledger, "j3", "U1").admitted
+    ledger.finish("j1", keywords=5, calls=0)
+    assert _reserve(ledger, "j3", "U1").admitted
+
+
+def test_ledger_restart_counts_a_redelivered_job_again(ledger):
+    assert _reserve(ledger, "j1", "U1").admitted
+    assert _reserve(ledger, "j2", "U1").admitted
+    ledger.finish("j1")
+    ledger.restart("j1")
+    assert not _reserve(ledger, "j3", "U1").admitted
+
+
+def test_leased_jobs_count_only_while_their_lease_lasts():
+    now = time.time()
+    records = [
+        {"user_id": "U1", "team_id": "T1", "keywords": 10, "calls": 0, "started_at": now - 5000,
+         "finished_at": None, "lease_until": now + 60},
+        {"user_id": "U1", "team_id": "T1", "keywords": 10, "calls": 0, "started_at": now - 10,
+         "finished_at": None, "lease_until": now - 1},
+    ]
+    usage = summarize_usage(records, "U1", "T1", now, window_s=3600, job_timeout_s=3600)
+    assert usage["running"] == {"all": 1, "user": 1, "team": 1}
+
+
+def test_ledger_releases_a_job_whose_lease_ran_out(ledger):
+    assert _reserve(ledger, "j1", "U1").admitted
+    assert _reserve(ledger, "j2", "U1").admitted
+    ledger.extend("j1", time.time() + 60)
+    assert not _reserve(ledger, "j3", "U1").admitted
+    # The worker running j1 died and its heartbeat stopped extending the lease
+    ledger.extend("j1", time.time() - 1)
+    assert _reserve(ledger, "j3", "U1").admitted
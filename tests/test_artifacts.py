@@ -0,0 +1,64 @@
+import os
+import json
+import time
+
+from app import artifacts
+from app.artifacts import ArtifactStore, keyword_set_hash
+
+
+def _store(tmp_path, **kwargs):
+    # gc_interval keeps save_job from starting a background sweep
+    return ArtifactStore(root=str(tmp_path), gc_interval=10 ** 9, **kwargs)
+
+
+def _age(store, job_id, seconds):
+    manifest = store.load_job(job_id)
+    manifest["created_at"] -= seconds
+    store._write_atomic(store._path("jobs", f"{job_id}.json"), json.dumps(manifest).encode())
+
+
+def test_save_read_and_find(tmp_path):
+    store = _store(tmp_path)
+    store._last_gc = time.monotonic()
+    manifest = store.save_job("job1", ["b", "a"], {"report.csv": (b"x,y\n", "text/csv")}, user_id="U1")
+    assert store.read(manifest, "report.csv") == b"x,y\n"
+    assert store.find_by_keywords(keyword_set_hash(["a", "b", "a"]))["job_id"] == "job1"
+    assert store.load_job("../job1") is None
+
+    store.add_files("job1", {"report.json": (b"{}", "application/json")})
+    assert set(store.load_job("job1")["files"]) == {"report.csv", "report.json"}
+    assert store.add_files("missing", {"report.json": (b"{}", "application/json")}) is None
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = _store(tmp_path)
+    store._last_gc = time.monotonic()
+    a = store.save_job("job1", ["a"], {"report.pdf": (b"same", "application/pdf")})
+    b = store.save_job("job2", ["b"], {"report.pdf": (b"same", "application/pdf")})
+    assert a["files"]["report.pdf"]["sha256"] == b["files"]["report.pdf"]["sha256"]
+    blobs = [name for _, _, names in os.walk(store._path("blobs")) for name in names]
+    assert len(blobs) == 1
+
+
+def test_gc_drops_expired_and_oldest_jobs_and_their_blobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "_SWEEP_GRACE_S", 0)
+    store = _store(tmp_path, max_age_days=1)
+    store._last_gc = time.monotonic()
+    store.save_job("old", ["a"], {"report.pdf": (b"old report", "application/pdf")})
+    store.save_job("shared", ["b"], {"report.pdf": (b"shared", "application/pdf"),
+                                     "result.json": (os.urandom(4096), "application/json")})
+    store.save_job("new", ["c"], {"report.pdf": (b"shared", "application/pdf"),
+                                  "result.json": (os.urandom(4096), "application/json")})
+    _age(store, "old", 2 * 86400)
+    _age(store, "shared", 3600)
+
+    result = store.gc()
+    assert result["jobs_removed"] == 1
+    assert store.load_job("old") is None and store.find_by_keywords(keyword_set_hash(["a"])) is None
+    assert store.read(store.load_job("shared"), "report.pdf") == b"shared"
+
+    # Over the size limit: the oldest remaining job goes, but its blob is still referenced
+    store.max_bytes = sum(f["stored_size"] for f in store.load_job("new")["files"].values())
+    store.gc()
+    assert store.load_job("shared") is None
+    assert store.read(store.load_job("new"), "report.pdf") == b"shared"
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from app.cache import SharedCache, SQLiteCacheStore, TTLCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    store = SQLiteCacheStore(path=str(tmp_path / "cache.db"))
+
+    def make(ttl=3600):
+        if request.param == "sqlite":
+            return SharedCache(store, ttl=ttl, name="test")
+        return TTLCache(ttl=ttl)
+    return make
+
+
+def test_get_set_many(make_cache):
+    cache = make_cache()
+    cache.set_many({("a", 1): [1, 2], "b": {"x": 1}})
+    assert cache.get(("a", 1)) == [1, 2]
+    assert cache.get_many([("a", 1), "b", "c"]) == {("a", 1): [1, 2], "b": {"x": 1}}
+
+
+def test_add_only_sets_absent_keys(make_cache):
+    cache = make_cache()
+    assert cache.add("event", True)
+    assert not cache.add("event", True)
+    assert cache.get("event") is True
+
+
+def test_add_replaces_expired_entries(make_cache):
+    cache = make_cache(ttl=0.05)
+    assert cache.add("event", True)
+    time.sleep(0.1)
+    assert cache.add("event", True)
+
+
+def test_add_is_atomic_across_processes_sharing_a_store(tmp_path):
+    # One SharedCache per "process", all on the same SQLite file
+    caches = [SharedCache(SQLiteCacheStore(path=str(tmp_path / "cache.db")), name="events") for _ in range(8)]
+    barrier = threading.Barrier(len(caches))
+    wins = []
+
+    def deliver(cache):
+        barrier.wait()
+        wins.append(cache.add("Ev123", True))
+
+    threads = [threading.Thread(target=deliver, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(wins) == [False] * 7 + [True]
+
+
+def test_get_or_load_coalesces_concurrent_loads():
+    cache = TTLCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    threads = [threading.Thread(target=cache.get_or_load, args=("key", loader)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert cache.get("key") == "value"
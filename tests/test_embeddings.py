@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app import embeddings
+from app.cache import TTLCache
+
+
+class FakeModel:
+    def __init__(self, offset):
+        self.offset = offset
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([[self.offset + len(text), 0.0] for text in texts])
+
+
+@pytest.fixture
+def fresh(monkeypatch):
+    cache = TTLCache(ttl=float("inf"))
+    monkeypatch.setattr(embeddings, "embedding_cache", cache)
+    monkeypatch.setattr(embeddings, "_models", {})
+    monkeypatch.setattr(embeddings, "_serving_backend", {})
+    return cache
+
+
+def test_cache_key_includes_model_and_backend(monkeypatch, fresh):
+    torch_model = FakeModel(0)
+    monkeypatch.setattr(embeddings, "load_model", lambda backend: torch_model)
+
+    embeddings.encode(["seo", "python"], backend="torch")
+    embeddings.encode(["seo"], backend="torch")
+    assert torch_model.calls == [["seo", "python"]]
+    assert fresh.get((embeddings.EMBEDDING_MODEL_NAME, "torch", "seo")) is not None
+
+    # A different model must not be served the old model's vectors
+    monkeypatch.setattr(embeddings, "EMBEDDING_MODEL_NAME", "another-model")
+    embeddings.encode(["seo"], backend="torch")
+    assert torch_model.calls == [["seo", "python"], ["seo"]]
+
+
+def test_fallback_vectors_are_cached_under_torch(monkeypatch, fresh):
+    torch_model = FakeModel(100)
+
+    def load_model(backend):
+        if backend == "onnx":
+            raise ImportError("onnxruntime")
+        return torch_model
+
+    monkeypatch.setattr(embeddings, "load_model", load_model)
+    name = embeddings.EMBEDDING_MODEL_NAME
+    # Left by another worker whose ONNX runtime did load
+    fresh.set((name, "onnx", "seo"), np.array([-1.0, -1.0], dtype="float32"))
+
+    vectors = embeddings.encode(["seo", "python"], backend="onnx")
+
+    # The onnx vector is not mixed with fallback vectors from another model
+    np.testing.assert_array_equal(vectors[:, 0], [103, 106])
+    assert torch_model.calls == [["seo", "python"]]
+    assert fresh.get((name, "torch", "python")) is not None
+    assert fresh.get((name, "onnx", "python")) is None
+
+    # Later calls look up the fallback's vectors directly
+    embeddings.encode(["python"], backend="onnx")
+    assert torch_model.calls == [["seo", "python"]]
+
+
+@pytest.mark.parametrize("backend", ["torch-int8", "onnx"])
+def test_backend_parity_with_torch(backend):
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("torch")
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+        pytest.importorskip("optimum")
+    try:
+        reference = embeddings.load_model("torch")
+        model = embeddings.load_model(backend)
+    except OSError as e:
+        pytest.skip(f"model not available: {e}")
+
+    texts = ["seo tools", "keyword research", "python basics", "banana bread"]
+    a = reference.encode(texts, convert_to_numpy=True)
+    b = model.encode(texts, convert_to_numpy=True)
+    cosine = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    assert cosine.min() > 0.95
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from app.job_queue import MemoryQueue, SQLiteQueue
+from app.worker import Worker
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_queue(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "sqlite":
+            return SQLiteQueue(path=str(tmp_path / "jobs.db"), **kwargs)
+        return MemoryQueue(**kwargs)
+    return make
+
+
+def test_lease_ack(make_queue):
+    queue = make_queue()
+    queue.enqueue({"n": 1}, job_id="a")
+    job = queue.lease("w1")
+    assert (job.id, job.payload, job.attempt) == ("a", {"n": 1}, 1)
+    assert queue.lease("w2") is None
+    assert queue.ack(job)
+    assert queue.lease("w2") is None
+    assert queue.stats() == {"done": 1}
+
+
+def test_expired_lease_is_redelivered_and_stale_worker_cannot_ack(make_queue):
+    queue = make_queue(lease_seconds=0.05)
+    queue.enqueue({}, job_id="a")
+    first = queue.lease("w1")
+    time.sleep(0.1)
+    second = queue.lease("w2")
+    assert (second.id, second.attempt) == ("a", 2)
+    assert not queue.ack(first)
+    assert not queue.extend(first)
+    assert queue.ack(second)
+
+
+def test_nack_requeues_until_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.enqueue({}, job_id="a")
+    assert queue.nack(queue.lease("w1"), error="boom")
+    job = queue.lease("w1")
+    assert job.attempt == 2
+    assert queue.nack(job, error="boom")
+    assert queue.lease("w1") is None
+    assert queue.stats() == {"dead": 1}
+
+
+def test_worker_nacks_failed_jobs_and_retries_them(make_queue):
+    queue = make_queue(max_attempts=3)
+    queue.enqueue({}, job_id="a")
+    attempts = []
+
+    def handler(job):
+        attempts.append(job.attempt)
+        if job.attempt < 2:
+            raise RuntimeError("transient")
+
+    worker = Worker(queue=queue, handler=handler, concurrency=1, poll_interval=0.01).start()
+    deadline = time.time() + 5
+    while queue.stats() != {"done": 1} and time.time() < deadline:
+        time.sleep(0.01)
+    worker.stop(timeout=5)
+    assert attempts == [1, 2]
+    assert queue.stats() == {"done": 1}
@@ -0,0 +1,22 @@
+import numpy as np
+
+from app.k_selection import select_k
+
+
+def _blobs(k, per_blob=40, dim=8):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(scale=10, size=(k, dim))
+    return np.vstack([center + rng.normal(size=(per_blob, dim)) for center in centers]).astype("float32")
+
+
+def test_finds_well_separated_clusters():
+    k, report = select_k(_blobs(4), k_max=10, budget_s=60)
+    assert k == 4
+    assert report["k"] == 4 and report["stopped"] in ("patience", "exhausted")
+    assert report["elapsed_s"] >= 0
+
+
+def test_stops_at_the_wall_clock_budget():
+    _, report = select_k(_blobs(4), k_max=10, budget_s=0)
+    assert report["stopped"] == "budget"
+    assert len(report["evaluated"]) == 1
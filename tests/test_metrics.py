@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", None)
+    monkeypatch.setattr(metrics, "_snapshot_path", None)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_counters_and_histograms_render(enabled):
+    metrics.inc("jobs_total", status="completed")
+    metrics.inc("jobs_total", 2, status="completed")
+    metrics.observe("pipeline_stage_seconds", 0.2, stage="kmeans")
+    text = metrics.render_prometheus()
+    assert 'jobs_total{status="completed"} 3' in text
+    assert 'pipeline_stage_seconds_bucket{stage="kmeans",le="0.25"} 1' in text
+    assert 'pipeline_stage_seconds_bucket{stage="kmeans",le="0.1"} 0' in text
+    assert 'pipeline_stage_seconds_count{stage="kmeans"} 1' in text
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    metrics.reset()
+    metrics.inc("jobs_total")
+    with metrics.span("kmeans"):
+        pass
+    assert metrics.render_prometheus() == "\n"
+
+
+def test_job_trace_collects_spans_from_helper_threads(enabled):
+    with metrics.job_trace("j1") as trace:
+        with metrics.span("parse"):
+            pass
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            pool.submit(metrics.in_current_context(lambda: metrics.inc("cache_hits_total", cache="serp"))).result()
+        pool_trace = ThreadPoolExecutor(max_workers=1).submit(metrics.current_trace).result()
+    assert [s["stage"] for s in trace.to_dict()["spans"]] == ["parse"]
+    assert trace.counters == {"cache_hits_total|cache=serp": 1}
+    assert pool_trace is None  # not submitted through in_current_context
+    assert metrics.current_trace() is None
+
+
+def test_multiprocess_dir_adds_up_every_process(enabled, monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    env = dict(os.environ, METRICS_ENABLED="true", METRICS_MULTIPROC_DIR=str(tmp_path))
+    code = ("from app import metrics; metrics.inc('jobs_total', 2, status='completed'); "
+            "metrics.observe('pipeline_stage_seconds', 0.2, stage='kmeans')")
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+    metrics.inc("jobs_total", status="completed")
+    text = metrics.render_prometheus()
+    assert len(list(tmp_path.glob("*.json"))) == 3
+    assert 'jobs_total{status="completed"} 5' in text
+    assert 'pipeline_stage_seconds_count{stage="kmeans"} 2' in text
+
+
+def test_serve_exposes_metrics_on_its_own_port(enabled):
+    metrics.inc("worker_jobs_total", status="done")
+    server = metrics.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        body = urllib.request.urlopen(url, timeout=5).read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'worker_jobs_total{status="done"} 1' in body
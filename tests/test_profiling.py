@@ -0,0 +1,77 @@
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from app import metrics, profiling
+from app.pipeline import clean_keywords
+from app.profiling import JobProfile
+
+
+def _work():
+    data = [bytes(1024) for _ in range(200)]
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+    return data
+
+
+def test_sampling_profile_files():
+    with JobProfile(mode="sample", trace_allocations=False) as profile:
+        _work()
+    files = profile.files()
+    assert set(files) == {"profile.txt", "profile.collapsed"}
+    assert profile.sampler.samples > 0
+    assert "Job profile (sample)" in files["profile.txt"][0].decode()
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_samples_only_the_jobs_own_helper_threads():
+    # Another job's pool work, running app code the whole time
+    started, stop = threading.Event(), threading.Event()
+
+    def other_job():
+        with metrics.job_trace("other"):
+            started.set()
+            while not stop.is_set():
+                metrics.in_current_context(clean_keywords)(["seo tools", "keyword research"] * 500)
+
+    other = threading.Thread(target=other_job, name="other-job")
+    other.start()
+    started.wait(2)
+    try:
+        with metrics.job_trace("mine"), JobProfile(mode="sample", trace_allocations=False) as profile:
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="helper") as pool:
+                pool.submit(metrics.in_current_context(_spin), 0.1).result()
+            _spin(0.05)
+    finally:
+        stop.set()
+        other.join()
+
+    roots = {stack.split(";")[0] for stack in profile.sampler.stacks}
+    assert roots == {"job", "helper_N"}
+    assert not metrics.job_threads("mine")
+
+
+def test_stops_tracemalloc_only_if_it_started_it():
+    assert not tracemalloc.is_tracing()
+    with JobProfile(mode="cprofile") as profile:
+        kept = _work()
+    assert not tracemalloc.is_tracing()
+    assert "process" in profile.report()
+    assert "profile.pstats" in profile.files()
+
+    tracemalloc.start()
+    try:
+        with JobProfile(mode="sample"):
+            kept = _work()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    assert profiling._tracemalloc_users == 0
+    del kept
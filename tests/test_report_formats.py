@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app.report_formats import BLOCKS_PER_MESSAGE, parse_formats, render_report
+
+
+@pytest.mark.parametrize("text, formats, rest", [
+    ("keyword seo tools format=csv", ["csv"], "keyword seo tools"),
+    ("keyword seo tools\nlink building --format=json,CSV,json", ["json", "csv"], "keyword seo tools\nlink building"),
+    ("format=blocks", ["blocks"], ""),
+    ("keyword seo tools formats=pdf,blocks  ", ["pdf", "blocks"], "keyword seo tools"),
+])
+def test_parse_formats_takes_a_trailing_option(text, formats, rest):
+    assert parse_formats(text) == (formats, rest)
+
+
+@pytest.mark.parametrize("text", [
+    "keyword file format: mp4, video formats: webm",
+    "keyword format=csv,seo tools",
+    "keyword format=csv seo tools",
+    "keyword seo tools format=mp4",
+    "keyword seo tools format=csv,docx",
+    "keyword seo toolsformat=csv",
+    "",
+    None,
+])
+def test_parse_formats_leaves_other_text_as_keywords(text):
+    assert parse_formats(text) == (None, text)
+
+
+def _result(n_clusters):
+    clusters = [{"cluster_name": f"Cluster {i}", "keywords": [f"kw {i} {j}" for j in range(3)],
+                 "category": "General"} for i in range(n_clusters)]
+    return {
+        "job_id": "job1",
+        "raw_keywords": [kw for c in clusters for kw in c["keywords"]],
+        "cleaned": [kw for c in clusters for kw in c["keywords"]],
+        "clusters": clusters,
+        "outlines": [{"cluster": c["cluster_name"], "outline": ["Intro"], "sources": [],
+                      "degraded": "beyond top clusters" if i else None} for i, c in enumerate(clusters)],
+        "ideas": [{"cluster": c["cluster_name"], "idea": "An idea"} for c in clusters],
+    }
+
+
+def test_json_and_csv_have_one_record_per_cluster():
+    result = _result(3)
+    assert [c["cluster"] for c in json.loads(render_report("json", result))["clusters"]] == \
+        ["Cluster 0", "Cluster 1", "Cluster 2"]
+    rows = list(csv.reader(io.StringIO(render_report("csv", result).decode())))
+    assert len(rows) == 4
+    assert [row[-1] for row in rows[1:]] == ["live", "no (beyond top clusters)", "no (beyond top clusters)"]
+
+
+def test_blocks_stay_within_the_per_message_limit():
+    messages = json.loads(render_report("blocks", _result(40)))
+    assert len(messages) > 1
+    assert all(len(m["blocks"]) <= BLOCKS_PER_MESSAGE for m in messages)
+    sections = [b for m in messages for b in m["blocks"] if b["type"] == "section"]
+    assert len(sections) == 40
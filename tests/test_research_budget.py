@@ -0,0 +1,92 @@
+import pytest
+
+from app import pipeline
+from app.cache import TTLCache
+from app.research_budget import (DEGRADED_ADMISSION, DEGRADED_BYTES, DEGRADED_CALLS, DEGRADED_RANK,
+                                 DEGRADED_TIME, ResearchBudget, plan_research)
+
+
+def _cluster(name, size):
+    return {"cluster_name": name, "keywords": [f"{name} {i}" for i in range(size)], "category": "General"}
+
+
+def test_take_calls_grants_what_is_left():
+    budget = ResearchBudget(max_calls=5, max_bytes=0, max_seconds=0)
+    assert budget.take_calls(3) == 3
+    assert budget.take_calls(3) == 2
+    assert budget.exhausted == DEGRADED_CALLS
+    assert not budget.try_call()
+    assert budget.summary()["api_calls"] == 5
+
+
+def test_byte_and_time_limits_stop_further_calls(monkeypatch):
+    budget = ResearchBudget(max_calls=0, max_bytes=100, max_seconds=0)
+    assert budget.take_calls(50) == 50
+    budget.add_bytes(100)
+    assert budget.exhausted == DEGRADED_BYTES
+    assert budget.take_calls(1) == 0
+
+    budget = ResearchBudget(max_calls=0, max_bytes=0, max_seconds=10)
+    monkeypatch.setattr("app.research_budget.time.monotonic", lambda: budget.started + 11)
+    assert budget.exhausted == DEGRADED_TIME
+    assert not budget.try_call()
+
+
+def test_skipped_budget_allows_no_calls():
+    budget = ResearchBudget(skip_reason=DEGRADED_ADMISSION)
+    assert budget.take_calls(1) == 0
+    assert budget.exhausted == DEGRADED_ADMISSION
+
+
+def test_plan_research_ranks_by_size_and_keeps_tie_order():
+    clusters = [_cluster("a", 1), _cluster("b", 3), _cluster("c", 1), _cluster("d", 2)]
+    live, degraded = plan_research(clusters, ResearchBudget(max_live_clusters=2))
+    assert [c["cluster_name"] for c in live] == ["b", "d"]
+    assert [(c["cluster_name"], reason) for c, reason in degraded] == [("a", DEGRADED_RANK), ("c", DEGRADED_RANK)]
+
+    live, degraded = plan_research(clusters, ResearchBudget(max_live_clusters=0))
+    assert [c["cluster_name"] for c in live] == ["b", "d", "a", "c"] and degraded == []
+
+    live, degraded = plan_research(clusters, ResearchBudget(skip_reason=DEGRADED_ADMISSION))
+    assert live == [] and {reason for _, reason in degraded} == {DEGRADED_ADMISSION}
+
+
+@pytest.fixture
+def research(monkeypatch):
+    """
+    fetch_top_results against fake search results: every cluster has two
+    useful result pages, "<name>/1" and "<name>/2"
+    """
+    def results(name):
+        return [{"title": name, "link": f"https://en.wikipedia.org/{name}/{i}", "snippet": ""} for i in (1, 2)]
+
+    monkeypatch.setattr(pipeline, "page_cache", TTLCache(ttl=3600))
+    monkeypatch.setattr(pipeline, "cached_search", lambda name, top_n=3: None)
+    monkeypatch.setattr(pipeline, "search_many", lambda names, top_n=3: {name: results(name) for name in names})
+    monkeypatch.setattr(pipeline, "extract_headings", lambda url, budget=None: [f"Heading from {url}"] * 5)
+    return pipeline.fetch_top_results
+
+
+def test_partly_denied_page_fetches_do_not_degrade_a_cluster(research):
+    # One search plus one of the two pages fit the budget
+    budget = ResearchBudget(max_calls=2, max_bytes=0, max_seconds=0)
+    [outline] = research([_cluster("seo", 3)], budget=budget)
+    assert len(outline["sources"]) == 1
+    assert not outline["degraded"]
+
+
+def test_cluster_without_any_fetched_page_is_degraded(research):
+    budget = ResearchBudget(max_calls=1, max_bytes=0, max_seconds=0)
+    [outline] = research([_cluster("seo", 3)], budget=budget)
+    assert outline["sources"] == []
+    assert outline["degraded"] == DEGRADED_CALLS
+
+
+def test_skipped_search_degrades_the_cluster(research):
+    budget = ResearchBudget(max_calls=1, max_bytes=0, max_seconds=0)
+    stats = {}
+    outlines = research([_cluster("small", 1), _cluster("big", 3)], budget=budget, stats=stats)
+    assert [o["cluster"] for o in outlines] == ["small", "big"]
+    # The one call goes to the larger cluster's search; the smaller one is never searched
+    assert outlines[0]["degraded"] == DEGRADED_CALLS
+    assert stats["research"]["degraded"] == 2
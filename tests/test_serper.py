@@ -0,0 +1,99 @@
+import threading
+import time
+
+import requests
+
+from app import metrics, serper
+from app.serper import SearchBatcher
+
+
+def test_slow_batch_does_not_hold_up_the_next(monkeypatch):
+    release = threading.Event()
+
+    def fetch_batch(queries):
+        if queries[0][0] == "slow":
+            release.wait(5)
+        return [[{"title": keyword, "link": "https://example.com", "snippet": ""}] for keyword, _ in queries]
+
+    monkeypatch.setattr(serper, "fetch_top_search_batch", fetch_batch)
+    batcher = SearchBatcher(window=0.01, concurrency=2)
+    slow = batcher.submit("slow")
+    time.sleep(0.1)
+    fast = batcher.submit("fast")
+    assert fast.result(timeout=2)[0]["title"] == "fast"
+    assert not slow.done()
+    release.set()
+    assert slow.result(timeout=2)[0]["title"] == "slow"
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def _no_single_searches(keyword, top_n=3):
+    raise AssertionError(f"unexpected single search for {keyword}")
+
+
+def test_unusable_entries_fall_back_to_single_queries(monkeypatch):
+    def fetch_batch(queries):
+        return [None if keyword == "b" else [{"title": keyword}] for keyword, _ in queries]
+
+    singles = []
+    monkeypatch.setattr(serper, "fetch_top_search_batch", fetch_batch)
+    monkeypatch.setattr(serper, "fetch_top_search", lambda keyword, top_n=3: singles.append(keyword) or [{"title": keyword}])
+    batcher = SearchBatcher(window=0.05)
+    futures = [batcher.submit(keyword) for keyword in ("a", "b", "a")]
+    assert [f.result(timeout=2) for f in futures] == [[{"title": "a"}], [{"title": "b"}], [{"title": "a"}]]
+    assert singles == ["b"]
+
+
+def test_failed_batch_is_retried_as_a_batch(monkeypatch):
+    calls = []
+
+    def fetch_batch(queries):
+        calls.append(sorted(keyword for keyword, _ in queries))
+        if len(calls) == 1:
+            raise _http_error(429)
+        return [[{"title": keyword}] for keyword, _ in queries]
+
+    monkeypatch.setattr(serper, "fetch_top_search_batch", fetch_batch)
+    monkeypatch.setattr(serper, "fetch_top_search", _no_single_searches)
+    batcher = SearchBatcher(window=0.05, retries=2, backoff=0.01)
+    futures = [batcher.submit(keyword) for keyword in ("a", "b")]
+    assert [f.result(timeout=2) for f in futures] == [[{"title": "a"}], [{"title": "b"}]]
+    assert calls == [["a", "b"], ["a", "b"]]
+
+
+def test_batch_failures_give_up_without_single_queries(monkeypatch):
+    calls = []
+
+    def fetch_batch(queries):
+        calls.append(len(queries))
+        raise _http_error(401 if queries[0][0] == "auth" else 503)
+
+    monkeypatch.setattr(serper, "fetch_top_search_batch", fetch_batch)
+    monkeypatch.setattr(serper, "fetch_top_search", _no_single_searches)
+    batcher = SearchBatcher(window=0.01, retries=2, backoff=0.01)
+    assert batcher.submit("auth").result(timeout=2) == []
+    assert calls == [1]  # not retryable
+    assert batcher.submit("down").result(timeout=2) == []
+    assert calls == [1, 1, 1, 1]  # first try plus two retries
+
+
+def test_batch_requests_are_traced_in_every_submitting_job(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(serper, "fetch_top_search_batch",
+                        lambda queries: [[{"title": keyword}] for keyword, _ in queries])
+    batcher = SearchBatcher(window=0.1)
+    with metrics.job_trace("j1") as first:
+        a = [batcher.submit(keyword) for keyword in ("a", "b")]
+    with metrics.job_trace("j2") as second:
+        b = [batcher.submit(keyword) for keyword in ("b", "c")]
+    for future in a + b:
+        future.result(timeout=2)
+
+    spans = [trace.to_dict()["spans"] for trace in (first, second)]
+    assert [[(s["stage"], s["labels"]["queries"], s["labels"]["batch_queries"]) for s in job] for job in spans] == \
+        [[("serp_batch", 2, 3)], [("serp_batch", 2, 3)]]
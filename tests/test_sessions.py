@@ -0,0 +1,97 @@
+import numpy as np
+
+from app.sessions import KeywordSession, SessionStore, cluster_signature
+
+
+def test_save_load_delete_round_trip(tmp_path):
+    store = SessionStore(root=str(tmp_path))
+    session = KeywordSession("U1", "D1")
+    session.keywords = ["seo tools", "keyword research"]
+    session.embeddings = np.ones((2, 4), dtype="float32")
+    session.centroids = np.ones((1, 4), dtype="float32")
+    session.labels = np.zeros(2, dtype="int64")
+    session.outlines = {cluster_signature(session.keywords): {"cluster": "SEO", "outline": ["Intro"]}}
+    store.save(session)
+
+    loaded = store.load("U1", "D1")
+    assert loaded.keywords == session.keywords
+    assert loaded.outlines == session.outlines
+    np.testing.assert_array_equal(loaded.embeddings, session.embeddings)
+    assert store.load("U1", "C1").keywords == []
+
+    store.delete("U1", "D1")
+    assert store.load("U1", "D1").keywords == []
+
+
+def test_expired_session_starts_empty(tmp_path):
+    store = SessionStore(root=str(tmp_path))
+    session = KeywordSession("U1", None)
+    session.keywords = ["seo tools"]
+    session.updated_at = 0
+    store.save(session)
+    assert store.load("U1", None).keywords == []
+
+
+def test_cluster_signature_ignores_order():
+    assert cluster_signature(["a", "b"]) == cluster_signature(["b", "a"])
+    assert cluster_signature(["a", "b"]) != cluster_signature(["a", "c"])
+
+
+def _blob_encoder(monkeypatch, vectors):
+    monkeypatch.setattr("app.sessions.encode", lambda keywords: np.stack([vectors[kw] for kw in keywords]))
+
+
+def _seeded_session(monkeypatch):
+    rng = np.random.default_rng(0)
+    centers = np.eye(16, dtype="float32")[:4] * 10
+    vectors = {}
+    for blob in range(3):
+        for i in range(8):
+            vectors[f"topic{blob} kw{i}"] = centers[blob] + rng.normal(scale=0.5, size=16)
+    for i in range(2):
+        vectors[f"topic0 kw{i} copy"] = vectors[f"topic0 kw{i}"] + rng.normal(scale=0.01, size=16)
+        vectors[f"topic3 kw{i}"] = centers[3] + rng.normal(scale=0.5, size=16)
+    _blob_encoder(monkeypatch, vectors)
+
+    session = KeywordSession("U1", "D1")
+    clusters = session.add_keywords([kw for kw in vectors if kw.startswith(("topic0", "topic1", "topic2")) and "copy" not in kw])
+    assert session.last_update["refit"] and len(clusters) == 3
+    session.store_outlines(clusters, [{"cluster": c["cluster_name"], "outline": [c["cluster_name"]]} for c in clusters])
+    return session
+
+
+def test_near_duplicates_are_assigned_without_refit(monkeypatch):
+    session = _seeded_session(monkeypatch)
+    centroids = session.centroids.copy()
+    clusters = session.add_keywords(["topic0 kw0 copy", "topic0 kw1 copy"])
+
+    assert not session.last_update["refit"]
+    assert session.last_update["drift"] < 1.5
+    assert len(session.labels) == 26
+    grown = next(c for c in clusters if "topic0 kw0 copy" in c["keywords"])
+    assert "topic0 kw0" in grown["keywords"] and "topic0 kw1 copy" in grown["keywords"]
+    moved = [not np.allclose(before, after) for before, after in zip(centroids, session.centroids)]
+    assert sum(moved) == 1
+
+    # Only the cluster that received keywords needs research again
+    reused = [session.cached_outline(c) for c in clusters]
+    assert [o is None for o in reused] == [c is grown for c in clusters]
+    assert all(o["cluster"] == c["cluster_name"] for c, o in zip(clusters, reused) if o is not None)
+
+
+def test_new_topic_triggers_refit(monkeypatch):
+    session = _seeded_session(monkeypatch)
+    clusters = session.add_keywords(["topic3 kw0", "topic3 kw1"])
+
+    assert session.last_update["refit"]
+    assert session.last_update["drift"] > 1.5
+    assert len(session.labels) == 26
+    assert sorted(kw for c in clusters for kw in c["keywords"]) == sorted(session.keywords)
+
+
+def test_max_keywords_caps_the_whole_session(monkeypatch):
+    session = _seeded_session(monkeypatch)
+    session.add_keywords(["topic0 kw0 copy", "topic0 kw1 copy", "topic0 kw0"], max_keywords=25)
+    assert session.keywords[24:] == ["topic0 kw0 copy"]
+    session.add_keywords(["topic0 kw1 copy"], max_keywords=25)
+    assert len(session.keywords) == 25
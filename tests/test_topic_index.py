@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+
+from app.topic_index import TopicIndex, KIND_KEYWORD
+
+
+def _entries(texts):
+    return [{"kind": KIND_KEYWORD, "cluster_id": text, "text": text} for text in texts]
+
+
+def _nearest(index, vector):
+    row, _ = index.search_vectors(vector / np.linalg.norm(vector), k=1, exact=True)[0]
+    return index.entries[row]["text"]
+
+
+def test_append_after_crash_drops_orphan_vector_rows(tmp_path):
+    root = str(tmp_path)
+    vectors = np.eye(8, dtype="float32")
+    TopicIndex(root).add(vectors[:3], _entries(["a", "b", "c"]))
+
+    # A writer died after appending one and a half rows of vectors but
+    # before writing their entries
+    with open(os.path.join(root, "vectors.f32"), "ab") as f:
+        f.write(vectors[3:5].tobytes()[:48])
+
+    index = TopicIndex(root).load()
+    assert len(index.entries) == 3
+    index.add(vectors[5:7], _entries(["f", "g"]))
+
+    assert os.path.getsize(os.path.join(root, "vectors.f32")) == 5 * 8 * 4
+    for reopened in (index, TopicIndex(root).load()):
+        assert [_nearest(reopened, vectors[i]) for i in (0, 1, 2, 5, 6)] == ["a", "b", "c", "f", "g"]
+
+
+def test_append_after_torn_entry_line(tmp_path):
+    root = str(tmp_path)
+    vectors = np.eye(8, dtype="float32")
+    TopicIndex(root).add(vectors[:2], _entries(["a", "b"]))
+
+    # Another process died after its vectors and part of its first entry line
+    with open(os.path.join(root, "vectors.f32"), "ab") as f:
+        f.write(vectors[2:4].tobytes())
+    with open(os.path.join(root, "entries.jsonl"), "a") as f:
+        f.write('{"kind": 0, "cluster_id": "c", "te')
+
+    reader = TopicIndex(root).load()
+    TopicIndex(root).add(vectors[4:5], _entries(["e"]))
+
+    for index in (reader.load(), TopicIndex(root).load()):
+        assert [e["text"] for e in index.entries] == ["a", "b", "e"]
+        assert [_nearest(index, vectors[i]) for i in (0, 1, 4)] == ["a", "b", "e"]
+
+
+def _fake_encode(texts):
+    # Keywords sharing a first word get nearby vectors
+    out = []
+    for text in texts:
+        rng = np.random.default_rng(sum(text.split()[0].encode()))
+        out.append(rng.normal(size=16) + np.random.default_rng(len(text)).normal(scale=0.05, size=16))
+    return np.array(out, dtype="float32")
+
+
+def _cluster(name, keywords):
+    return {"cluster_name": name, "keywords": keywords, "category": "General"}
+
+
+def _outline(name):
+    return {"cluster": name, "outline": [f"{name} intro"], "sources": [f"https://example.com/{name}"]}
+
+
+def test_related_only_returns_clusters_the_caller_may_see(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.topic_index.encode", _fake_encode)
+    index = TopicIndex(str(tmp_path))
+    index.add_clusters([_cluster("Seo A", ["seo tools", "seo audit"])], [_outline("Seo A")], "U1", "T1")
+    index.add_clusters([_cluster("Seo B", ["seo tools", "seo audit"])], [_outline("Seo B")], "U2", "T2")
+
+    assert [r["cluster_name"] for r in index.related("seo tips", user_id="U1", team_id="T1")] == ["Seo A"]
+    assert [r["cluster_name"] for r in index.related("seo tips", user_id="U2", team_id="T2")] == ["Seo B"]
+    assert index.related("seo tips", user_id="U3", team_id="T2") == []
+    assert [r["cluster_name"] for r in index.related("seo tips", user_id="U3", team_id="T2", scope="team")] == \
+        ["Seo B"]
+    assert index.related("seo tips", user_id="U1", team_id="T3", scope="team") == []
+
+
+def test_rows_without_a_cluster_record_are_reindexed(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.topic_index.encode", _fake_encode)
+    root = str(tmp_path)
+    TopicIndex(root).add_clusters([_cluster("Seo", ["seo tools", "seo audit"])], [_outline("Seo")], "U1", "T1")
+    # Crash after the rows were appended but before the cluster record
+    os.truncate(os.path.join(root, "clusters.jsonl"), 0)
+
+    index = TopicIndex(root)
+    assert index.related("seo tips", user_id="U1", team_id="T1") == []
+    index.add_clusters([_cluster("Seo", ["seo tools", "seo audit"])], [_outline("Seo")], "U1", "T1")
+    assert [r["cluster_name"] for r in index.related("seo tips", user_id="U1", team_id="T1")] == ["Seo"]
+    assert len(index.entries) == 2 * 3